@@ -0,0 +1,153 @@
+"""Worker restart with and without task-aware draining, against a simulated task load.
+
+Every worker pod runs ``--slots`` task instances of ``--task-seconds`` each
+and takes a new one as soon as a slot frees up, until its Celery consumer is
+cancelled. When the fake StatefulSet replaces a pod, the tasks still running
+on it count as ``killed``; the new pod starts consuming right away.
+
+The ``plain`` case is the regular rolling restart. Each ``drain`` case rolls
+the workers in batches sized by ``--min-available`` and waits for each batch
+to finish its tasks first. ``min_consuming`` is the fewest pods taking tasks
+at any moment, i.e. the throughput floor during the restart::
+
+    python benchmarks/bench_drain.py --workers 8 --task-seconds 1 --min-available 75% 50%
+"""
+from __future__ import annotations
+
+import argparse
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, List
+
+from harness import add_cluster_arguments, configure_logging, connect, report
+from fake_kube import FakeCluster, FakeKubernetesServer
+
+
+class TaskLoad:
+    """Saturated task queue consumed by the worker pods of a FakeCluster"""
+
+    def __init__(self, cluster: FakeCluster, slots: int, task_seconds: float, tick: float = 0.02):
+        self.workload = cluster.workloads[('StatefulSet', 'airflow-worker')]
+        self.cluster = cluster
+        self.slots = slots
+        self.task_seconds = task_seconds
+        self.tick = tick
+        self.lock = threading.Lock()
+        self.pods: Dict[str, Dict] = {}
+        self.killed = 0
+        self.completed = 0
+        self.min_consuming = self.workload.replicas
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        # Stand-in for Airflow's Celery app: workers answer as celery@<pod>
+        self.app = SimpleNamespace(control=SimpleNamespace(
+            inspect=lambda destination, timeout: SimpleNamespace(active_queues=lambda: self._active_queues(destination)),
+            cancel_consumer=self._cancel_consumer,
+            add_consumer=self._add_consumer,
+        ))
+
+    def __enter__(self) -> 'TaskLoad':
+        self._step()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def running(self, pods: List[str]) -> Dict[str, int]:
+        with self.lock:
+            return {pod: len(self.pods[pod]['tasks']) if pod in self.pods else 0 for pod in pods}
+
+    def _active_queues(self, destination: List[str]) -> Dict[str, List[Dict[str, str]]]:
+        with self.lock:
+            return {worker: [{'name': 'default'}] for worker in destination
+                    if worker.split('@', 1)[1] in self.pods and self.pods[worker.split('@', 1)[1]]['consuming']}
+
+    def _cancel_consumer(self, queue: str, destination: List[str], reply: bool = False, timeout: float = 1):
+        with self.lock:
+            for worker in destination:
+                self.pods[worker.split('@', 1)[1]]['consuming'] = False
+
+    def _add_consumer(self, queue: str, destination: List[str], reply: bool = False, timeout: float = 1):
+        with self.lock:
+            for worker in destination:
+                self.pods[worker.split('@', 1)[1]]['consuming'] = True
+
+    def _run(self):
+        while not self._stop.wait(self.tick):
+            self._step()
+
+    def _step(self):
+        now = time.monotonic()
+        current = {pod['metadata']['name']: pod['metadata']['uid']
+                   for pod in self.workload.pods(self.cluster.namespace, self.cluster.readiness_delay)}
+        with self.lock:
+            for name, uid in current.items():
+                pod = self.pods.get(name)
+                if pod is None or pod['uid'] != uid:
+                    # A replaced pod loses its running tasks and starts a fresh, consuming worker
+                    if pod is not None:
+                        self.killed += len(pod['tasks'])
+                    pod = self.pods[name] = {'uid': uid, 'consuming': True, 'tasks': []}
+                finished = [end for end in pod['tasks'] if end <= now]
+                self.completed += len(finished)
+                pod['tasks'] = [end for end in pod['tasks'] if end > now]
+                if pod['consuming']:
+                    pod['tasks'] += [now + self.task_seconds] * (self.slots - len(pod['tasks']))
+            self.min_consuming = min(self.min_consuming, sum(1 for p in self.pods.values() if p['consuming']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_cluster_arguments(parser)
+    parser.add_argument('--workers', type=int, default=8, help="worker StatefulSet replicas")
+    parser.add_argument('--slots', type=int, default=4, help="concurrent task instances per worker")
+    parser.add_argument('--task-seconds', type=float, default=1.0, help="duration of one task instance")
+    parser.add_argument('--min-available', nargs='+', default=['75%', '50%'],
+                        help="worker floors to measure, as a count or a percentage")
+    parser.add_argument('--drain-timeout', type=int, default=60)
+    parser.add_argument('--poll-interval', type=float, default=0.05, help="rollout and drain poll interval")
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+
+    from package_manager.drain import WorkerDrainer
+    from package_manager.restart import RolloutRestarter
+
+    rows = []
+    for case in ['plain'] + [f"drain {floor}" for floor in args.min_available]:
+        cluster = FakeCluster.airflow(workers=args.workers, latency=args.latency, jitter=args.jitter,
+                                      readiness_delay=args.readiness_delay)
+        with FakeKubernetesServer(cluster) as server, \
+                TaskLoad(cluster, args.slots, args.task_seconds) as load:
+            _, apps_v1 = connect(server.url).get()
+            drainer = None
+            if case != 'plain':
+                drainer = WorkerDrainer(timeout=args.drain_timeout, poll_interval=args.poll_interval,
+                                        app=load.app, running_tasks=load.running)
+            restarter = RolloutRestarter(
+                apps_v1, cluster.namespace,
+                poll_interval=args.poll_interval,
+                drainer=drainer,
+                min_available=case.split(' ', 1)[1] if drainer else '50%'
+            )
+            started = time.perf_counter()
+            workloads = restarter.restart(['worker'])
+            wall = time.perf_counter() - started
+
+        rows.append({
+            'case': case,
+            'status': workloads[0]['status'],
+            'wall_s': round(wall, 3),
+            'killed_tasks': load.killed,
+            'completed_tasks': load.completed,
+            'tasks_per_s': round(load.completed / wall, 1),
+            'min_consuming': load.min_consuming,
+        })
+
+    report(f"Worker restart under load ({args.workers} workers x {args.slots} slots)", rows, args.json)
+
+
+if __name__ == '__main__':
+    main()
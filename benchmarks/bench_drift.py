@@ -0,0 +1,85 @@
+"""Drift report collection time against the fake Kubernetes API as the worker count grows.
+
+For each worker count a fresh fake namespace is created. A few worker pods get
+a different version of one requirement. ``DriftCollector.collect`` is then
+timed three times:
+
+- cold, where every pod is exec'd into;
+- warm, where every pod is served from the cache;
+- after a worker rollout, where only the replaced pods are exec'd again.
+
+With ``--max-parallel`` exec streams, the cold lower bound is
+``ceil(pods / max_parallel) * exec_delay``::
+
+    python benchmarks/bench_drift.py --workers 1 5 10 25 50 --exec-delay 0.5
+"""
+from __future__ import annotations
+
+import argparse
+import math
+import time
+
+from harness import add_cluster_arguments, configure_logging, connect, report
+from fake_kube import FakeCluster, FakeKubernetesServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_cluster_arguments(parser)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 5, 10, 25, 50],
+                        help="worker StatefulSet replica counts to measure")
+    parser.add_argument('--packages', type=int, default=50, help="pinned packages in requirements.txt")
+    parser.add_argument('--drifted', type=int, default=2, help="worker pods with a mismatching version")
+    parser.add_argument('--exec-delay', type=float, default=0.5, help="seconds an exec into a pod takes")
+    parser.add_argument('--max-parallel', type=int, default=16)
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+
+    from package_manager.drift import DriftCollector
+    from package_manager.requirements import RequirementsFile
+
+    packages = [f"bench-package-{i}==1.0" for i in range(args.packages)]
+    requirements = RequirementsFile.parse('\n'.join(packages) + '\n')
+    components = ['worker', 'triggerer', 'scheduler']
+
+    rows = []
+    for workers in args.workers:
+        cluster = FakeCluster.airflow(workers=workers, packages=packages, latency=args.latency,
+                                      jitter=args.jitter, readiness_delay=args.readiness_delay,
+                                      exec_delay=args.exec_delay)
+        for ordinal in range(min(args.drifted, workers)):
+            cluster.drift[f"airflow-worker-{ordinal}"] = {'bench-package-0': '0.9'}
+
+        with FakeKubernetesServer(cluster) as server:
+            pool = connect(server.url)
+            collector = DriftCollector(lambda: pool.get()[0], pool.new_api_client, cluster.namespace,
+                                       components, max_parallel=args.max_parallel)
+            timings = {}
+            for case in ('cold', 'warm', 'after_rollout'):
+                if case == 'after_rollout':
+                    # Replace every worker pod; the scheduler and triggerer stay cached
+                    cluster.workloads[('StatefulSet', 'airflow-worker')].generation += 1
+                execs = cluster.requests.get('exec_pod', 0)
+                started = time.perf_counter()
+                result = collector.collect(requirements)
+                timings[case] = (time.perf_counter() - started, cluster.requests.get('exec_pod', 0) - execs)
+
+        pods = result['summary']['pods']
+        rows.append({
+            'workers': workers,
+            'pods': pods,
+            'cold_s': round(timings['cold'][0], 3),
+            'lower_bound_s': round(math.ceil(pods / args.max_parallel) * args.exec_delay, 3),
+            'warm_s': round(timings['warm'][0], 3),
+            'warm_execs': timings['warm'][1],
+            'after_rollout_s': round(timings['after_rollout'][0], 3),
+            'after_rollout_execs': timings['after_rollout'][1],
+            'drifted': result['summary']['drifted'],
+            'errors': result['summary']['errors'],
+        })
+
+    report('Drift collection', rows, args.json)
+
+
+if __name__ == '__main__':
+    main()
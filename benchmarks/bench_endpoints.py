@@ -0,0 +1,145 @@
+"""Throughput and latency of the package manager endpoints against the fake Kubernetes API.
+
+The view is instantiated outside the webserver and each endpoint is called
+through ``__wrapped__`` inside a Flask test request context. This skips the
+FAB permission check but keeps everything below it: tokens, the ConfigMap
+cache, validation, preflight and job submission. Mutations queue real jobs,
+which patch the fake ConfigMap and run coalesced restarts. The job drain row
+is the time until every queued job has finished::
+
+    python benchmarks/bench_endpoints.py --iterations 500 --concurrency 8 --latency 0.005
+
+Run it inside the Airflow image, or any environment with the plugin's
+dependencies installed.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+from harness import Result, add_cluster_arguments, configure_logging, connect, report, run
+from fake_kube import FakeCluster, FakeKubernetesServer
+
+USER = SimpleNamespace(email='bench@example.com', username='bench')
+
+
+class EndpointError(RuntimeError):
+    pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_cluster_arguments(parser)
+    parser.add_argument('--iterations', type=int, default=500, help="calls per endpoint")
+    parser.add_argument('--concurrency', type=int, default=8, help="concurrent callers, like gunicorn threads")
+    parser.add_argument('--workers', type=int, default=3, help="worker StatefulSet replicas")
+    parser.add_argument('--packages', type=int, default=50, help="packages already in requirements.txt")
+    parser.add_argument('--coalesce-window', type=float, default=1.0)
+    parser.add_argument('--no-preflight', action='store_true')
+    parser.add_argument('--skip-mutations', action='store_true')
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+
+    state_dir = tempfile.mkdtemp(prefix='package-manager-bench-')
+    os.environ.update({
+        'AIRFLOW__PACKAGE_MANAGER__TOKEN_STORE': os.environ.get('AIRFLOW__PACKAGE_MANAGER__TOKEN_STORE', 'memory'),
+        'AIRFLOW__PACKAGE_MANAGER__JOB_STATE_DIR': os.path.join(state_dir, 'jobs'),
+        'AIRFLOW__PACKAGE_MANAGER__RESTART_COALESCE_WINDOW': str(args.coalesce_window),
+        'AIRFLOW__PACKAGE_MANAGER__ROLLOUT_POLL_INTERVAL': '1',
+        'AIRFLOW__PACKAGE_MANAGER__PREFLIGHT_ENABLED': str(not args.no_preflight),
+    })
+
+    # Removes and updates each need their own existing package
+    seeds = [f"bench-seed-{i}==1.0" for i in range(2 * args.iterations)]
+    fillers = [f"bench-existing-{i}==1.0" for i in range(args.packages)]
+    cluster = FakeCluster.airflow(workers=args.workers, packages=fillers + seeds, latency=args.latency,
+                                  jitter=args.jitter, readiness_delay=args.readiness_delay)
+    os.environ['AIRFLOW__KUBERNETES_ENVIRONMENT_VARIABLES__AIRFLOW_NAMESPACE'] = cluster.namespace
+
+    with FakeKubernetesServer(cluster) as server:
+        connect(server.url)
+        from flask import Flask, g
+
+        from package_manager.views import PackageManagerView
+
+        view = PackageManagerView()
+        # render_template needs a registered appbuilder; the template context is enough here
+        view.render_template = lambda template, **context: context
+        app = Flask(__name__)
+
+        def call(endpoint: str, body=None, method: str = 'POST', query: str = '', headers=None):
+            with app.test_request_context(f"/?{query}", method=method, json=body, headers=headers):
+                g.user = USER
+                response = getattr(PackageManagerView, endpoint).__wrapped__(view)
+            status = response[1] if isinstance(response, tuple) else getattr(response, 'status_code', 200)
+            if status >= 400:
+                raise EndpointError(f"{endpoint} returned {status}: {response[0].get_json()}")
+            return response[0] if isinstance(response, tuple) else response
+
+        def token(operation: str, package: str = None, operations=None) -> str:
+            body = {'operation': operation, 'package': package, 'operations': operations}
+            return call('generate_token', body).get_json()['token']
+
+        # Warm the ConfigMap cache and the watch before measuring
+        call('api_packages', method='GET')
+        results = [
+            run('list_packages', lambda _: call('list_packages', method='GET'), args.iterations, args.concurrency),
+            run('api_packages', lambda _: call('api_packages', method='GET', query='per_page=100'),
+                args.iterations, args.concurrency),
+            run('api_packages (304)', lambda etag: call('api_packages', method='GET', query='per_page=100',
+                                                        headers={'If-None-Match': etag}),
+                args.iterations, args.concurrency,
+                prepare=lambda _: call('api_packages', method='GET', query='per_page=100').headers['ETag']),
+            run('generate_token', lambda i: call('generate_token', {'operation': 'add', 'package': f"bench-{i}"}),
+                args.iterations, args.concurrency),
+        ]
+
+        if not args.skip_mutations:
+            jobs_before = len(view.jobs._jobs)
+            drain_started = time.perf_counter()
+            results.append(run(
+                'add', lambda body: call('add_package', body), args.iterations, args.concurrency,
+                prepare=lambda i: {'package': f"bench-add-{i}==1.0", 'token': token('add', f"bench-add-{i}==1.0")}
+            ))
+            results.append(run(
+                'remove', lambda body: call('remove_package', body), args.iterations, args.concurrency,
+                prepare=lambda i: {'package': seeds[i], 'token': token('remove', seeds[i])}
+            ))
+            results.append(run(
+                'update', lambda body: call('update_package', body), args.iterations, args.concurrency,
+                prepare=lambda i: {
+                    'old_package': seeds[args.iterations + i],
+                    'new_package': seeds[args.iterations + i].replace('==1.0', '==2.0'),
+                    'token': token('update', seeds[args.iterations + i]),
+                }
+            ))
+
+            def batch_body(i: int):
+                operations = [{'operation': 'add', 'package': f"bench-batch-{i}-{n}==1.0"} for n in range(5)]
+                return {'operations': operations, 'token': token('batch', operations=operations)}
+
+            results.append(run('batch', lambda body: call('batch_packages', body), args.iterations,
+                               args.concurrency, prepare=batch_body))
+
+            queued = list(view.jobs._jobs.values())[jobs_before:]
+            while any(job.status not in ('succeeded', 'failed') for job in queued):
+                time.sleep(0.1)
+            drain = time.perf_counter() - drain_started
+            failed = sum(1 for job in queued if job.status == 'failed')
+            rollouts = len({(w['name'], w['triggered_at']) for job in queued
+                            for w in job.workloads.values() if w.get('triggered_at')})
+            results.append(Result(
+                'job drain', [], drain,
+                extra={'jobs': len(queued), 'failed_jobs': failed, 'jobs_per_s': round(len(queued) / drain, 1),
+                       'workload_rollouts': rollouts}
+            ))
+
+    report('Endpoints', [r.summary() for r in results], args.json)
+    report('Fake API requests', [dict(sorted(cluster.requests.items()))], args.json)
+
+
+if __name__ == '__main__':
+    main()
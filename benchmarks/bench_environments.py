@@ -0,0 +1,115 @@
+"""Wall-clock of one package change fanned out to several environments.
+
+For each environment count a fresh fake cluster and API server is started per
+environment. The first one is the webserver's own environment, the others are
+each behind their own kubeconfig context. One add request then
+targets all of them and is timed until the job finishes. With
+``--max-parallel`` environments changed at once, the wall-clock should follow
+the slowest environment (``slowest_env_s``) rather than the sum of all of
+them (``sequential_s``)::
+
+    python benchmarks/bench_environments.py --environments 1 2 4 8 --max-parallel 4
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import tempfile
+import time
+from contextlib import ExitStack
+from types import SimpleNamespace
+
+from harness import add_cluster_arguments, configure_logging, connect, report
+from fake_kube import FakeCluster, FakeKubernetesServer
+
+USER = SimpleNamespace(email='bench@example.com', username='bench')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_cluster_arguments(parser)
+    parser.add_argument('--environments', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help="environment counts to measure")
+    parser.add_argument('--workers', type=int, default=3, help="worker StatefulSet replicas per environment")
+    parser.add_argument('--max-parallel', type=int, default=4, help="environments changed concurrently")
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+
+    state_dir = tempfile.mkdtemp(prefix='package-manager-bench-')
+    os.environ.update({
+        'AIRFLOW__PACKAGE_MANAGER__TOKEN_STORE': 'memory',
+        'AIRFLOW__PACKAGE_MANAGER__RESTART_COALESCE_WINDOW': '0',
+        'AIRFLOW__PACKAGE_MANAGER__ROLLOUT_POLL_INTERVAL': '1',
+        'AIRFLOW__PACKAGE_MANAGER__PREFLIGHT_ENABLED': 'False',
+        'AIRFLOW__PACKAGE_MANAGER__ENVIRONMENT_MAX_PARALLEL': str(args.max_parallel),
+    })
+
+    from flask import Flask, g
+
+    from package_manager.views import PackageManagerView
+
+    app = Flask(__name__)
+    rows = []
+    for count in args.environments:
+        # Namespaces are unique per run so no ConfigMap cache is shared between runs
+        clusters = {f"env-{count}-{i}": FakeCluster.airflow(namespace=f"env-{count}-{i}", workers=args.workers,
+                                                            packages=['pandas==2.2.2'], latency=args.latency,
+                                                            jitter=args.jitter, readiness_delay=args.readiness_delay)
+                    for i in range(count)}
+        # The first environment plays the webserver's own, reached through the default client pool
+        local = next(iter(clusters))
+        with ExitStack() as stack:
+            environments = {}
+            for name, cluster in clusters.items():
+                server = stack.enter_context(FakeKubernetesServer(cluster))
+                if name == local:
+                    connect(server.url)
+                    continue
+                # Every other environment is reached through its own context and client pool
+                connect(server.url, context=name)
+                environments[name] = {'namespace': cluster.namespace, 'context': name}
+            os.environ.update({
+                'AIRFLOW__KUBERNETES_ENVIRONMENT_VARIABLES__AIRFLOW_NAMESPACE': clusters[local].namespace,
+                'AIRFLOW__PACKAGE_MANAGER__ENVIRONMENT_NAME': local,
+                'AIRFLOW__PACKAGE_MANAGER__ENVIRONMENTS': json.dumps(environments),
+                'AIRFLOW__PACKAGE_MANAGER__JOB_STATE_DIR': os.path.join(state_dir, f"jobs-{count}"),
+            })
+            view = PackageManagerView()
+
+            with app.test_request_context('/'):
+                g.user = USER
+                token = view._generate_operation_token(
+                    'add', 'requests==2.31.0', view._change_scope({'environments': [local, *environments]})
+                )
+            body = {'package': 'requests==2.31.0', 'token': token, 'environments': [local, *environments]}
+            started = time.perf_counter()
+            with app.test_request_context('/', method='POST', json=body):
+                g.user = USER
+                response = PackageManagerView.add_package.__wrapped__(view)
+            job = view.jobs._jobs[response[0].get_json()['job_id']]
+            while job.status not in ('succeeded', 'failed'):
+                time.sleep(0.02)
+            wall = time.perf_counter() - started
+
+        # A change to the webserver's own environment alone is not fanned out
+        per_environment = [e['duration'] or 0.0 for e in job.to_dict()['environments']] or [wall]
+        slowest = max(
+            w.rollout_seconds(args.readiness_delay)
+            for cluster in clusters.values() for w in cluster.workloads.values()
+        )
+        rows.append({
+            'environments': count,
+            'status': job.status,
+            'wall_s': round(wall, 3),
+            'slowest_env_s': round(max(per_environment, default=0.0), 3),
+            'sequential_s': round(sum(per_environment), 3),
+            'lower_bound_s': round(math.ceil(count / args.max_parallel) * slowest, 3),
+        })
+
+    report('Multi-environment fan-out', rows, args.json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Plugin import time and the modules it pulls in, per Airflow component.
+
+Every case runs in a fresh interpreter. It imports ``airflow.plugins_manager``
+first, because every component has already paid for that. It then loads
+``package_manager/__init__.py`` the way the plugins manager does and creates
+the plugin. Only the time and modules added by the plugin are counted:
+
+- The ``scheduler/triggerer/worker`` case stops there.
+- The ``webserver`` case also reads ``appbuilder_views`` and
+  ``flask_blueprints``, like ``init_plugins`` does.
+
+The script exits with status 1 if the non-webserver case loads any module
+that only the webserver needs::
+
+    python benchmarks/bench_import.py --repeat 5
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from harness import PLUGINS, report
+
+# Modules only the webserver should load
+WEBSERVER_ONLY = ('kubernetes', 'flask_appbuilder', 'airflow.www.app', 'package_manager.views')
+
+CHILD = r'''
+import importlib.machinery
+import importlib.util
+import json
+import os
+import sys
+import time
+
+plugins, webserver = sys.argv[1], sys.argv[2] == 'webserver'
+sys.path.insert(0, plugins)
+import airflow.plugins_manager  # noqa: F401
+
+before = set(sys.modules)
+started = time.perf_counter()
+path = os.path.join(plugins, 'package_manager', '__init__.py')
+loader = importlib.machinery.SourceFileLoader('__init__', path)
+module = importlib.util.module_from_spec(importlib.util.spec_from_loader('__init__', loader))
+sys.modules['__init__'] = module
+loader.exec_module(module)
+plugin = module.PackageManagerPlugin()
+if webserver:
+    plugin.appbuilder_views
+    plugin.flask_blueprints
+elapsed = time.perf_counter() - started
+print(json.dumps({'seconds': elapsed, 'modules': sorted(set(sys.modules) - before)}))
+'''
+
+
+def measure(case: str) -> dict:
+    output = subprocess.run([sys.executable, '-c', CHILD, PLUGINS, case], check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help="fresh interpreters per case")
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    rows = []
+    failed = False
+    for case, label in (('component', 'scheduler/triggerer/worker'), ('webserver', 'webserver')):
+        runs = [measure(case) for _ in range(args.repeat)]
+        modules = runs[-1]['modules']
+        loaded = [name for name in WEBSERVER_ONLY
+                  if any(m == name or m.startswith(name + '.') for m in modules)]
+        rows.append({
+            'case': label,
+            'runs': len(runs),
+            'median_ms': round(statistics.median(r['seconds'] for r in runs) * 1000, 1),
+            'max_ms': round(max(r['seconds'] for r in runs) * 1000, 1),
+            'new_modules': len(modules),
+            'webserver_only_loaded': ', '.join(loaded) or '-',
+        })
+        failed = failed or (case == 'component' and bool(loaded))
+
+    report('Plugin import', rows, args.json)
+    if failed:
+        print("\nNon-webserver components load webserver-only modules", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
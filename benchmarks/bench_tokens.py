@@ -0,0 +1,87 @@
+"""Token store latency and throughput with many live tokens.
+
+Each store is preloaded with ``--live`` unexpired tokens before put, get and
+consume are measured. The eviction case fills the store with tokens that have
+already expired and times the put that removes them::
+
+    python benchmarks/bench_tokens.py --live 10000 --operations 5000 --concurrency 8
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import secrets
+import tempfile
+import time
+
+from harness import report, run
+
+
+def bench_store(name, store, args):
+    tokens = [secrets.token_urlsafe(32) for _ in range(args.live)]
+    data = {'operation': 'add', 'package': 'pandas==2.2.2', 'user': 'bench@example.com'}
+
+    preload = run(f"{name}: preload put", lambda t: store.put(t, data, 3600), args.live,
+                  args.concurrency, prepare=lambda i: tokens[i])
+    results = [preload]
+    results.append(run(f"{name}: get (hit)", store.get, args.operations, args.concurrency,
+                       prepare=lambda i: tokens[i % len(tokens)]))
+    results.append(run(f"{name}: get (miss)", store.get, args.operations, args.concurrency,
+                       prepare=lambda i: secrets.token_urlsafe(32)))
+    results.append(run(f"{name}: put", lambda t: store.put(t, data, 3600), args.operations, args.concurrency,
+                       prepare=lambda i: secrets.token_urlsafe(32)))
+    results.append(run(f"{name}: consume", store.consume, min(args.operations, len(tokens)), args.concurrency,
+                       prepare=lambda i: tokens[i]))
+    results.append(run(f"{name}: len", lambda _: len(store), max(1, args.operations // 100)))
+
+    # Expired tokens are evicted by the next write
+    expiring = args.live // 2
+    for _ in range(expiring):
+        store.put(secrets.token_urlsafe(32), data, 0.001)
+    time.sleep(0.01)
+    # SqlTokenStore sweeps at most once per eviction_interval; force the next one
+    if hasattr(store, '_next_eviction'):
+        store._next_eviction = 0
+    evictions = store.evictions
+    eviction = run(f"{name}: put after {expiring} expired", lambda t: store.put(t, data, 3600), 1,
+                   prepare=lambda i: secrets.token_urlsafe(32))
+    eviction.extra['evicted'] = store.evictions - evictions
+    results.append(eviction)
+
+    rows = [r.summary() for r in results]
+    rows[0]['live_tokens'] = args.live
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--live', type=int, default=10000, help="live tokens preloaded into each store")
+    parser.add_argument('--operations', type=int, default=5000, help="operations per measured case")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--stores', nargs='+', default=['memory', 'sqlite'], choices=['memory', 'sqlite', 'sql'])
+    parser.add_argument('--sql-url', help="SQLAlchemy URL for the 'sql' store, e.g. a scratch Postgres database")
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    from package_manager.tokens import MemoryTokenStore, SqlTokenStore, create_token_store
+
+    rows = []
+    with tempfile.TemporaryDirectory(prefix='package-manager-bench-') as tmp_dir:
+        for name in args.stores:
+            if name == 'memory':
+                store = MemoryTokenStore()
+            elif name == 'sqlite':
+                store = create_token_store('sqlite', os.path.join(tmp_dir, 'tokens.db'))
+            else:
+                if not args.sql_url:
+                    parser.error("--sql-url is required for the 'sql' store")
+                from sqlalchemy import create_engine
+                store = SqlTokenStore(create_engine(args.sql_url))
+                store.create_table()
+            rows += bench_store(name, store, args)
+
+    report('Token store', rows, args.json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,514 @@
+"""Local stand-in for the Kubernetes API server used by the package manager benchmarks.
+
+Serves just enough of the core/v1 and apps/v1 APIs for the plugin: one
+namespace with ConfigMaps (read, list, watch, create, patch with resourceVersion
+preconditions), StatefulSets and Deployments (list by label, patch, read
+status) and their pods, including exec into a pod over the WebSocket channel
+protocol. Every request is delayed by ``latency`` seconds.
+
+A patch of a workload's pod template starts a simulated rolling update.
+StatefulSets replace one pod every ``readiness_delay`` seconds. Deployments
+replace ``maxUnavailable`` pods per step.
+
+Exec answers any command with the pod's installed distributions as JSON,
+after ``exec_delay`` seconds. Pods have the pinned ConfigMap requirements
+installed, except where ``drift`` overrides them.
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+CORE = r'/api/v1/namespaces/(?P<ns>[^/]+)'
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+APPS = r'/apis/apps/v1/namespaces/(?P<ns>[^/]+)'
+
+
+class FakeWorkload:
+    """StatefulSet or Deployment whose rollout progresses with wall-clock time"""
+
+    def __init__(self, kind: str, name: str, component: str, replicas: int, max_unavailable: int = 1):
+        self.kind = kind
+        self.name = name
+        self.component = component
+        self.replicas = replicas
+        self.max_unavailable = max(1, max_unavailable)
+        self.generation = 1
+        self.partition = 0
+        self.annotations: Dict[str, str] = {}
+        # Annotations of the workload object itself, which do not start a rollout
+        self.metadata_annotations: Dict[str, str] = {}
+        self.rollout_started: Optional[float] = None
+        # Pods already updated when the rollout (re)started, e.g. before a partition was lowered
+        self.rollout_base = 0
+        self.uid = f"{kind.lower()}-{name}"
+
+    def updated_replicas(self, readiness_delay: float) -> int:
+        if self.rollout_started is None:
+            return self.replicas
+        step = 1 if self.kind == 'StatefulSet' else self.max_unavailable
+        target = self.replicas - self.partition if self.kind == 'StatefulSet' else self.replicas
+        if readiness_delay <= 0:
+            return target
+        steps = int((time.monotonic() - self.rollout_started) / readiness_delay)
+        return min(target, self.rollout_base + steps * step)
+
+    def set_partition(self, partition: int, readiness_delay: float):
+        """Change the partition; a rolling StatefulSet continues from the pods it has updated so far"""
+        if self.rollout_started is not None:
+            self.rollout_base = min(self.updated_replicas(readiness_delay), self.replicas - self.partition)
+            self.rollout_started = time.monotonic()
+        self.partition = partition
+
+    def rollout_seconds(self, readiness_delay: float) -> float:
+        """Lower bound for this workload's rollout with the simulated readiness delay"""
+        step = 1 if self.kind == 'StatefulSet' else self.max_unavailable
+        return math.ceil(self.replicas / step) * readiness_delay
+
+    def to_dict(self, namespace: str, readiness_delay: float) -> Dict[str, Any]:
+        labels = {'component': self.component}
+        updated = self.updated_replicas(readiness_delay)
+        rolling = updated < (self.replicas - self.partition if self.kind == 'StatefulSet' else self.replicas)
+        unavailable = min(self.max_unavailable if self.kind == 'Deployment' else 1, self.replicas - updated)
+        spec: Dict[str, Any] = {
+            'replicas': self.replicas,
+            'selector': {'matchLabels': labels},
+            'template': {
+                'metadata': {'labels': labels, 'annotations': dict(self.annotations)},
+                'spec': {'containers': [{'name': self.component, 'image': 'apache/airflow:bench'}]},
+            },
+        }
+        if self.kind == 'StatefulSet':
+            spec['serviceName'] = self.name
+            spec['updateStrategy'] = {'type': 'RollingUpdate', 'rollingUpdate': {'partition': self.partition}}
+            status = {
+                'observedGeneration': self.generation,
+                'replicas': self.replicas,
+                'readyReplicas': self.replicas - (unavailable if rolling else 0),
+                'updatedReplicas': updated,
+                'currentRevision': f"{self.name}-{self.generation - 1 if rolling else self.generation}",
+                'updateRevision': f"{self.name}-{self.generation}",
+            }
+        else:
+            spec['strategy'] = {
+                'type': 'RollingUpdate',
+                'rollingUpdate': {'maxUnavailable': self.max_unavailable, 'maxSurge': 0},
+            }
+            status = {
+                'observedGeneration': self.generation,
+                'replicas': self.replicas,
+                'updatedReplicas': updated,
+                'availableReplicas': self.replicas - (unavailable if rolling else 0),
+                'readyReplicas': self.replicas - (unavailable if rolling else 0),
+            }
+        return {
+            'apiVersion': 'apps/v1',
+            'kind': self.kind,
+            'metadata': {
+                'name': self.name,
+                'namespace': namespace,
+                'uid': self.uid,
+                'labels': labels,
+                'annotations': dict(self.metadata_annotations),
+                'generation': self.generation,
+                'resourceVersion': str(self.generation),
+            },
+            'spec': spec,
+            'status': status,
+        }
+
+    def pods(self, namespace: str, readiness_delay: float) -> List[Dict[str, Any]]:
+        updated = self.updated_replicas(readiness_delay)
+        pods = []
+        for ordinal in range(self.replicas):
+            # StatefulSets roll from the highest ordinal down
+            is_updated = ordinal >= self.replicas - updated
+            revision = self.generation if is_updated else self.generation - 1
+            name = f"{self.name}-{ordinal}" if self.kind == 'StatefulSet' else f"{self.name}-{revision}-{ordinal}"
+            pods.append({
+                'apiVersion': 'v1',
+                'kind': 'Pod',
+                'metadata': {
+                    'name': name,
+                    'namespace': namespace,
+                    'uid': f"{self.uid}-{revision}-{ordinal}",
+                    'labels': {'component': self.component},
+                },
+                'spec': {'containers': [{'name': self.component, 'image': 'apache/airflow:bench'}]},
+                'status': {
+                    'phase': 'Running',
+                    'conditions': [{'type': 'Ready', 'status': 'True'}],
+                    'containerStatuses': [{
+                        'name': self.component,
+                        'image': 'apache/airflow:bench',
+                        'imageID': f"docker.io/apache/airflow@sha256:{revision:064x}",
+                        'ready': True,
+                        'restartCount': 0,
+                    }],
+                },
+            })
+        return pods
+
+
+class FakeCluster:
+    """In-memory objects of one namespace"""
+
+    def __init__(self, namespace: str = 'data-orchestration', latency: float = 0.0, jitter: float = 0.0,
+                 readiness_delay: float = 1.0, exec_delay: float = 0.0):
+        self.namespace = namespace
+        self.latency = latency
+        self.jitter = jitter
+        self.readiness_delay = readiness_delay
+        self.exec_delay = exec_delay
+        # Pod name -> {distribution: version} installed instead of the requested version
+        self.drift: Dict[str, Dict[str, str]] = {}
+        self.configmaps: Dict[str, Dict[str, Any]] = {}
+        self.workloads: Dict[Tuple[str, str], FakeWorkload] = {}
+        self.requests: Dict[str, int] = {}
+        self._resource_version = 100
+        self._changed = threading.Condition()
+        self._events: List[Tuple[int, str, Dict[str, Any]]] = []
+
+    @classmethod
+    def airflow(cls, workers: int = 1, packages: Optional[List[str]] = None, **kwargs) -> 'FakeCluster':
+        """Namespace laid out like the Airflow chart: worker and triggerer StatefulSets, scheduler Deployment"""
+        cluster = cls(**kwargs)
+        cluster.add_configmap('airflow-config-pypi', {'requirements.txt': '\n'.join(packages or []) + '\n'})
+        cluster.add_workload(FakeWorkload('StatefulSet', 'airflow-worker', 'worker', workers))
+        cluster.add_workload(FakeWorkload('Deployment', 'airflow-scheduler', 'scheduler', 1))
+        cluster.add_workload(FakeWorkload('StatefulSet', 'airflow-triggerer', 'triggerer', 1))
+        return cluster
+
+    def add_configmap(self, name: str, data: Dict[str, str]):
+        with self._changed:
+            self.configmaps[name] = {'data': dict(data), 'resourceVersion': self._next_resource_version()}
+            self._publish('ADDED', name)
+
+    def add_workload(self, workload: FakeWorkload):
+        self.workloads[(workload.kind, workload.name)] = workload
+
+    # --- ConfigMaps ---------------------------------------------------------
+
+    def configmap(self, name: str) -> Optional[Dict[str, Any]]:
+        with self._changed:
+            entry = self.configmaps.get(name)
+            return self._configmap_object(name, entry) if entry else None
+
+    def patch_configmap(self, name: str, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        with self._changed:
+            entry = self.configmaps.get(name)
+            if entry is None:
+                return 404, _status(404, 'NotFound', f'configmaps "{name}" not found')
+            expected = (body.get('metadata') or {}).get('resourceVersion')
+            if expected is not None and expected != entry['resourceVersion']:
+                return 409, _status(409, 'Conflict', f'Operation cannot be fulfilled on configmaps "{name}": '
+                                                     'the object has been modified')
+            # Merge patch semantics: a null value removes the key
+            for key, value in (body.get('data') or {}).items():
+                if value is None:
+                    entry['data'].pop(key, None)
+                else:
+                    entry['data'][key] = value
+            entry['resourceVersion'] = self._next_resource_version()
+            self._publish('MODIFIED', name)
+            return 200, self._configmap_object(name, entry)
+
+    def create_configmap(self, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        name = body['metadata']['name']
+        with self._changed:
+            if name in self.configmaps:
+                return 409, _status(409, 'AlreadyExists', f'configmaps "{name}" already exists')
+        self.add_configmap(name, body.get('data') or {})
+        return 201, self.configmap(name)
+
+    def watch_configmaps(self, field_selector: Optional[str], resource_version: Optional[str],
+                         timeout: float):
+        """Yield watch events after ``resource_version`` until the timeout expires"""
+        name = field_selector.split('=', 1)[1] if field_selector and '=' in field_selector else None
+        since = int(resource_version or 0)
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._changed:
+                pending = [e for e in self._events if e[0] > since and (name is None or e[2]['metadata']['name'] == name)]
+                if not pending:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return
+                    self._changed.wait(min(remaining, 1.0))
+                    continue
+            for rv, event_type, obj in pending:
+                since = rv
+                yield {'type': event_type, 'object': obj}
+
+    def _configmap_object(self, name: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'apiVersion': 'v1',
+            'kind': 'ConfigMap',
+            'metadata': {'name': name, 'namespace': self.namespace, 'resourceVersion': entry['resourceVersion']},
+            'data': dict(entry['data']),
+        }
+
+    def _next_resource_version(self) -> str:
+        self._resource_version += 1
+        return str(self._resource_version)
+
+    def _publish(self, event_type: str, name: str):
+        entry = self.configmaps[name]
+        self._events.append((int(entry['resourceVersion']), event_type, self._configmap_object(name, entry)))
+        del self._events[:-1000]
+        self._changed.notify_all()
+
+    # --- Workloads -------------------------------------------------------------
+
+    def list_workloads(self, kind: str, label_selector: Optional[str]) -> List[Dict[str, Any]]:
+        return [w.to_dict(self.namespace, self.readiness_delay)
+                for (k, _), w in sorted(self.workloads.items()) if k == kind and _matches(w, label_selector)]
+
+    def patch_workload(self, kind: str, name: str, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        workload = self.workloads.get((kind, name))
+        if workload is None:
+            return 404, _status(404, 'NotFound', f'{kind.lower()}s "{name}" not found')
+        for key, value in ((body.get('metadata') or {}).get('annotations') or {}).items():
+            # Merge patch: a null value removes the annotation
+            if value is None:
+                workload.metadata_annotations.pop(key, None)
+            else:
+                workload.metadata_annotations[key] = value
+        template = (body.get('spec') or {}).get('template') or {}
+        annotations = (template.get('metadata') or {}).get('annotations')
+        if annotations:
+            workload.annotations.update(annotations)
+            workload.generation += 1
+            workload.rollout_started = time.monotonic()
+            workload.rollout_base = 0
+        rolling_update = ((body.get('spec') or {}).get('updateStrategy') or {}).get('rollingUpdate') or {}
+        if 'partition' in rolling_update:
+            workload.set_partition(rolling_update['partition'], self.readiness_delay)
+        return 200, workload.to_dict(self.namespace, self.readiness_delay)
+
+    def read_workload(self, kind: str, name: str) -> Tuple[int, Dict[str, Any]]:
+        workload = self.workloads.get((kind, name))
+        if workload is None:
+            return 404, _status(404, 'NotFound', f'{kind.lower()}s "{name}" not found')
+        return 200, workload.to_dict(self.namespace, self.readiness_delay)
+
+    def list_pods(self, label_selector: Optional[str]) -> List[Dict[str, Any]]:
+        pods = []
+        for _, workload in sorted(self.workloads.items()):
+            if _matches(workload, label_selector):
+                pods.extend(workload.pods(self.namespace, self.readiness_delay))
+        return pods
+
+    def installed(self, pod: str) -> Dict[str, Any]:
+        """What a pod reports from exec: pinned requirements plus its drift overrides"""
+        packages = {'apache-airflow': '2.10.5'}
+        for line in self.configmaps['airflow-config-pypi']['data'].get('requirements.txt', '').splitlines():
+            name, _, version = line.partition('==')
+            if version and not name.startswith('-'):
+                packages[name.split('[')[0]] = version.strip()
+        packages.update(self.drift.get(pod, {}))
+        return {'python': '3.11.9', 'packages': packages}
+
+    def count(self, verb: str):
+        with self._changed:
+            self.requests[verb] = self.requests.get(verb, 0) + 1
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+
+def _matches(workload: FakeWorkload, label_selector: Optional[str]) -> bool:
+    if not label_selector:
+        return True
+    for term in label_selector.split(','):
+        key, _, value = term.partition('=')
+        if key.strip() != 'component' or value.strip() != workload.component:
+            return False
+    return True
+
+
+def _status(code: int, reason: str, message: str) -> Dict[str, Any]:
+    return {'kind': 'Status', 'apiVersion': 'v1', 'status': 'Failure', 'message': message,
+            'reason': reason, 'code': code}
+
+
+def _list(kind: str, items: List[Dict[str, Any]], resource_version: str = '1') -> Dict[str, Any]:
+    return {'kind': kind, 'apiVersion': 'v1', 'metadata': {'resourceVersion': resource_version}, 'items': items}
+
+
+class FakeKubernetesHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    cluster: FakeCluster
+
+    routes = [
+        ('GET', CORE + r'/configmaps/(?P<name>[^/]+)$', 'read_configmap'),
+        ('PATCH', CORE + r'/configmaps/(?P<name>[^/]+)$', 'patch_configmap'),
+        ('GET', CORE + r'/configmaps$', 'list_configmaps'),
+        ('POST', CORE + r'/configmaps$', 'create_configmap'),
+        ('GET', CORE + r'/pods$', 'list_pods'),
+        ('GET', CORE + r'/pods/(?P<name>[^/]+)/exec$', 'exec_pod'),
+        ('GET', APPS + r'/(?P<resource>statefulsets|deployments)$', 'list_workloads'),
+        ('PATCH', APPS + r'/(?P<resource>statefulsets|deployments)/(?P<name>[^/]+)$', 'patch_workload'),
+        ('GET', APPS + r'/(?P<resource>statefulsets|deployments)/(?P<name>[^/]+)(?:/status)?$', 'read_workload'),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_PATCH(self):
+        self._dispatch('PATCH')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def _dispatch(self, method: str):
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        for route_method, pattern, handler in self.routes:
+            match = re.match(pattern, url.path)
+            if route_method == method and match:
+                self.cluster.count(handler)
+                self.cluster.delay()
+                getattr(self, handler)(query, **match.groupdict())
+                return
+        self._send(404, _status(404, 'NotFound', f'{method} {url.path} is not served by the fake API'))
+
+    def _body(self) -> Dict[str, Any]:
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _send(self, code: int, payload: Dict[str, Any]):
+        data = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_configmap(self, query, ns, name):
+        configmap = self.cluster.configmap(name)
+        if configmap is None:
+            self._send(404, _status(404, 'NotFound', f'configmaps "{name}" not found'))
+        else:
+            self._send(200, configmap)
+
+    def patch_configmap(self, query, ns, name):
+        self._send(*self.cluster.patch_configmap(name, self._body()))
+
+    def create_configmap(self, query, ns):
+        self._send(*self.cluster.create_configmap(self._body()))
+
+    def list_configmaps(self, query, ns):
+        if query.get('watch') in ('true', '1', 'True'):
+            self._stream_watch(query)
+            return
+        field_selector = query.get('fieldSelector', '')
+        name = field_selector.split('=', 1)[1] if '=' in field_selector else None
+        items = [self.cluster.configmap(n) for n in sorted(self.cluster.configmaps) if name in (None, n)]
+        self._send(200, _list('ConfigMapList', items, str(self.cluster._resource_version)))
+
+    def _stream_watch(self, query):
+        # No Content-Length: the stream ends when the connection closes
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        timeout = float(query.get('timeoutSeconds') or 300)
+        try:
+            for event in self.cluster.watch_configmaps(query.get('fieldSelector'), query.get('resourceVersion'),
+                                                       timeout):
+                self.wfile.write(json.dumps(event).encode() + b'\n')
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def list_pods(self, query, ns):
+        self._send(200, _list('PodList', self.cluster.list_pods(query.get('labelSelector'))))
+
+    def exec_pod(self, query, ns, name):
+        # WebSocket upgrade, then the v4 channel protocol: stdout on channel 1, exit status on channel 3
+        accept = base64.b64encode(hashlib.sha1(
+            (self.headers['Sec-WebSocket-Key'] + WEBSOCKET_GUID).encode()
+        ).digest()).decode()
+        self.send_response(101)
+        self.send_header('Upgrade', 'websocket')
+        self.send_header('Connection', 'Upgrade')
+        self.send_header('Sec-WebSocket-Accept', accept)
+        self.send_header('Sec-WebSocket-Protocol', 'v4.channel.k8s.io')
+        self.end_headers()
+        self.close_connection = True
+        time.sleep(self.cluster.exec_delay)
+        try:
+            self._send_frame(b'\x01' + json.dumps(self.cluster.installed(name)).encode() + b'\n')
+            self._send_frame(b'\x03' + json.dumps({'metadata': {}, 'status': 'Success'}).encode())
+            self._send_frame((1000).to_bytes(2, 'big'), opcode=0x8)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _send_frame(self, payload: bytes, opcode: int = 0x2):
+        """One unmasked, unfragmented WebSocket frame"""
+        if len(payload) < 126:
+            header = bytes([0x80 | opcode, len(payload)])
+        elif len(payload) < 1 << 16:
+            header = bytes([0x80 | opcode, 126]) + len(payload).to_bytes(2, 'big')
+        else:
+            header = bytes([0x80 | opcode, 127]) + len(payload).to_bytes(8, 'big')
+        self.wfile.write(header + payload)
+        self.wfile.flush()
+
+    def list_workloads(self, query, ns, resource):
+        kind = 'StatefulSet' if resource == 'statefulsets' else 'Deployment'
+        self._send(200, _list(f'{kind}List', self.cluster.list_workloads(kind, query.get('labelSelector'))))
+
+    def patch_workload(self, query, ns, resource, name):
+        kind = 'StatefulSet' if resource == 'statefulsets' else 'Deployment'
+        self._send(*self.cluster.patch_workload(kind, name, self._body()))
+
+    def read_workload(self, query, ns, resource, name):
+        kind = 'StatefulSet' if resource == 'statefulsets' else 'Deployment'
+        self._send(*self.cluster.read_workload(kind, name))
+
+
+class FakeKubernetesServer:
+    """Runs a FakeCluster behind a threaded HTTP server on a free local port"""
+
+    def __init__(self, cluster: FakeCluster, host: str = '127.0.0.1', port: int = 0):
+        self.cluster = cluster
+        handler = type('Handler', (FakeKubernetesHandler,), {'cluster': cluster})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FakeKubernetesServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='fake-kube-api', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> 'FakeKubernetesServer':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,132 @@
+"""Shared helpers for the package manager benchmarks: timing loops, percentiles and reports"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLUGINS = os.path.join(ROOT, 'plugins')
+
+# The plugin is imported the way Airflow does it, with the plugins folder on sys.path
+if PLUGINS not in sys.path:
+    sys.path.insert(0, PLUGINS)
+
+
+class Result:
+    """Latencies of one benchmark case"""
+
+    def __init__(self, name: str, latencies: List[float], wall: float, errors: int = 0,
+                 extra: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.latencies = sorted(latencies)
+        self.wall = wall
+        self.errors = errors
+        self.extra = extra or {}
+
+    def summary(self) -> Dict[str, Any]:
+        ops = len(self.latencies)
+        return dict({
+            'case': self.name,
+            'ops': ops,
+            'errors': self.errors,
+            'ops_per_s': round(ops / self.wall, 1) if ops and self.wall else None,
+            'p50_ms': _ms(percentile(self.latencies, 50)),
+            'p99_ms': _ms(percentile(self.latencies, 99)),
+            'max_ms': _ms(self.latencies[-1] if self.latencies else None),
+        }, **self.extra)
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of already sorted values"""
+    if not values:
+        return None
+    rank = max(0, min(len(values) - 1, math.ceil(q / 100 * len(values)) - 1))
+    return values[rank]
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+def run(name: str, fn: Callable[[Any], Any], iterations: int, concurrency: int = 1,
+        prepare: Optional[Callable[[int], Any]] = None) -> Result:
+    """Call ``fn(prepare(i))`` ``iterations`` times; only ``fn`` is timed"""
+    def one(i: int):
+        arg = prepare(i) if prepare else i
+        started = time.perf_counter()
+        try:
+            fn(arg)
+        except Exception as e:
+            errors_seen.append(e)
+            if len(errors_seen) == 1:
+                print(f"  {name}: first error: {e!r}", file=sys.stderr)
+            return None
+        return time.perf_counter() - started
+
+    errors_seen: List[Exception] = []
+    started = time.perf_counter()
+    if concurrency <= 1:
+        latencies = [one(i) for i in range(iterations)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(one, range(iterations)))
+    wall = time.perf_counter() - started
+    return Result(name, [l for l in latencies if l is not None], wall, len(errors_seen))
+
+
+def connect(url: str, pool_size: int = 16, context: Optional[str] = None):
+    """Point the plugin's process-wide Kubernetes client pool (of ``context``) at the fake API server"""
+    from kubernetes import client
+
+    from package_manager import kube
+
+    class FakeClusterPool(kube.KubernetesClientPool):
+        def _create_api_client(self) -> client.ApiClient:
+            configuration = client.Configuration(host=url)
+            configuration.connection_pool_maxsize = self.pool_size
+            return kube.ReconnectingApiClient(configuration)
+
+    kube._pools[context] = FakeClusterPool(pool_size, context)
+    return kube._pools[context]
+
+
+def add_cluster_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--latency', type=float, default=0.005, help="seconds added to every fake API request")
+    parser.add_argument('--jitter', type=float, default=0.0, help="random +/- seconds on top of --latency")
+    parser.add_argument('--readiness-delay', type=float, default=0.2,
+                        help="seconds a replaced pod needs to become Ready")
+    parser.add_argument('--json', action='store_true', help="print results as JSON lines")
+    parser.add_argument('--log-level', default='ERROR', help="log level of the plugin while benchmarking")
+
+
+def configure_logging(level: str):
+    logging.getLogger('package_manager').setLevel(level.upper())
+
+
+def report(title: str, rows: List[Dict[str, Any]], as_json: bool = False):
+    if as_json:
+        for row in rows:
+            print(json.dumps(dict(row, benchmark=title)))
+        return
+    if not rows:
+        return
+    columns = list(rows[0])
+    for row in rows[1:]:
+        columns += [c for c in row if c not in columns]
+    widths = {c: max(len(c), *(len(_cell(r.get(c))) for r in rows)) for c in columns}
+    print(f"\n{title}")
+    print('  '.join(c.ljust(widths[c]) for c in columns))
+    print('  '.join('-' * widths[c] for c in columns))
+    for row in rows:
+        print('  '.join(_cell(row.get(c)).ljust(widths[c]) for c in columns))
+
+
+def _cell(value: Any) -> str:
+    return '' if value is None else str(value)
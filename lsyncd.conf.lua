@@ -5,37 +5,34 @@ settings {
     insist     = true
 }
 
+-- Incremental sync of the newest worktree's dags/dbt into the target; it
+-- skips the run when the newest worktree is already synced and otherwise
+-- copies only changed files (see dbt_sync.py for the rsync flags it mirrors)
+dbt_sync = "/etc/lsyncd/dbt_sync.py"
+-- "copy" syncs files into the target directory; "link" publishes hard-linked
+-- versions and atomically flips the target symlink to the newest one
+dbt_sync_mode = os.getenv("DBT_SYNC_MODE") or "copy"
+
 bash = {
     delay = 5,
     maxProcesses = 1,
+    -- A failed run is retried after the delay instead of stopping lsyncd, which
+    -- treats a non-zero exit of the init sync as fatal; refusals exit 0
+    exitcodes = {
+        [0] = "ok",
+        [1] = "again",
+    },
     init = function(event)
-        spawn(event, "/bin/bash", "-c", 
-            string.format([[
-                # Find the most recently modified worktree (sorted by modification time, newest first)
-                wt_dir=$(ls -dt "%s"*/dags/dbt/ 2>/dev/null | head -n 1)
-                if [ -n "$wt_dir" ] && [ -d "$wt_dir" ]; then
-                    rsync -r --links --no-perms --no-owner --no-group --delete --copy-links --keep-dirlinks --safe-links "$wt_dir" "%s"
-                else
-                    echo "Warning: No valid worktree directory found at %s"
-                fi
-            ]], event.source, event.target, event.source)
-        )
+        local config = event.config
+        spawn(event, "/usr/bin/env", "python3", dbt_sync,
+            "--mode", dbt_sync_mode, "--source", config.source, "--target", config.target)
     end,
     action = function(inlet)
         local elist = inlet.getEvents()
         if elist then
             local config = inlet.getConfig()
-            spawn(elist, "/bin/bash", "-c", 
-                string.format([[
-                    # Find the most recently modified worktree (sorted by modification time, newest first)
-                    wt_dir=$(ls -dt "%s"*/dags/dbt/ 2>/dev/null | head -n 1)
-                    if [ -n "$wt_dir" ] && [ -d "$wt_dir" ]; then
-                        rsync -r --links --no-perms --no-owner --no-group --delete --copy-links --keep-dirlinks --safe-links "$wt_dir" "%s"
-                    else
-                        echo "Warning: No valid worktree directory found at %s"
-                    fi
-                ]], config.source, config.target, config.source)
-            )
+            spawn(elist, "/usr/bin/env", "python3", dbt_sync,
+                "--mode", dbt_sync_mode, "--source", config.source, "--target", config.target)
         end
     end
 }
@@ -44,4 +41,4 @@ sync{
     bash,
     source = "/opt/airflow/dags/.worktrees",
     target = "/opt/airflow/dbt"
-}
\ No newline at end of file
+}
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import copy
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from kubernetes import client, watch
+from kubernetes.client.rest import ApiException
+
+from package_manager.metrics import incr
+
+logger = logging.getLogger(__name__)
+
+WATCH_TIMEOUT_SECONDS = 300
+MAX_BACKOFF_SECONDS = 60
+
+
+class ConfigMapConflictError(RuntimeError):
+    """Raised when an update keeps losing the race against concurrent writers"""
+
+
+class ConfigMapCache:
+    """Watch-backed in-memory copy of a single ConfigMap.
+
+    A daemon thread keeps the cached object current through a watch on the
+    ConfigMap, so reads never go to the API server once the cache is synced.
+    Updates carry the cached ``resourceVersion`` as a precondition; on a 409
+    Conflict the ConfigMap is re-read and the mutation re-applied.
+    """
+
+    def __init__(self, core_v1_provider: Callable[[], client.CoreV1Api], namespace: str, name: str,
+                 max_retries: int = 5):
+        self._core_v1 = core_v1_provider
+        self.namespace = namespace
+        self.name = name
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._configmap: Optional[client.V1ConfigMap] = None
+        self._synced = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def get(self) -> Optional[client.V1ConfigMap]:
+        """Return a copy of the cached ConfigMap, reading it directly until the watch is synced"""
+        self._ensure_watch()
+        if not self._synced.is_set():
+            return self.refresh()
+        with self._lock:
+            return copy.deepcopy(self._configmap)
+
+    def refresh(self) -> Optional[client.V1ConfigMap]:
+        """Read the ConfigMap from the API server and store it"""
+        try:
+            configmap = self._core_v1().read_namespaced_config_map(self.name, self.namespace)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            configmap = None
+        self._store(configmap, force=True)
+        return copy.deepcopy(configmap)
+
+    def update(self, mutate: Callable[[Dict[str, str]], Dict[str, str]]) -> client.V1ConfigMap:
+        """Apply ``mutate`` to the ConfigMap data with optimistic concurrency.
+
+        ``mutate`` receives a copy of the current data and returns the new
+        data; it is called again with fresh data after every conflict.
+        """
+        configmap = self.get()
+        for attempt in range(1, self.max_retries + 1):
+            if configmap is None:
+                raise RuntimeError(f"ConfigMap {self.name} not found")
+            data = mutate(dict(configmap.data or {}))
+            body = {
+                'metadata': {'resourceVersion': configmap.metadata.resource_version},
+                'data': data
+            }
+            try:
+                updated = self._core_v1().patch_namespaced_config_map(self.name, self.namespace, body)
+            except ApiException as e:
+                if e.status != 409:
+                    raise
+                incr('configmap.conflicts')
+                logger.info(
+                    f"ConfigMap {self.name} changed since resourceVersion "
+                    f"{configmap.metadata.resource_version}, retrying ({attempt}/{self.max_retries})"
+                )
+                configmap = self.refresh()
+                continue
+            self._store(updated, force=True)
+            return copy.deepcopy(updated)
+        raise ConfigMapConflictError(
+            f"ConfigMap {self.name} was modified concurrently {self.max_retries} times, giving up"
+        )
+
+    def _store(self, configmap: Optional[client.V1ConfigMap], force: bool = False):
+        with self._lock:
+            if not force and configmap is not None and self._is_older(configmap, self._configmap):
+                return
+            self._configmap = configmap
+
+    @staticmethod
+    def _is_older(candidate: client.V1ConfigMap, current: Optional[client.V1ConfigMap]) -> bool:
+        """Ignore watch events that are older than what a write already stored"""
+        if current is None:
+            return False
+        try:
+            return int(candidate.metadata.resource_version) < int(current.metadata.resource_version)
+        except (TypeError, ValueError):
+            return False
+
+    def _ensure_watch(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._synced.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._watch_loop,
+                name=f"package-manager-watch-{self.name}",
+                daemon=True
+            )
+            self._thread.start()
+
+    def _watch_loop(self):
+        backoff = 1
+        resource_version = None
+        while True:
+            try:
+                if resource_version is None:
+                    configmap = self.refresh()
+                    resource_version = configmap.metadata.resource_version if configmap else None
+                    self._synced.set()
+
+                stream = watch.Watch().stream(
+                    self._core_v1().list_namespaced_config_map,
+                    self.namespace,
+                    field_selector=f"metadata.name={self.name}",
+                    resource_version=resource_version,
+                    timeout_seconds=WATCH_TIMEOUT_SECONDS
+                )
+                for event in stream:
+                    obj = event['object']
+                    if event['type'] in ('ADDED', 'MODIFIED'):
+                        self._store(obj)
+                        resource_version = obj.metadata.resource_version
+                    elif event['type'] == 'DELETED':
+                        self._store(None, force=True)
+                        resource_version = obj.metadata.resource_version
+                backoff = 1
+            except ApiException as e:
+                if e.status == 410:
+                    # resourceVersion too old, relist
+                    logger.info(f"Watch on ConfigMap {self.name} expired, re-reading")
+                    resource_version = None
+                    continue
+                logger.warning(f"Watch on ConfigMap {self.name} failed: {e}")
+                self._synced.clear()
+                resource_version = None
+                time.sleep(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+            except Exception as e:
+                logger.warning(f"Watch on ConfigMap {self.name} failed: {e}")
+                self._synced.clear()
+                resource_version = None
+                time.sleep(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+
+
+_caches: Dict[Tuple[Optional[str], str, str], ConfigMapCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_configmap_cache(core_v1_provider: Callable[[], client.CoreV1Api], namespace: str, name: str,
+                        max_retries: int = 5, context: Optional[str] = None) -> ConfigMapCache:
+    """Process-wide ConfigMapCache for the given ConfigMap in the cluster of a kubeconfig context"""
+    with _caches_lock:
+        cache = _caches.get((context, namespace, name))
+        if cache is None:
+            cache = ConfigMapCache(core_v1_provider, namespace, name, max_retries=max_retries)
+            _caches[(context, namespace, name)] = cache
+        return cache
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import logging
+import math
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from package_manager.metrics import incr, timing
+
+logger = logging.getLogger(__name__)
+
+
+def celery_app() -> Optional[Any]:
+    """Airflow's Celery application, or None when the Celery executor is not installed"""
+    try:
+        from airflow.providers.celery.executors.celery_executor_utils import app
+        return app
+    except ImportError:
+        pass
+    try:
+        # Airflow < 2.7 shipped the Celery executor in core
+        from airflow.executors.celery_executor import app
+        return app
+    except ImportError:
+        return None
+
+
+def running_task_instances(pods: List[str]) -> Dict[str, int]:
+    """Running task instances per pod, from the Airflow metadata database.
+
+    ``TaskInstance.hostname`` is the worker's FQDN, which for StatefulSet pods
+    is the pod name followed by the headless service domain.
+    """
+    from sqlalchemy import func, or_
+
+    from airflow.models.taskinstance import TaskInstance
+    from airflow.utils.session import create_session
+    from airflow.utils.state import TaskInstanceState
+
+    matches = [or_(TaskInstance.hostname == pod, TaskInstance.hostname.like(f"{pod}.%")) for pod in pods]
+    with create_session() as session:
+        rows = session.query(TaskInstance.hostname, func.count()).filter(
+            TaskInstance.state == TaskInstanceState.RUNNING,
+            or_(*matches)
+        ).group_by(TaskInstance.hostname).all()
+    running = {pod: 0 for pod in pods}
+    for hostname, count in rows:
+        pod = hostname.split('.', 1)[0]
+        if pod in running:
+            running[pod] += count
+    return running
+
+
+def batch_size(replicas: int, min_available: str) -> int:
+    """Pods restarted at once so at least ``min_available`` stay in service.
+
+    ``min_available`` is a pod count or a percentage of the replicas, rounded
+    up like a PodDisruptionBudget. At least one pod is restarted per batch,
+    even when that takes the workload below the floor.
+    """
+    value = str(min_available).strip()
+    if value.endswith('%'):
+        floor = math.ceil(replicas * float(value[:-1]) / 100)
+    else:
+        floor = int(value)
+    return max(1, replicas - floor)
+
+
+class WorkerDrainer:
+    """Stops Celery workers from taking new tasks and waits for their running task instances.
+
+    Each pod's worker (``celery@<pod>``) is told to cancel its consumers for
+    every queue it listens on, then the metadata database is polled until the
+    pods run no task instance or ``timeout`` expires. A replaced pod starts a
+    fresh worker with its consumers; workers whose pods are not replaced, e.g.
+    because the rollout failed, get their cancelled consumers back through
+    ``resume``. Without Celery the pods keep taking tasks, but running ones
+    are still waited for.
+    """
+
+    def __init__(
+        self,
+        timeout: int = 600,
+        poll_interval: float = 5,
+        components: Optional[List[str]] = None,
+        app: Optional[Any] = None,
+        running_tasks: Optional[Callable[[List[str]], Dict[str, int]]] = None,
+    ):
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.components = components or ['worker']
+        self.app = app if app is not None else celery_app()
+        self.running_tasks = running_tasks or running_task_instances
+
+    def drain(self, pods: List[str]) -> Dict[str, Any]:
+        """Drain ``pods``; returns how many task instances were still running at the deadline"""
+        started = time.monotonic()
+        cancelled = self._stop_consuming(pods)
+        deadline = started + self.timeout
+        running = 0
+        while True:
+            try:
+                running = sum(self.running_tasks(pods).values())
+            except Exception as e:
+                # Without the task state there is nothing to wait for
+                logger.warning(f"Could not read running task instances of {', '.join(pods)}: {e}")
+                break
+            if not running:
+                break
+            if time.monotonic() >= deadline:
+                logger.warning(f"{running} task instance(s) still running on {', '.join(pods)} "
+                               f"after the {self.timeout}s drain deadline")
+                incr('drain.timeouts')
+                incr('drain.interrupted_tasks', running)
+                break
+            time.sleep(self.poll_interval)
+
+        duration = time.monotonic() - started
+        timing('drain.wait', duration)
+        return {
+            'pods': pods,
+            'consumers_cancelled': cancelled,
+            'running': running,
+            'drained': running == 0,
+            'duration': round(duration, 3),
+        }
+
+    def resume(self, cancelled: Dict[str, List[str]]):
+        """Re-add consumers cancelled by ``drain``, as returned in its ``consumers_cancelled``.
+
+        Adding a queue a worker already consumes is a no-op, so workers that
+        were replaced in the meantime are unaffected.
+        """
+        if self.app is None:
+            return
+        for worker, queues in cancelled.items():
+            try:
+                for queue in queues:
+                    self.app.control.add_consumer(queue, destination=[worker], reply=True, timeout=5)
+            except Exception as e:
+                logger.warning(f"Could not resume task intake of {worker}, it stays idle until restarted: {e}")
+                continue
+            logger.info(f"Resumed consuming {', '.join(queues)} on {worker}")
+            incr('drain.resumed_workers')
+
+    def _stop_consuming(self, pods: List[str]) -> Dict[str, List[str]]:
+        """Cancel the queue consumers of the pods' workers; returns the cancelled queues per worker"""
+        if self.app is None:
+            logger.warning("Celery is not available; draining workers keep taking new tasks")
+            return {}
+        workers = [f"celery@{pod}" for pod in pods]
+        cancelled: Dict[str, List[str]] = {}
+        try:
+            queues = self.app.control.inspect(destination=workers, timeout=5).active_queues() or {}
+            for worker, consumed in queues.items():
+                cancelled[worker] = []
+                for queue in consumed:
+                    self.app.control.cancel_consumer(queue['name'], destination=[worker], reply=True, timeout=5)
+                    cancelled[worker].append(queue['name'])
+        except Exception as e:
+            logger.warning(f"Could not stop task intake of {', '.join(workers)}: {e}")
+            # Consumers cancelled before the failure still have to be resumable
+            return cancelled
+        missing = sorted(set(workers) - set(queues))
+        if missing:
+            logger.warning(f"No reply from {', '.join(missing)}; they keep taking new tasks while draining")
+        return cancelled
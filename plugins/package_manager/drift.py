@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Tuple
+
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+from kubernetes.stream import stream
+from packaging.specifiers import SpecifierSet
+from packaging.utils import canonicalize_name
+from packaging.version import InvalidVersion
+
+from package_manager.metrics import gauge, incr, timed
+from package_manager.requirements import RequirementsFile
+
+logger = logging.getLogger(__name__)
+
+# Runs inside the pod: Python version and every installed distribution
+INSTALLED_SCRIPT = (
+    "import json, platform\n"
+    "from importlib import metadata\n"
+    "print(json.dumps({'python': platform.python_version(), 'packages': "
+    "{d.metadata['Name']: d.version for d in metadata.distributions() if d.metadata['Name']}}))"
+)
+
+
+class DriftCollector:
+    """Compares what each Airflow pod has installed with the requested requirements.
+
+    Pods of every component are exec'd into concurrently on a bounded thread
+    pool. The installed distributions of a container cannot change without a
+    new pod, image or container restart, so they are cached per pod UID,
+    image ID and restart count and only new or restarted pods are exec'd
+    again. Exec streams swap the ApiClient's transport while they run, so each
+    pool thread uses its own ApiClient instead of the shared one.
+    """
+
+    def __init__(
+        self,
+        core_v1_provider: Callable[[], client.CoreV1Api],
+        api_client_factory: Callable[[], client.ApiClient],
+        namespace: str,
+        components: List[str],
+        max_parallel: int = 16,
+        exec_timeout: int = 60,
+    ):
+        self.core_v1_provider = core_v1_provider
+        self.api_client_factory = api_client_factory
+        self.namespace = namespace
+        self.components = components
+        self.exec_timeout = exec_timeout
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_parallel), thread_name_prefix="package-manager-drift")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cache: Dict[Tuple[str, str, int], Dict[str, Any]] = {}
+
+    def collect(self, requirements: RequirementsFile, refresh: bool = False) -> Dict[str, Any]:
+        """Return per-pod installed state and every requirement a pod does not satisfy"""
+        started = time.monotonic()
+        with timed('drift.collect'):
+            pods = self._discover()
+            if refresh:
+                with self._lock:
+                    self._cache.clear()
+            results = list(self._pool.map(self._inspect, pods))
+            with self._lock:
+                # Forget pods that no longer exist
+                live = {(pod['uid'], pod['image_id'], pod['restart_count']) for pod in pods}
+                for key in [key for key in self._cache if key not in live]:
+                    del self._cache[key]
+
+        packages: Dict[str, Dict[str, Any]] = {}
+        for pod in results:
+            installed = pod.pop('installed')
+            pod['mismatches'] = self.compare(requirements, installed) if installed is not None else []
+            if pod['status'] == 'collected':
+                pod['status'] = 'drifted' if pod['mismatches'] else 'ok'
+            for mismatch in pod['mismatches']:
+                entry = packages.setdefault(mismatch['name'], {
+                    'name': mismatch['name'],
+                    'requirement': mismatch['requirement'],
+                    'installed': {},
+                })
+                entry['installed'].setdefault(mismatch['installed'] or 'missing', []).append(pod['name'])
+
+        drifted = sum(1 for pod in results if pod['status'] == 'drifted')
+        errors = sum(1 for pod in results if pod['status'] == 'error')
+        gauge('drift.pods_drifted', drifted)
+        return {
+            'collected_at': datetime.now(timezone.utc).isoformat(),
+            'duration': round(time.monotonic() - started, 3),
+            'summary': {'pods': len(results), 'drifted': drifted, 'errors': errors},
+            'drift': sorted(packages.values(), key=lambda p: p['name']),
+            'pods': results,
+        }
+
+    @staticmethod
+    def compare(requirements: RequirementsFile, installed: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Requirements whose marker applies to the pod but are missing or not satisfied"""
+        versions = {canonicalize_name(name): version for name, version in installed['packages'].items()}
+        environment = {'python_version': '.'.join(installed['python'].split('.')[:2]),
+                       'python_full_version': installed['python']}
+        mismatches = []
+        for line in requirements:
+            req = line.requirement
+            if req.marker and not req.marker.evaluate(environment):
+                continue
+            version = versions.get(line.name)
+            # A direct URL reference cannot be checked against a version
+            if version is not None and (req.url or _satisfies(req.specifier, version)):
+                continue
+            mismatches.append({'name': line.name, 'requirement': line.text, 'installed': version})
+        return mismatches
+
+    def _discover(self) -> List[Dict[str, Any]]:
+        """List the pods of every component, labelled like the workloads in RolloutRestarter"""
+        core_v1 = self.core_v1_provider()
+        pods = []
+        for component in self.components:
+            try:
+                items = core_v1.list_namespaced_pod(self.namespace, label_selector=f"component={component}").items
+            except ApiException as e:
+                logger.error(f"Error listing pods for component {component}: {e}")
+                continue
+            for pod in items:
+                # Chart pods name their main container after the component; sidecars are ignored
+                containers = pod.spec.containers or []
+                container = next((c for c in containers if c.name == component), containers[0] if containers else None)
+                status = next((s for s in pod.status.container_statuses or [] if container and s.name == container.name),
+                              None)
+                pods.append({
+                    'name': pod.metadata.name,
+                    'uid': pod.metadata.uid,
+                    'component': component,
+                    'container': container.name if container else None,
+                    'image_id': status.image_id if status else None,
+                    'restart_count': status.restart_count if status else 0,
+                    'phase': pod.status.phase,
+                    'ready': bool(status and status.ready),
+                })
+        return pods
+
+    def _inspect(self, pod: Dict[str, Any]) -> Dict[str, Any]:
+        result = dict(pod, status='collected', cached=False, error=None, installed=None)
+        if pod['phase'] != 'Running' or not pod['ready'] or pod['container'] is None:
+            result['status'] = 'not_ready'
+            return result
+
+        key = (pod['uid'], pod['image_id'], pod['restart_count'])
+        with self._lock:
+            installed = self._cache.get(key)
+        if installed is not None:
+            incr('drift.cache_hits')
+            result.update(installed=installed, cached=True)
+            return result
+
+        try:
+            with timed('drift.exec', {'component': pod['component']}):
+                installed = self._exec(pod)
+        except Exception as e:
+            logger.warning(f"Could not read installed packages of pod {pod['name']}: {e}")
+            result.update(status='error', error=str(e))
+            return result
+        with self._lock:
+            self._cache[key] = installed
+        result['installed'] = installed
+        return result
+
+    def _exec(self, pod: Dict[str, Any]) -> Dict[str, Any]:
+        """Run INSTALLED_SCRIPT in the pod's main container and parse its output"""
+        if getattr(self._local, 'core_v1', None) is None:
+            self._local.core_v1 = client.CoreV1Api(self.api_client_factory())
+        response = stream(
+            self._local.core_v1.connect_get_namespaced_pod_exec,
+            pod['name'],
+            self.namespace,
+            container=pod['container'],
+            command=['python', '-c', INSTALLED_SCRIPT],
+            stderr=True, stdin=False, stdout=True, tty=False,
+            _preload_content=False,
+        )
+        try:
+            response.run_forever(timeout=self.exec_timeout)
+            if response.is_open():
+                raise TimeoutError(f"exec did not finish within {self.exec_timeout}s")
+            stdout, stderr = response.read_stdout(), response.read_stderr()
+            if response.returncode != 0:
+                raise RuntimeError(f"exit code {response.returncode}: {stderr.strip()[-500:]}")
+        finally:
+            response.close()
+        return json.loads(stdout.strip().splitlines()[-1])
+
+
+def _satisfies(specifier: SpecifierSet, version: str) -> bool:
+    try:
+        return specifier.contains(version, prereleases=True)
+    except InvalidVersion:
+        return False
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Optional
+
+DEFAULT_CONFIGMAP = 'airflow-config-pypi'
+
+
+class Environment:
+    """An Airflow deployment the package manager can change.
+
+    Identified by its namespace, the ConfigMap holding its requirements and
+    the kubeconfig context of its cluster (None for the cluster the webserver
+    runs in).
+    """
+
+    def __init__(self, name: str, namespace: str, configmap: str = DEFAULT_CONFIGMAP,
+                 context: Optional[str] = None):
+        self.name = name
+        self.namespace = namespace
+        self.configmap = configmap
+        self.context = context
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'namespace': self.namespace,
+            'configmap': self.configmap,
+            'context': self.context,
+        }
+
+    def __repr__(self) -> str:
+        return f"Environment({self.name!r}, namespace={self.namespace!r}, context={self.context!r})"
+
+
+def parse_environments(value: str) -> Dict[str, Environment]:
+    """Parse the ``environments`` option.
+
+    A JSON object of environment name to ``{"namespace": ..., "configmap": ...,
+    "context": ...}``; only ``namespace`` is required. Raises ValueError when
+    the option is not such an object.
+    """
+    parsed = json.loads(value or '{}') or {}
+    if not isinstance(parsed, dict):
+        raise ValueError("Environments must be a JSON object of environment name to options")
+    environments: Dict[str, Environment] = {}
+    for name, options in parsed.items():
+        if not isinstance(options, dict) or not options.get('namespace'):
+            raise ValueError(f"Environment '{name}' needs at least a namespace")
+        environments[name] = Environment(
+            name,
+            options['namespace'],
+            configmap=options.get('configmap') or DEFAULT_CONFIGMAP,
+            context=options.get('context')
+        )
+    return environments
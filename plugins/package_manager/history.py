@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import base64
+import difflib
+import json
+import logging
+import re
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+
+from package_manager.metrics import incr
+
+logger = logging.getLogger(__name__)
+
+HISTORY_SUFFIX = '-history'
+REVISION_KEY = re.compile(r'^revision-(\d+)$')
+# ConfigMaps are limited to 1 MiB; leave room for metadata
+MAX_HISTORY_BYTES = 900 * 1024
+
+
+class HistoryConflictError(RuntimeError):
+    """Raised when recording a revision keeps losing the race against concurrent writers"""
+
+
+def diff_requirements(before: str, after: str) -> List[str]:
+    """Added and removed requirement lines, as ``+line`` / ``-line``"""
+    return [line[0] + line[2:].strip() for line in difflib.ndiff(before.splitlines(), after.splitlines())
+            if line[:2] in ('+ ', '- ') and line[2:].strip() and not line[2:].lstrip().startswith('#')]
+
+
+class RequirementsHistory:
+    """Append-only revisions of a requirements ConfigMap, kept in a companion ConfigMap.
+
+    Every applied change becomes one ``revision-<n>`` key holding the full
+    requirements.txt, the diff to the previous content, the user, a timestamp
+    and a description, as zlib-compressed JSON. Full content makes any
+    revision restorable with a single patch. The oldest revisions are dropped
+    in the same write once more than ``keep`` exist or the ConfigMap would
+    outgrow ``MAX_HISTORY_BYTES``. Writes carry the read ``resourceVersion``
+    and are retried on conflict, like ConfigMapCache.
+    """
+
+    def __init__(self, core_v1_provider: Callable[[], client.CoreV1Api], namespace: str, name: str,
+                 keep: int = 50, max_retries: int = 5):
+        self._core_v1 = core_v1_provider
+        self.namespace = namespace
+        self.name = name
+        self.keep = max(2, keep)
+        self.max_retries = max_retries
+
+    def record(self, before: str, after: str, user: str, description: str,
+               **details: Any) -> Tuple[int, bool]:
+        """Append ``after`` as a new revision; returns its number and whether it was created.
+
+        The first revision of an empty history is ``before``, so the state
+        preceding the first recorded change can be rolled back to as well.
+        Nothing is recorded when ``after`` equals the latest revision, whose
+        number is returned instead. Extra ``details`` (job ID, rollback
+        target) are stored with it.
+        """
+        for attempt in range(1, self.max_retries + 1):
+            configmap = self._read()
+            data = dict(configmap.data or {}) if configmap is not None else {}
+            revisions = sorted(int(m.group(1)) for m in map(REVISION_KEY.match, data) if m)
+
+            updates: Dict[str, Optional[str]] = {}
+            latest = _decode(data[_key(revisions[-1])]) if revisions else None
+            if latest is None:
+                revisions.append(1)
+                updates[_key(1)] = _encode(_entry(1, before, [], '', 'Requirements before the first recorded change'))
+            elif latest['requirements'] == after:
+                return latest['revision'], False
+            revision = revisions[-1] + 1
+            revisions.append(revision)
+            updates[_key(revision)] = _encode(_entry(revision, after, diff_requirements(before, after), user,
+                                                     description, **details))
+
+            # Drop the oldest revisions beyond keep or the size budget
+            sizes = {key: len(value) for key, value in {**data, **updates}.items()}
+            while len(revisions) > 1 and (len(revisions) > self.keep or sum(sizes.values()) > MAX_HISTORY_BYTES):
+                oldest = _key(revisions.pop(0))
+                updates[oldest] = None
+                sizes.pop(oldest, None)
+
+            try:
+                self._write(configmap, updates)
+            except ApiException as e:
+                if e.status != 409:
+                    raise
+                incr('history.conflicts')
+                logger.info(f"ConfigMap {self.name} changed concurrently, retrying ({attempt}/{self.max_retries})")
+                continue
+            return revision, True
+        raise HistoryConflictError(
+            f"ConfigMap {self.name} was modified concurrently {self.max_retries} times, giving up"
+        )
+
+    def discard(self, revision: int):
+        """Remove a revision that was recorded for a change that was not applied"""
+        for attempt in range(1, self.max_retries + 1):
+            configmap = self._read()
+            if configmap is None or _key(revision) not in (configmap.data or {}):
+                return
+            try:
+                self._write(configmap, {_key(revision): None})
+            except ApiException as e:
+                if e.status != 409:
+                    raise
+                incr('history.conflicts')
+                continue
+            return
+        raise HistoryConflictError(
+            f"ConfigMap {self.name} was modified concurrently {self.max_retries} times, giving up"
+        )
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Revisions newest first, without the requirements content"""
+        configmap = self._read()
+        entries = []
+        for key, value in ((configmap.data or {}) if configmap is not None else {}).items():
+            if REVISION_KEY.match(key):
+                entry = _decode(value)
+                entry.pop('requirements', None)
+                entries.append(entry)
+        return sorted(entries, key=lambda e: e['revision'], reverse=True)
+
+    def get(self, revision: int) -> Optional[Dict[str, Any]]:
+        """A revision including its requirements.txt, or None if it was pruned or never existed"""
+        configmap = self._read()
+        value = (configmap.data or {}).get(_key(revision)) if configmap is not None else None
+        return _decode(value) if value is not None else None
+
+    def _read(self) -> Optional[client.V1ConfigMap]:
+        try:
+            return self._core_v1().read_namespaced_config_map(self.name, self.namespace)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+            return None
+
+    def _write(self, configmap: Optional[client.V1ConfigMap], updates: Dict[str, Optional[str]]):
+        if configmap is None:
+            # A concurrent create fails with 409 and is retried as a patch
+            self._core_v1().create_namespaced_config_map(self.namespace, client.V1ConfigMap(
+                metadata=client.V1ObjectMeta(
+                    name=self.name,
+                    labels={'app.kubernetes.io/managed-by': 'airflow-package-manager'}
+                ),
+                data={key: value for key, value in updates.items() if value is not None}
+            ))
+            return
+        # A null value removes the key
+        self._core_v1().patch_namespaced_config_map(self.name, self.namespace, {
+            'metadata': {'resourceVersion': configmap.metadata.resource_version},
+            'data': updates
+        })
+
+
+def _key(revision: int) -> str:
+    return f"revision-{revision:08d}"
+
+
+def _entry(revision: int, requirements: str, diff: List[str], user: str, description: str,
+           **details: Any) -> Dict[str, Any]:
+    return {
+        'revision': revision,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'user': user,
+        'description': description,
+        'diff': diff,
+        'requirements': requirements,
+        **details,
+    }
+
+
+def _encode(entry: Dict[str, Any]) -> str:
+    payload = json.dumps(entry, separators=(',', ':')).encode()
+    return base64.b64encode(zlib.compress(payload, 9)).decode('ascii')
+
+
+def _decode(value: str) -> Dict[str, Any]:
+    return json.loads(zlib.decompress(base64.b64decode(value)))
@@ -0,0 +1,328 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from package_manager import metrics
+
+logger = logging.getLogger(__name__)
+
+# 'interrupted': the process running the job exited before it finished
+TERMINAL_STATES = ('succeeded', 'failed', 'interrupted')
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class PackageJob:
+    """State of one queued package change, updated by the background executor"""
+
+    def __init__(self, operation: str, description: str, user: str):
+        self.id = uuid.uuid4().hex
+        self.operation = operation
+        self.description = description
+        self.user = user
+        # Process running the job, so snapshots it left behind can be recognised
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.status = 'queued'
+        self.message: Optional[str] = None
+        self.error: Optional[str] = None
+        self.created_at = _now()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.phases: List[Dict[str, Any]] = []
+        self.workloads: Dict[str, Dict[str, Any]] = {}
+        self.environments: Dict[str, Dict[str, Any]] = {}
+        self.version = 0
+        self._lock = threading.RLock()
+        self._on_change: Optional[Callable[[PackageJob], None]] = None
+
+    @contextmanager
+    def phase(self, name: str, environment: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Record status and duration of a job phase, optionally of one environment of a fan-out"""
+        entry = self.start_phase(name, environment)
+        try:
+            yield entry
+        except Exception as e:
+            self.finish_phase(entry, e)
+            raise
+        else:
+            self.finish_phase(entry)
+
+    def start_phase(self, name: str, environment: Optional[str] = None) -> Dict[str, Any]:
+        """Open a phase that finishes outside the current call, see finish_phase"""
+        entry = {'name': name, 'status': 'running', 'started_at': _now(), 'finished_at': None, 'duration': None,
+                 '_started': time.monotonic()}
+        if environment is not None:
+            entry['environment'] = environment
+        with self._lock:
+            self.phases.append(entry)
+            self._changed()
+        return entry
+
+    def finish_phase(self, entry: Dict[str, Any], error: Optional[BaseException] = None, skipped: bool = False):
+        """Close a phase; ``skipped`` marks an optional phase that did not do its work, e.g. because of ``error``"""
+        with self._lock:
+            entry['status'] = 'skipped' if skipped else 'failed' if error else 'succeeded'
+            if error:
+                entry['error'] = str(error)
+            entry['finished_at'] = _now()
+            entry['duration'] = round(time.monotonic() - entry['_started'], 3)
+            self._changed()
+        tags = {'phase': entry['name'], 'operation': self.operation}
+        if 'environment' in entry:
+            tags['environment'] = entry['environment']
+        metrics.timing(f"job.phase.{entry['name']}", time.monotonic() - entry['_started'], tags)
+
+    def record_workload(self, workload: Dict[str, Any]):
+        """Progress callback for RolloutRestarter"""
+        key = '/'.join(filter(None, (workload.get('environment'), workload['kind'], workload['name'])))
+        with self._lock:
+            self.workloads[key] = workload
+            self._changed()
+
+    def record_environment(self, name: str, status: str, error: Optional[str] = None):
+        """Status of one environment of a multi-environment change"""
+        with self._lock:
+            entry = self.environments.setdefault(name, {
+                'name': name, 'status': 'queued', 'error': None, 'started_at': None, 'finished_at': None,
+                'duration': None, '_started': None,
+            })
+            entry['status'] = status
+            if status == 'running':
+                entry['started_at'] = _now()
+                entry['_started'] = time.monotonic()
+            if status in TERMINAL_STATES:
+                entry['finished_at'] = _now()
+                if entry['_started'] is not None:
+                    entry['duration'] = round(time.monotonic() - entry['_started'], 3)
+            if error is not None:
+                entry['error'] = error
+            self._changed()
+
+    def set_status(self, status: str, message: Optional[str] = None, error: Optional[str] = None):
+        with self._lock:
+            self.status = status
+            if status == 'running':
+                self.started_at = _now()
+            if status in TERMINAL_STATES:
+                self.finished_at = _now()
+            if message is not None:
+                self.message = message
+            if error is not None:
+                self.error = error
+            self._changed()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'id': self.id,
+                'operation': self.operation,
+                'description': self.description,
+                'user': self.user,
+                'owner': self.owner,
+                'status': self.status,
+                'message': self.message,
+                'error': self.error,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'phases': [{k: v for k, v in p.items() if not k.startswith('_')} for p in self.phases],
+                'workloads': [dict(w) for w in self.workloads.values()],
+                'environments': [{k: v for k, v in e.items() if not k.startswith('_')}
+                                 for e in self.environments.values()],
+                'version': self.version,
+            }
+
+    def _changed(self):
+        self.version += 1
+        if self._on_change is not None:
+            self._on_change(self)
+
+
+class JobRegistry:
+    """Runs package change jobs in a background executor and keeps their status.
+
+    Jobs are executed one at a time per webserver process so ConfigMap edits are
+    applied in submission order. A runner may return a Future for work that
+    continues elsewhere (the coalesced restart); the job finishes when it does
+    while the executor moves on to the next job. Every state change is also written as a JSON
+    snapshot to ``state_dir`` so the status endpoints work no matter which
+    gunicorn worker serves the request. Snapshots left queued or running by a
+    process of this host that no longer exists are marked ``interrupted``
+    when a registry starts.
+    """
+
+    def __init__(self, state_dir: Optional[str] = None, retention: int = 86400):
+        self.state_dir = state_dir
+        self.retention = retention
+        self._jobs: Dict[str, PackageJob] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        if state_dir:
+            try:
+                os.makedirs(state_dir, exist_ok=True)
+            except OSError as e:
+                logger.warning(f"Could not create job state directory {state_dir}: {e}")
+                self.state_dir = None
+            else:
+                self._recover()
+
+    def submit(self, operation: str, description: str, user: str,
+               runner: Callable[[PackageJob], Any]) -> PackageJob:
+        """Queue a job; ``runner`` returns the success message (or a Future of it) or raises"""
+        job = PackageJob(operation, description, user)
+        job._on_change = self._persist
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="package-manager-job")
+            executor = self._executor
+        self._persist(job)
+        executor.submit(self._run, job, runner)
+        logger.info(f"Queued job {job.id}: {description}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the job status, falling back to snapshots written by other workers"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        path = self._snapshot_path(job_id)
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read job snapshot {path}: {e}")
+            return None
+
+    def list(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most recent jobs first"""
+        jobs: Dict[str, Dict[str, Any]] = {}
+        if self.state_dir:
+            for name in os.listdir(self.state_dir):
+                if name.endswith('.json'):
+                    job = self.get(name[:-5])
+                    if job:
+                        jobs[job['id']] = job
+        for job_id, job in list(self._jobs.items()):
+            jobs[job_id] = job.to_dict()
+        return sorted(jobs.values(), key=lambda j: j['created_at'], reverse=True)[:limit]
+
+    def _run(self, job: PackageJob, runner: Callable[[PackageJob], Any]):
+        job.set_status('running')
+        try:
+            outcome = runner(job)
+        except Exception as e:
+            self._finish(job, error=e)
+            return
+        if isinstance(outcome, Future):
+            # The runner handed its last phase to another thread (e.g. a
+            # coalesced restart); free the executor for the next job
+            outcome.add_done_callback(
+                lambda future: self._finish(job, future.result() if not future.exception() else None,
+                                            future.exception())
+            )
+        else:
+            self._finish(job, outcome)
+
+    def _finish(self, job: PackageJob, message: Optional[str] = None, error: Optional[BaseException] = None):
+        if error is not None:
+            logger.error(f"Job {job.id} failed: {error}")
+            job.set_status('failed', error=str(error))
+        else:
+            job.set_status('succeeded', message=message)
+            logger.info(f"Job {job.id} succeeded: {message}")
+        metrics.incr(f"job.{job.status}", tags={'operation': job.operation})
+        if metrics.PROFILE_REQUESTS:
+            total = datetime.fromisoformat(job.finished_at) - datetime.fromisoformat(job.started_at)
+            metrics.log_profile(f"job {job.id} {job.operation} ({job.status})", total.total_seconds(),
+                                [(f"phase.{p['name']}", p['duration'] or 0.0) for p in job.phases])
+
+    def _persist(self, job: PackageJob):
+        self._write_snapshot(job.id, job.to_dict())
+
+    def _write_snapshot(self, job_id: str, data: Dict[str, Any]):
+        path = self._snapshot_path(job_id)
+        if not path:
+            return
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write job snapshot {path}: {e}")
+
+    def _recover(self):
+        """Mark jobs whose process exited before they finished as interrupted"""
+        for name in os.listdir(self.state_dir):
+            if not name.endswith('.json'):
+                continue
+            job = self.get(name[:-5])
+            if not job or job['status'] in TERMINAL_STATES or _owner_alive(job.get('owner')):
+                continue
+            logger.warning(f"Job {job['id']} was left {job['status']} by {job.get('owner') or 'an earlier process'}, "
+                           f"marking it interrupted")
+            job.update(status='interrupted', finished_at=_now(),
+                       error=f"The webserver process exited while the job was {job['status']}")
+            self._write_snapshot(job['id'], job)
+            metrics.incr('job.interrupted', tags={'operation': job['operation']})
+
+    def _snapshot_path(self, job_id: str) -> Optional[str]:
+        if not self.state_dir or not job_id.isalnum():
+            return None
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    def _prune(self):
+        """Forget finished jobs older than the retention period; unfinished ones are kept however old"""
+        cutoff = time.time() - self.retention
+        for job_id, job in list(self._jobs.items()):
+            if job.status in TERMINAL_STATES and job.finished_at and \
+                    datetime.fromisoformat(job.finished_at).timestamp() < cutoff:
+                del self._jobs[job_id]
+        if not self.state_dir:
+            return
+        for name in os.listdir(self.state_dir):
+            path = os.path.join(self.state_dir, name)
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                if name.endswith('.json'):
+                    # A long rollout may not touch its snapshot for a while; it
+                    # is still needed to mark the job interrupted after a crash
+                    job = self.get(name[:-5])
+                    if job is not None and job['status'] not in TERMINAL_STATES:
+                        continue
+                os.remove(path)
+            except OSError:
+                continue
+
+
+def _owner_alive(owner: Optional[str]) -> bool:
+    """Whether the ``host:pid`` that owns a job may still run it; other hosts are assumed alive"""
+    if not owner:
+        return False
+    host, _, pid = owner.rpartition(':')
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except (ProcessLookupError, ValueError):
+        return False
+    except PermissionError:
+        pass
+    return True
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import urllib3
+from kubernetes import client, config
+from kubernetes.client.rest import ApiException
+
+from package_manager.metrics import InstrumentedApi, incr
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 16
+
+
+def load_configuration(configuration: client.Configuration, context: Optional[str] = None):
+    """Fill ``configuration`` from the in-cluster service account, or from a kubeconfig context"""
+    if context:
+        config.load_kube_config(context=context, client_configuration=configuration)
+    else:
+        # try_refresh_token (the default) installs a hook that re-reads the
+        # projected service account token when it is rotated
+        config.load_incluster_config(client_configuration=configuration)
+
+
+class ReconnectingApiClient(client.ApiClient):
+    """ApiClient that recovers from a rotated token or a broken connection pool.
+
+    A 401 reloads the configuration (re-reading the projected service account
+    token, or the kubeconfig of ``context``) and retries once; connection level
+    errors drop the pooled connections and retry once.
+    """
+
+    def __init__(self, configuration: Optional[client.Configuration] = None, context: Optional[str] = None):
+        super().__init__(configuration)
+        self.context = context
+
+    def call_api(self, *args, **kwargs):
+        try:
+            return super().call_api(*args, **kwargs)
+        except ApiException as e:
+            if e.status != 401:
+                raise
+            logger.warning("Kubernetes API returned 401, reloading credentials")
+            incr('kubernetes.token_reloads')
+            load_configuration(self.configuration, self.context)
+        except urllib3.exceptions.HTTPError as e:
+            logger.warning(f"Kubernetes API connection error, reconnecting: {e}")
+            incr('kubernetes.reconnects')
+            self.rest_client.pool_manager.clear()
+        return super().call_api(*args, **kwargs)
+
+
+class KubernetesClientPool:
+    """Lazily created Kubernetes clients shared by every request of a process.
+
+    Clients talk to the cluster the webserver runs in, or to the cluster of a
+    kubeconfig ``context`` when one is given.
+    """
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE, context: Optional[str] = None):
+        self.pool_size = pool_size
+        self.context = context
+        self._lock = threading.Lock()
+        self._clients: Optional[Tuple[client.CoreV1Api, client.AppsV1Api]] = None
+        self._pid: Optional[int] = None
+
+    def get(self) -> Tuple[client.CoreV1Api, client.AppsV1Api]:
+        """Return the shared CoreV1Api and AppsV1Api, creating them on first use.
+
+        Both are wrapped in ``InstrumentedApi`` so every call is timed per method.
+        """
+        with self._lock:
+            # Connection pools must not be shared with a forked parent process
+            if self._clients is None or self._pid != os.getpid():
+                api_client = self._create_api_client()
+                self._clients = (InstrumentedApi(client.CoreV1Api(api_client)),
+                                 InstrumentedApi(client.AppsV1Api(api_client)))
+                self._pid = os.getpid()
+            return self._clients
+
+    def new_api_client(self) -> client.ApiClient:
+        """Dedicated ApiClient for callers that cannot share one (e.g. exec streams)"""
+        return self._create_api_client()
+
+    def _create_api_client(self) -> client.ApiClient:
+        configuration = client.Configuration()
+        load_configuration(configuration, self.context)
+        configuration.connection_pool_maxsize = self.pool_size
+        logger.info(f"Created Kubernetes API client for context {self.context or 'in-cluster'} "
+                    f"with connection pool size {self.pool_size}")
+        return ReconnectingApiClient(configuration, self.context)
+
+
+# kubeconfig context (None for in-cluster) -> pool
+_pools: Dict[Optional[str], KubernetesClientPool] = {}
+_pool_lock = threading.Lock()
+
+
+def get_client_pool(pool_size: int = DEFAULT_POOL_SIZE, context: Optional[str] = None) -> KubernetesClientPool:
+    """Process-wide KubernetesClientPool of the in-cluster API or a kubeconfig context"""
+    with _pool_lock:
+        pool = _pools.get(context)
+        if pool is None:
+            pool = KubernetesClientPool(pool_size, context)
+            _pools[context] = pool
+        return pool
@@ -0,0 +1,146 @@
+"""Timers, counters and gauges for the package manager, sent through Airflow's ``Stats``.
+
+Every metric is prefixed with ``package_manager.`` and carries its identifying
+parts both in the name (for plain StatsD) and as tags (for OTel and DogStatsD).
+When ``[package_manager] profile_requests`` is enabled, each instrumented
+endpoint also logs how its time was split between the timed sections it ran.
+"""
+from __future__ import annotations
+
+import functools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'package_manager'
+
+try:
+    from airflow.configuration import conf
+    from airflow.stats import Stats
+    PROFILE_REQUESTS = conf.getboolean('package_manager', 'profile_requests', fallback=False)
+except ImportError:
+    # Helper modules are also used outside Airflow (wheelhouse script, benchmarks)
+    Stats = None
+    PROFILE_REQUESTS = False
+
+# (section, seconds) recorded by timed() while a profiled request is running
+_profile: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar('package_manager_profile', default=None)
+
+
+def _name(stat: str) -> str:
+    return f"{PREFIX}.{stat}"
+
+
+def incr(stat: str, count: int = 1, tags: Optional[Dict[str, str]] = None):
+    if Stats is None or not count:
+        return
+    try:
+        Stats.incr(_name(stat), count, tags=tags)
+    except Exception as e:
+        logger.debug(f"Could not emit {stat}: {e}")
+
+
+def gauge(stat: str, value: float, tags: Optional[Dict[str, str]] = None):
+    if Stats is None:
+        return
+    try:
+        Stats.gauge(_name(stat), value, tags=tags)
+    except Exception as e:
+        logger.debug(f"Could not emit {stat}: {e}")
+
+
+def timing(stat: str, seconds: float, tags: Optional[Dict[str, str]] = None):
+    profile = _profile.get()
+    if profile is not None:
+        profile.append((stat, seconds))
+    if Stats is None:
+        return
+    try:
+        Stats.timing(_name(stat), timedelta(seconds=seconds), tags=tags)
+    except Exception as e:
+        logger.debug(f"Could not emit {stat}: {e}")
+
+
+@contextmanager
+def timed(stat: str, tags: Optional[Dict[str, str]] = None) -> Iterator[None]:
+    """Time a block as ``<stat>`` and count failures as ``<stat>.errors``"""
+    started = time.monotonic()
+    try:
+        yield
+    except Exception:
+        incr(f"{stat}.errors", tags=tags)
+        raise
+    finally:
+        timing(stat, time.monotonic() - started, tags)
+
+
+def endpoint(name: str) -> Callable:
+    """Decorator for view methods: latency and status counters, plus the profile log"""
+
+    def decorator(view: Callable) -> Callable:
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            token = _profile.set([]) if PROFILE_REQUESTS else None
+            started = time.monotonic()
+            status = 500
+            try:
+                response = view(*args, **kwargs)
+                status = _status_code(response)
+                return response
+            finally:
+                elapsed = time.monotonic() - started
+                if token is not None:
+                    log_profile(f"{name} ({status})", elapsed, _profile.get())
+                    _profile.reset(token)
+                tags = {'endpoint': name, 'status': str(status)}
+                timing(f"endpoint.{name}", elapsed, tags)
+                incr(f"endpoint.{name}.status.{status}", tags=tags)
+        return wrapper
+    return decorator
+
+
+def log_profile(label: str, total: float, sections: List[Tuple[str, float]]):
+    """Log where a request or job spent its time, largest sections first"""
+    totals: Dict[str, float] = {}
+    for stat, seconds in sections:
+        totals[stat] = totals.get(stat, 0.0) + seconds
+    breakdown = ', '.join(
+        f"{stat}={seconds * 1000:.1f}ms" for stat, seconds in sorted(totals.items(), key=lambda i: -i[1])
+    )
+    logger.info(f"Profile {label}: total={total * 1000:.1f}ms" + (f" [{breakdown}]" if breakdown else ''))
+
+
+def _status_code(response: Any) -> int:
+    if isinstance(response, tuple) and len(response) > 1 and isinstance(response[1], int):
+        return response[1]
+    return getattr(response, 'status_code', 200)
+
+
+class InstrumentedApi:
+    """Proxy around a generated Kubernetes API class timing every call by method name.
+
+    ``kubernetes.<method>`` timers and ``kubernetes.<method>.errors`` counters
+    are emitted per call, e.g. ``kubernetes.patch_namespaced_config_map``.
+    Watch requests return a streaming response immediately and are not timed.
+    """
+
+    def __init__(self, api: Any):
+        self._api = api
+
+    def __getattr__(self, attr: str) -> Any:
+        value = getattr(self._api, attr)
+        if attr.startswith('_') or not callable(value):
+            return value
+
+        @functools.wraps(value)
+        def call(*args, **kwargs):
+            if kwargs.get('watch'):
+                return value(*args, **kwargs)
+            with timed(f"kubernetes.{attr}", {'verb': attr}):
+                return value(*args, **kwargs)
+        return call
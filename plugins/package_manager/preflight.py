@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from importlib import metadata
+from typing import Any, Dict, List, Optional, Tuple
+
+from packaging.markers import UndefinedEnvironmentName
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.specifiers import SpecifierSet
+from packaging.utils import canonicalize_name
+from packaging.version import InvalidVersion, Version
+
+from package_manager.requirements import RequirementsFile
+
+logger = logging.getLogger(__name__)
+
+
+class DependencyPreflight:
+    """Checks a proposed requirements.txt against the image environment without network access.
+
+    With a local wheel directory (``find_links``) or a local index
+    (``index_url``) the proposed set is resolved together with the image's
+    constraint files by ``pip install --dry-run``. Without one, only
+    requirements that pin a version are checked, against the constraint files
+    and the ``Requires-Dist`` metadata of every distribution installed in the
+    image; nothing is resolved, and unpinned or ranged requirements are listed
+    as ``unchecked``. Results are cached by a hash of the requirement set and
+    its inputs, except resolutions that timed out.
+    """
+
+    def __init__(self, constraint_files: List[str], find_links: Optional[str] = None,
+                 index_url: Optional[str] = None, timeout: int = 300, cache_size: int = 256):
+        self.constraint_files = [path.strip() for path in constraint_files if path.strip()]
+        self.find_links = find_links or None
+        self.index_url = index_url or None
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self._cache: OrderedDict[str, Dict[str, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._image_requirements: Optional[Dict[str, List[Tuple[str, SpecifierSet]]]] = None
+
+    @property
+    def mode(self) -> str:
+        return 'pip' if self.find_links or self.index_url else 'metadata'
+
+    def check(self, requirements_text: str, timeout: Optional[int] = None) -> Dict[str, Any]:
+        """Return ``{'ok': bool, 'conflicts': [...], ...}`` for a proposed requirements.txt.
+
+        ``timeout`` caps the resolution below the configured one, e.g. in a request thread.
+        """
+        requirements = RequirementsFile.parse(requirements_text)
+        key = self._cache_key(requirements)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return dict(cached, cached=True)
+
+        started = time.monotonic()
+        if self.mode == 'pip':
+            result = self._resolve_with_pip(requirements, min(self.timeout, timeout or self.timeout))
+        else:
+            result = self._check_image_metadata(requirements)
+        result.update({'mode': self.mode, 'key': key, 'duration': round(time.monotonic() - started, 3)})
+        outcome = 'ok' if result['ok'] else f"{len(result['conflicts'])} conflict(s)"
+        logger.info(
+            f"Preflight ({self.mode}) for requirement set {key[:12]} finished in {result['duration']}s: {outcome}"
+        )
+
+        if result.get('timed_out'):
+            # A longer timeout may still resolve the set
+            return dict(result, cached=False)
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return dict(result, cached=False)
+
+    def _cache_key(self, requirements: RequirementsFile) -> str:
+        digest = hashlib.sha256()
+        digest.update(f"{self.mode}\n{sys.version_info[:2]}\n".encode())
+        for line in sorted(line.text for line in requirements):
+            digest.update(line.encode() + b'\n')
+        for path in self.constraint_files:
+            try:
+                with open(path, 'rb') as f:
+                    digest.update(f.read())
+            except OSError:
+                digest.update(f"missing:{path}".encode())
+        if self.find_links and os.path.isdir(self.find_links):
+            # New wheels in the directory can change the resolution
+            digest.update('\n'.join(sorted(os.listdir(self.find_links))).encode())
+        if self.index_url:
+            digest.update(self.index_url.encode())
+        return digest.hexdigest()
+
+    def _resolve_with_pip(self, requirements: RequirementsFile, timeout: int) -> Dict[str, Any]:
+        with tempfile.TemporaryDirectory(prefix="package-manager-preflight-") as tmp_dir:
+            proposed_path = os.path.join(tmp_dir, 'requirements.txt')
+            report_path = os.path.join(tmp_dir, 'report.json')
+            with open(proposed_path, 'w') as f:
+                f.write('\n'.join(line.text for line in requirements) + '\n')
+
+            command = [
+                sys.executable, '-m', 'pip', 'install', '--dry-run', '--quiet', '--no-input',
+                '--disable-pip-version-check', '--report', report_path,
+            ]
+            if self.index_url:
+                command += ['--index-url', self.index_url]
+            else:
+                command += ['--no-index']
+            if self.find_links:
+                command += ['--find-links', self.find_links]
+            for path in self.constraint_files:
+                if os.path.exists(path):
+                    command += ['-r', path]
+            command += ['-r', proposed_path]
+
+            try:
+                completed = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                return {'ok': False, 'conflicts': [f"Dependency resolution timed out after {timeout}s"],
+                        'resolved': {}, 'timed_out': True}
+
+            if completed.returncode != 0:
+                lines = [line.strip() for line in completed.stderr.splitlines() if line.strip()]
+                conflicts = [line for line in lines if 'conflict' in line.lower() or line.startswith('ERROR')]
+                return {'ok': False, 'conflicts': conflicts or lines[-10:], 'resolved': {}}
+
+            resolved = {}
+            try:
+                with open(report_path) as f:
+                    report = json.load(f)
+                for item in report.get('install', []):
+                    item_metadata = item.get('metadata', {})
+                    resolved[canonicalize_name(item_metadata.get('name', ''))] = item_metadata.get('version')
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read pip resolution report: {e}")
+            return {'ok': True, 'conflicts': [], 'resolved': resolved}
+
+    def _check_image_metadata(self, requirements: RequirementsFile) -> Dict[str, Any]:
+        image_requirements = self._load_image_requirements()
+        conflicts = []
+        warnings = []
+        unchecked = []
+        for line in requirements:
+            req = line.requirement
+            if req.marker and not req.marker.evaluate():
+                continue
+            pinned = self._pinned_version(req.specifier)
+            if pinned is None:
+                unchecked.append(line.text)
+                continue
+            for source, specifier in image_requirements.get(line.name, []):
+                if not specifier.contains(pinned, prereleases=True):
+                    conflicts.append(f"{line.text} conflicts with {source} requiring {line.name}{specifier}")
+        if unchecked:
+            warnings.append(
+                f"Only pinned (==) requirements are checked without a preflight wheel directory or index; "
+                f"not checked: {', '.join(unchecked)}"
+            )
+        return {'ok': not conflicts, 'conflicts': conflicts, 'warnings': warnings, 'unchecked': unchecked,
+                'resolved': {}}
+
+    @staticmethod
+    def _pinned_version(specifier: SpecifierSet) -> Optional[Version]:
+        for spec in specifier:
+            if spec.operator in ('==', '===') and '*' not in spec.version:
+                try:
+                    return Version(spec.version)
+                except InvalidVersion:
+                    return None
+        return None
+
+    def _load_image_requirements(self) -> Dict[str, List[Tuple[str, SpecifierSet]]]:
+        """Index the image's constraints by project name; the image does not change at runtime"""
+        if self._image_requirements is not None:
+            return self._image_requirements
+
+        index: Dict[str, List[Tuple[str, SpecifierSet]]] = {}
+        for path in self.constraint_files:
+            try:
+                with open(path) as f:
+                    constraints = RequirementsFile.parse(f.read())
+            except OSError:
+                continue
+            for line in constraints:
+                if line.requirement.specifier:
+                    index.setdefault(line.name, []).append((os.path.basename(path), line.requirement.specifier))
+
+        for dist in metadata.distributions():
+            dist_name = dist.metadata.get('Name')
+            for requirement in dist.requires or []:
+                try:
+                    req = Requirement(requirement)
+                    if req.marker and not req.marker.evaluate({'extra': ''}):
+                        continue
+                except (InvalidRequirement, UndefinedEnvironmentName):
+                    continue
+                if req.specifier:
+                    index.setdefault(canonicalize_name(req.name), []).append(
+                        (f"{dist_name} {dist.version}", req.specifier)
+                    )
+
+        self._image_requirements = index
+        return index
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterator, List, Optional
+
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.utils import canonicalize_name
+
+
+class RequirementError(ValueError):
+    """Base class for requirement parsing and editing errors"""
+
+
+class InvalidRequirementError(RequirementError):
+    pass
+
+
+class DuplicateRequirementError(RequirementError):
+    pass
+
+
+class RequirementNotFoundError(RequirementError):
+    pass
+
+
+def parse_requirement(text: str) -> Requirement:
+    """Parse a single PEP 508 requirement"""
+    if not text or '\n' in text or '\r' in text:
+        raise InvalidRequirementError(f"Invalid requirement '{text}'")
+    try:
+        return Requirement(text.strip())
+    except InvalidRequirement as e:
+        raise InvalidRequirementError(f"Invalid requirement '{text}': {e}")
+
+
+class RequirementLine:
+    """One line of a requirements file.
+
+    Comments, blank lines, pip options and unparsable lines are kept verbatim
+    with ``requirement`` set to None so the file round-trips unchanged.
+    """
+
+    __slots__ = ('raw', 'requirement', 'name', 'comment')
+
+    def __init__(self, raw: str):
+        self.raw = raw
+        self.requirement: Optional[Requirement] = None
+        self.name: Optional[str] = None
+        self.comment = ''
+
+        content = raw.strip()
+        if not content or content.startswith(('#', '-')):
+            return
+        if ' #' in content:
+            content, comment = content.split(' #', 1)
+            content = content.strip()
+            self.comment = f"#{comment}"
+        try:
+            self.requirement = Requirement(content)
+        except InvalidRequirement:
+            return
+        self.name = canonicalize_name(self.requirement.name)
+
+    @property
+    def text(self) -> str:
+        """The requirement without its inline comment"""
+        return str(self.requirement) if self.requirement else self.raw.strip()
+
+    def to_dict(self) -> Dict[str, Any]:
+        req = self.requirement
+        return {
+            'name': self.name,
+            'requirement': self.text,
+            'specifier': str(req.specifier),
+            'extras': sorted(req.extras),
+            'marker': str(req.marker) if req.marker else None,
+            'url': req.url,
+        }
+
+
+class RequirementsFile:
+    """Parsed requirements.txt with a name-keyed index.
+
+    Lines are held in an insertion-ordered dict keyed by a line id, so lookup,
+    duplicate detection, removal and in-place update by normalized project
+    name are all O(1) while the original line order is preserved. A project
+    listed on several lines, e.g. with different markers, is indexed with
+    all of them: ``get`` returns the first, ``remove`` drops every one, and
+    ``update`` refuses to pick one.
+    """
+
+    def __init__(self, lines: List[str], trailing_newline: bool = False):
+        self._lines: Dict[int, RequirementLine] = {}
+        self._index: Dict[str, List[int]] = {}
+        self._next_id = 0
+        self.trailing_newline = trailing_newline
+        for raw in lines:
+            self._append(RequirementLine(raw))
+
+    @classmethod
+    def parse(cls, text: str) -> 'RequirementsFile':
+        text = text or ''
+        lines = text.split('\n')
+        trailing_newline = text.endswith('\n')
+        if trailing_newline:
+            lines.pop()
+        return cls(lines if text else [], trailing_newline)
+
+    def render(self) -> str:
+        text = '\n'.join(line.raw for line in self._lines.values())
+        return text + '\n' if self.trailing_newline and text else text
+
+    def __contains__(self, package: str) -> bool:
+        return self._key(package) in self._index
+
+    def __iter__(self) -> Iterator[RequirementLine]:
+        return (line for line in self._lines.values() if line.requirement is not None)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get(self, package: str) -> Optional[RequirementLine]:
+        line_ids = self._index.get(self._key(package))
+        return self._lines[line_ids[0]] if line_ids else None
+
+    def packages(self) -> List[str]:
+        """Requirements and pip options, without comments"""
+        return [line.text for line in self._lines.values()
+                if line.raw.strip() and not line.raw.strip().startswith('#')]
+
+    def add(self, package: str) -> RequirementLine:
+        line = RequirementLine(str(parse_requirement(package)))
+        if line.name in self._index:
+            existing = self._lines[self._index[line.name][0]]
+            raise DuplicateRequirementError(f"Package {line.name} already installed as '{existing.text}'")
+        self._append(line)
+        return line
+
+    def remove(self, package: str) -> RequirementLine:
+        """Remove every line of the project; returns the first one"""
+        key = self._key(package)
+        line_ids = self._index.pop(key, None)
+        if line_ids is None:
+            raise RequirementNotFoundError(f"Package {key} not found")
+        removed = [self._lines.pop(line_id) for line_id in line_ids]
+        return removed[0]
+
+    def update(self, old_package: str, new_package: str) -> RequirementLine:
+        old_key = self._key(old_package)
+        new_requirement = parse_requirement(new_package)
+        if canonicalize_name(new_requirement.name) != old_key:
+            raise InvalidRequirementError('Cannot change package name during update')
+        line_ids = self._index.get(old_key)
+        if line_ids is None:
+            raise RequirementNotFoundError(f"Package {old_key} not found")
+        if len(line_ids) > 1:
+            raise DuplicateRequirementError(
+                f"Package {old_key} is listed {len(line_ids)} times; remove it and add the new requirement"
+            )
+        line_id = line_ids[0]
+        old_line = self._lines[line_id]
+        raw = str(new_requirement)
+        if old_line.comment:
+            raw = f"{raw} {old_line.comment}"
+        self._lines[line_id] = RequirementLine(raw)
+        return self._lines[line_id]
+
+    def _append(self, line: RequirementLine):
+        line_id = self._next_id
+        self._next_id += 1
+        self._lines[line_id] = line
+        if line.name is not None:
+            self._index.setdefault(line.name, []).append(line_id)
+
+    @staticmethod
+    def _key(package: str) -> str:
+        return canonicalize_name(parse_requirement(package).name)
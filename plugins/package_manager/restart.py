@@ -0,0 +1,439 @@
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+
+from package_manager.drain import WorkerDrainer, batch_size
+from package_manager.metrics import incr, timed, timing
+
+logger = logging.getLogger(__name__)
+
+# Same annotation `kubectl rollout restart` sets on the pod template
+RESTARTED_AT_ANNOTATION = "kubectl.kubernetes.io/restartedAt"
+# Partition of a StatefulSet before a drained restart held all of its pods back
+ORIGINAL_PARTITION_ANNOTATION = "package-manager/original-partition"
+
+WORKLOAD_KINDS = ("StatefulSet", "Deployment")
+
+
+class RolloutRestarter:
+    """Rolling restart of Airflow workloads driven by the Kubernetes controllers.
+
+    Every matching StatefulSet and Deployment gets its pod template annotated
+    with ``restartedAt`` concurrently, so the controllers replace pods using the
+    workload's own update strategy (``maxUnavailable``, ``partition``) and the
+    configured replica count is never touched. Each rollout is then watched
+    until all replicas are updated and Ready.
+
+    With a ``drainer``, StatefulSets of its components are instead rolled in
+    batches through the ``partition`` of their update strategy: each batch is
+    drained of running tasks before the partition is lowered to let the
+    controller replace it, and batches are sized so ``min_available`` pods
+    keep working. The partition in place before the restart is kept in the
+    ``package-manager/original-partition`` annotation of the StatefulSet
+    until the restart succeeds. A failed or interrupted restart leaves the
+    remaining pods held back rather than letting the controller replace
+    them undrained; the next drained restart takes over from there.
+    """
+
+    def __init__(
+        self,
+        apps_v1: client.AppsV1Api,
+        namespace: str,
+        timeout: int = 900,
+        poll_interval: int = 5,
+        max_parallel: int = 8,
+        progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        drainer: Optional[WorkerDrainer] = None,
+        min_available: str = '50%',
+    ):
+        self.apps_v1 = apps_v1
+        self.namespace = namespace
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.max_parallel = max(1, max_parallel)
+        self.progress_callback = progress_callback
+        self.drainer = drainer
+        self.min_available = min_available
+
+    def discover(self, components: List[str]) -> List[Dict[str, Any]]:
+        """List StatefulSets and Deployments labelled with the given components"""
+        workloads: List[Dict[str, Any]] = []
+        for component in components:
+            label_selector = f"component={component}"
+            try:
+                statefulsets = self.apps_v1.list_namespaced_stateful_set(
+                    namespace=self.namespace,
+                    label_selector=label_selector
+                )
+                deployments = self.apps_v1.list_namespaced_deployment(
+                    namespace=self.namespace,
+                    label_selector=label_selector
+                )
+            except ApiException as e:
+                logger.error(f"Error listing workloads for component {component}: {e}")
+                continue
+
+            for kind, items in (("StatefulSet", statefulsets.items), ("Deployment", deployments.items)):
+                for obj in items:
+                    workloads.append({
+                        'kind': kind,
+                        'name': obj.metadata.name,
+                        'component': component,
+                        'replicas': obj.spec.replicas,
+                        'max_unavailable': self._max_unavailable(kind, obj),
+                        'status': 'pending',
+                        'message': None,
+                        'triggered_at': None,
+                        'ready_at': None,
+                        'duration': None,
+                        'held_partition': None,
+                    })
+        return workloads
+
+    def restart(self, components: List[str]) -> List[Dict[str, Any]]:
+        """Restart all workloads of the given components concurrently and wait until Ready"""
+        workloads = self.discover(components)
+        if not workloads:
+            logger.warning(f"No workloads found for components {components} in namespace {self.namespace}")
+            return workloads
+
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel, len(workloads)),
+                                thread_name_prefix="package-manager-rollout") as pool:
+            list(pool.map(self._restart_workload, workloads))
+        return workloads
+
+    def _restart_workload(self, workload: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.monotonic()
+        try:
+            drains = self._drains(workload)
+            sts = None
+            if workload['kind'] == 'StatefulSet':
+                sts = self.apps_v1.read_namespaced_stateful_set(workload['name'], self.namespace)
+            if drains:
+                ready, message = self._restart_drained(workload, sts)
+            else:
+                if sts is not None:
+                    sts = self._recover_partition(workload, sts)
+                    self._check_partition(sts)
+                self._trigger(workload)
+                workload['status'] = 'triggered'
+                workload['triggered_at'] = datetime.now(timezone.utc).isoformat()
+                self._notify(workload)
+
+                with timed('rollout.ready_wait', {'component': workload['component']}):
+                    ready, message = self._wait_for_rollout(workload)
+            workload['status'] = 'ready' if ready else 'timeout'
+            workload['message'] = message
+            if ready:
+                workload['ready_at'] = datetime.now(timezone.utc).isoformat()
+        except ApiException as e:
+            logger.error(f"Error restarting {workload['kind']} {workload['name']}: {e}")
+            workload['status'] = 'failed'
+            workload['message'] = e.reason
+        except Exception as e:
+            logger.error(f"Unexpected error restarting {workload['kind']} {workload['name']}: {e}")
+            workload['status'] = 'failed'
+            workload['message'] = str(e)
+        if workload.get('held_partition') is not None:
+            workload['message'] = (f"{workload['message']}; partition held at {workload['held_partition']}, "
+                                   f"pods below it were not restarted")
+
+        workload['duration'] = round(time.monotonic() - started, 3)
+        tags = {'kind': workload['kind'], 'name': workload['name'], 'component': workload['component']}
+        timing('rollout.duration', time.monotonic() - started, tags)
+        incr(f"rollout.{workload['status']}", tags=tags)
+        logger.info(
+            f"{workload['kind']} {workload['name']} rollout finished with status "
+            f"'{workload['status']}' in {workload['duration']}s"
+        )
+        self._notify(workload)
+        return workload
+
+    def _drains(self, workload: Dict[str, Any]) -> bool:
+        return (self.drainer is not None and workload['kind'] == 'StatefulSet'
+                and workload['component'] in self.drainer.components and bool(workload['replicas']))
+
+    def _recover_partition(self, workload: Dict[str, Any], sts: client.V1StatefulSet) -> client.V1StatefulSet:
+        """Put back the partition held by a drained restart that never finished, before a plain restart"""
+        original = _original_partition(sts)
+        if original is None:
+            return sts
+        logger.warning(f"StatefulSet {workload['name']} was left by an unfinished drained restart, "
+                       f"restoring its partition from {_partition(sts)} to {original}")
+        incr('drain.recovered_partitions')
+        return self._set_partition(workload, original, restore=True)
+
+    @staticmethod
+    def _check_partition(sts: client.V1StatefulSet, partition: Optional[int] = None):
+        """Refuse a partition that holds back every pod; the rollout would succeed without restarting any"""
+        replicas = sts.spec.replicas if sts.spec.replicas is not None else 1
+        partition = _partition(sts) if partition is None else partition
+        if replicas and partition >= replicas:
+            raise RuntimeError(f"partition {partition} holds back all {replicas} pods, nothing would be restarted")
+
+    def _restart_drained(self, workload: Dict[str, Any], sts: client.V1StatefulSet) -> Tuple[bool, str]:
+        """Roll a StatefulSet batch by batch, from the highest ordinal down, draining each batch first.
+
+        The pod template is annotated together with ``partition = replicas`` so
+        the controller holds every pod back; lowering the partition then
+        releases one drained batch at a time. The original partition is put
+        back once every batch is rolled out; until then it is recorded in an
+        annotation. When a batch fails, the partition stays where that batch
+        left it so the controller does not replace the remaining pods
+        undrained, and the next drained restart starts over from the recorded
+        partition. A batch that was drained but not rolled out gets its
+        consumers back.
+        """
+        strategy = sts.spec.update_strategy
+        if strategy and strategy.type == 'OnDelete':
+            self._trigger(workload)
+            return True, "OnDelete update strategy, pods pick up the change when recreated"
+
+        replicas = sts.spec.replicas
+        # A partition held by an unfinished drained restart is not the original one
+        original = _original_partition(sts)
+        if original is not None:
+            logger.warning(f"StatefulSet {workload['name']} was left by an unfinished drained restart at partition "
+                           f"{_partition(sts)}, restarting it from its original partition {original}")
+            incr('drain.recovered_partitions')
+        base = _partition(sts) if original is None else original
+        self._check_partition(sts, base)
+        size = batch_size(replicas, self.min_available)
+        batches = math.ceil((replicas - base) / size)
+        interrupted = 0
+        cancelled: Dict[str, List[str]] = {}
+        held = replicas
+        succeeded = False
+
+        self._trigger(workload, partition=replicas, original_partition=base)
+        workload['status'] = 'triggered'
+        workload['triggered_at'] = datetime.now(timezone.utc).isoformat()
+        try:
+            for number, upper in enumerate(range(replicas, base, -size), start=1):
+                lower = max(base, upper - size)
+                pods = [f"{workload['name']}-{ordinal}" for ordinal in range(upper - 1, lower - 1, -1)]
+                workload['status'] = 'draining'
+                workload['message'] = f"batch {number}/{batches}: draining {', '.join(pods)}"
+                self._notify(workload)
+                drained = self.drainer.drain(pods)
+                interrupted += drained['running']
+                cancelled = drained['consumers_cancelled']
+
+                workload['status'] = 'rolling'
+                workload['message'] = f"batch {number}/{batches}: restarting {', '.join(pods)}"
+                self._notify(workload)
+                self._set_partition(workload, lower)
+                held = lower
+                with timed('rollout.ready_wait', {'component': workload['component']}):
+                    ready, message = self._wait_for_rollout(workload)
+                if not ready:
+                    return False, f"batch {number}/{batches}: {message}"
+                # The batch runs fresh workers that consume on their own
+                cancelled = {}
+            succeeded = True
+        finally:
+            if cancelled:
+                self.drainer.resume(cancelled)
+            if succeeded:
+                self._set_partition(workload, base, restore=True)
+            else:
+                # Restoring the original partition would let the controller
+                # replace every remaining pod without draining it
+                logger.warning(f"Drained restart of StatefulSet {workload['name']} did not finish, holding its "
+                               f"partition at {held} (original {base})")
+                workload['held_partition'] = held
+
+        workload['interrupted_tasks'] = interrupted
+        message = f"successfully rolled out in {batches} drained batch(es) of up to {size}"
+        if interrupted:
+            message += f", {interrupted} task(s) interrupted at the drain deadline"
+        return True, message
+
+    def _set_partition(self, workload: Dict[str, Any], partition: int,
+                       restore: bool = False) -> client.V1StatefulSet:
+        """Patch the partition; ``restore`` also drops the original-partition annotation"""
+        body: Dict[str, Any] = {'spec': {'updateStrategy': {'rollingUpdate': {'partition': partition}}}}
+        if restore:
+            body['metadata'] = {'annotations': {ORIGINAL_PARTITION_ANNOTATION: None}}
+        return self.apps_v1.patch_namespaced_stateful_set(workload['name'], self.namespace, body)
+
+    def _trigger(self, workload: Dict[str, Any], partition: Optional[int] = None,
+                 original_partition: Optional[int] = None):
+        """Annotate the pod template so the controller performs a rolling update"""
+        body: Dict[str, Any] = {
+            'spec': {
+                'template': {
+                    'metadata': {
+                        'annotations': {
+                            RESTARTED_AT_ANNOTATION: datetime.now(timezone.utc).isoformat()
+                        }
+                    }
+                }
+            }
+        }
+        if partition is not None:
+            body['spec']['updateStrategy'] = {'rollingUpdate': {'partition': partition}}
+        if original_partition is not None:
+            body['metadata'] = {'annotations': {ORIGINAL_PARTITION_ANNOTATION: str(original_partition)}}
+        logger.info(f"Triggering rolling restart of {workload['kind']} {workload['name']}")
+        if workload['kind'] == 'StatefulSet':
+            self.apps_v1.patch_namespaced_stateful_set(workload['name'], self.namespace, body)
+        else:
+            self.apps_v1.patch_namespaced_deployment(workload['name'], self.namespace, body)
+
+    def _wait_for_rollout(self, workload: Dict[str, Any]) -> Tuple[bool, str]:
+        """Poll the workload status until the rollout completes or the timeout expires"""
+        deadline = time.monotonic() + self.timeout
+        message = "rollout not observed yet"
+        while time.monotonic() < deadline:
+            if workload['kind'] == 'StatefulSet':
+                obj = self.apps_v1.read_namespaced_stateful_set_status(workload['name'], self.namespace)
+                done, message = self._statefulset_rollout_status(obj)
+            else:
+                obj = self.apps_v1.read_namespaced_deployment_status(workload['name'], self.namespace)
+                done, message = self._deployment_rollout_status(obj)
+            if done:
+                return True, message
+            logger.debug(f"{workload['kind']} {workload['name']}: {message}")
+            time.sleep(self.poll_interval)
+        return False, f"timed out after {self.timeout}s: {message}"
+
+    @staticmethod
+    def _deployment_rollout_status(deploy: client.V1Deployment) -> Tuple[bool, str]:
+        """Mirror `kubectl rollout status` for Deployments"""
+        status = deploy.status
+        if (status.observed_generation or 0) < (deploy.metadata.generation or 0):
+            return False, "waiting for rollout to be observed"
+        for condition in status.conditions or []:
+            if condition.type == 'Progressing' and condition.reason == 'ProgressDeadlineExceeded':
+                raise RuntimeError(f"deployment {deploy.metadata.name} exceeded its progress deadline")
+
+        replicas = deploy.spec.replicas if deploy.spec.replicas is not None else 1
+        updated = status.updated_replicas or 0
+        if updated < replicas:
+            return False, f"{updated} of {replicas} updated replicas are available"
+        if (status.replicas or 0) > updated:
+            return False, f"{(status.replicas or 0) - updated} old replicas are pending termination"
+        if (status.available_replicas or 0) < updated:
+            return False, f"{status.available_replicas or 0} of {updated} updated replicas are available"
+        return True, "successfully rolled out"
+
+    @staticmethod
+    def _statefulset_rollout_status(sts: client.V1StatefulSet) -> Tuple[bool, str]:
+        """Mirror `kubectl rollout status` for StatefulSets"""
+        strategy = sts.spec.update_strategy
+        if strategy and strategy.type == 'OnDelete':
+            return True, "OnDelete update strategy, pods pick up the change when recreated"
+
+        status = sts.status
+        if (status.observed_generation or 0) < (sts.metadata.generation or 0):
+            return False, "waiting for rollout to be observed"
+
+        replicas = sts.spec.replicas if sts.spec.replicas is not None else 1
+        if (status.ready_replicas or 0) < replicas:
+            return False, f"{status.ready_replicas or 0} of {replicas} pods are ready"
+
+        partition = _partition(sts)
+        if partition:
+            if (status.updated_replicas or 0) < replicas - partition:
+                return False, f"{status.updated_replicas or 0} of {replicas - partition} pods updated"
+            return True, "partitioned roll out complete"
+
+        if status.update_revision != status.current_revision:
+            return False, f"{status.updated_replicas or 0} of {replicas} pods updated"
+        return True, "successfully rolled out"
+
+    @staticmethod
+    def _max_unavailable(kind: str, obj: Any) -> Optional[str]:
+        """Read maxUnavailable from the workload's update strategy for reporting"""
+        try:
+            if kind == 'Deployment':
+                rolling_update = obj.spec.strategy.rolling_update
+            else:
+                rolling_update = obj.spec.update_strategy.rolling_update
+            value = getattr(rolling_update, 'max_unavailable', None)
+            return str(value) if value is not None else None
+        except AttributeError:
+            return None
+
+    def _notify(self, workload: Dict[str, Any]):
+        if self.progress_callback is None:
+            return
+        try:
+            self.progress_callback(dict(workload))
+        except Exception as e:
+            logger.warning(f"Rollout progress callback failed: {e}")
+
+
+def _original_partition(sts: client.V1StatefulSet) -> Optional[int]:
+    """Partition recorded by an unfinished drained restart, if any"""
+    original = (sts.metadata.annotations or {}).get(ORIGINAL_PARTITION_ANNOTATION)
+    return int(original) if original is not None else None
+
+
+def _partition(sts: client.V1StatefulSet) -> int:
+    strategy = sts.spec.update_strategy
+    return (strategy.rolling_update.partition if strategy and strategy.rolling_update else None) or 0
+
+
+class RestartCoalescer:
+    """Merges restart requests that arrive within a window into one rollout.
+
+    The first request opens a window of ``window`` seconds; every request made
+    before it closes adds its components and progress callback to the same
+    batch. When the window closes, ``restart_fn`` is called once with the union
+    of the requested components. Batches never overlap: a batch whose window
+    closes while another rollout is running waits for it to finish.
+    """
+
+    def __init__(self, restart_fn: Callable[[List[str], Callable[[Dict[str, Any]], None]], List[Dict[str, Any]]],
+                 window: float = 10, component_order: Optional[List[str]] = None):
+        self.restart_fn = restart_fn
+        self.window = window
+        self.component_order = component_order or []
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._pending: Optional[Dict[str, Any]] = None
+
+    def request(self, components: List[str],
+                progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Future:
+        """Add components to the open batch; the Future resolves with the batch's workloads"""
+        with self._lock:
+            if self._pending is None:
+                self._pending = {'components': set(), 'callbacks': [], 'future': Future()}
+                timer = threading.Timer(self.window, self._fire)
+                timer.daemon = True
+                timer.start()
+            self._pending['components'].update(components)
+            if progress_callback is not None:
+                self._pending['callbacks'].append(progress_callback)
+            return self._pending['future']
+
+    def _fire(self):
+        with self._lock:
+            batch, self._pending = self._pending, None
+        components = sorted(
+            batch['components'],
+            key=lambda c: self.component_order.index(c) if c in self.component_order else len(self.component_order)
+        )
+
+        def fan_out(workload: Dict[str, Any]):
+            for callback in batch['callbacks']:
+                callback(dict(workload))
+
+        with self._run_lock:
+            logger.info(f"Restarting components {components} for {len(batch['callbacks'])} coalesced change(s)")
+            incr('rollout.coalesced_changes', len(batch['callbacks']))
+            try:
+                batch['future'].set_result(self.restart_fn(components, fan_out))
+            except Exception as e:
+                batch['future'].set_exception(e)
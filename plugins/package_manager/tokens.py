@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import abc
+import argparse
+import heapq
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import Column, Float, MetaData, String, Table, Text, create_engine, event, func, inspect, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+TOKEN_TABLE = "package_manager_tokens"
+
+
+class TokenStore(abc.ABC):
+    """Operation tokens keyed by token value, each with an absolute expiry"""
+
+    evictions = 0
+
+    @abc.abstractmethod
+    def put(self, token: str, data: Dict[str, Any], ttl: int):
+        """Store a token that expires ``ttl`` seconds from now"""
+
+    @abc.abstractmethod
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Return token data if the token exists and has not expired"""
+
+    @abc.abstractmethod
+    def consume(self, token: str) -> bool:
+        """Delete a live token; only one caller can consume a given token"""
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        """Number of live tokens"""
+
+
+class MemoryTokenStore(TokenStore):
+    """Per-process store: dict for O(1) lookup plus a heap ordered by expiry.
+
+    Expired tokens are evicted from the head of the heap, so cleanup only ever
+    touches tokens that have actually expired.
+    """
+
+    def __init__(self):
+        self._tokens: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def put(self, token: str, data: Dict[str, Any], ttl: int):
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._evict_expired()
+            self._tokens[token] = (expires_at, data)
+            heapq.heappush(self._expiry_heap, (expires_at, token))
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._tokens.get(token)
+        if entry is None or entry[0] <= time.time():
+            return None
+        return dict(entry[1])
+
+    def consume(self, token: str) -> bool:
+        with self._lock:
+            self._evict_expired()
+            return self._tokens.pop(token, None) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._evict_expired()
+            return len(self._tokens)
+
+    def _evict_expired(self):
+        now = time.time()
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, token = heapq.heappop(self._expiry_heap)
+            entry = self._tokens.get(token)
+            # Consumed tokens leave stale heap entries behind; skip them
+            if entry is not None and entry[0] == expires_at:
+                del self._tokens[token]
+                self.evictions += 1
+
+
+class SqlTokenStore(TokenStore):
+    """Store shared by all webserver workers, backed by a SQL database.
+
+    Used with the Airflow metadata database (shared across webserver replicas)
+    or a local SQLite file (shared across gunicorn workers of one pod). Lookups
+    go through the primary key and expiry cleanup through an index on
+    ``expires_at``. The table is not created implicitly: ``create_table`` is
+    called for the plugin's own SQLite file, and for the metadata database
+    by the ``init-db`` command of this module.
+    """
+
+    def __init__(self, engine: Engine, eviction_interval: int = 60):
+        self.engine = engine
+        self.eviction_interval = eviction_interval
+        self._next_eviction = 0.0
+        self._metadata = MetaData()
+        self._table = Table(
+            TOKEN_TABLE, self._metadata,
+            Column('token', String(64), primary_key=True),
+            Column('payload', Text, nullable=False),
+            Column('expires_at', Float, nullable=False, index=True),
+        )
+
+    def create_table(self):
+        """Create the token table and its expiry index unless they exist"""
+        self._metadata.create_all(self.engine, checkfirst=True)
+
+    def has_table(self) -> bool:
+        return inspect(self.engine).has_table(TOKEN_TABLE)
+
+    def put(self, token: str, data: Dict[str, Any], ttl: int):
+        now = time.time()
+        with self.engine.begin() as conn:
+            if now >= self._next_eviction:
+                self._next_eviction = now + self.eviction_interval
+                result = conn.execute(self._table.delete().where(self._table.c.expires_at <= now))
+                self.evictions += max(result.rowcount, 0)
+            conn.execute(self._table.insert().values(
+                token=token, payload=json.dumps(data), expires_at=now + ttl
+            ))
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(self._table.c.payload).where(
+                    self._table.c.token == token,
+                    self._table.c.expires_at > time.time()
+                )
+            ).first()
+        return json.loads(row[0]) if row else None
+
+    def consume(self, token: str) -> bool:
+        with self.engine.begin() as conn:
+            result = conn.execute(self._table.delete().where(
+                self._table.c.token == token,
+                self._table.c.expires_at > time.time()
+            ))
+        return result.rowcount == 1
+
+    def __len__(self) -> int:
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(func.count()).select_from(self._table).where(self._table.c.expires_at > time.time())
+            ).scalar()
+
+
+def _sqlite_engine(path: str) -> Engine:
+    """SQLite engine tuned for many small writes from several processes"""
+    engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={'timeout': 10, 'check_same_thread': False},
+        poolclass=QueuePool
+    )
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+    return engine
+
+
+def create_token_store(backend: str, path: Optional[str] = None) -> TokenStore:
+    """Build the configured token store, falling back to the ``sqlite`` file if it is unusable.
+
+    ``backend`` is ``metadata`` (Airflow metadata database), ``sqlite`` (file at
+    ``path``) or ``memory``. The metadata database is never altered here; its
+    table has to be created beforehand with ``init-db``. The fallback stays
+    shared by the gunicorn workers of the pod; ``memory`` is only used when it
+    is configured or the SQLite file cannot be opened either.
+    """
+    if backend == 'memory':
+        return MemoryTokenStore()
+    if backend == 'metadata':
+        try:
+            from airflow import settings
+            store = SqlTokenStore(settings.engine)
+            if not store.has_table():
+                raise RuntimeError(f"table {TOKEN_TABLE} does not exist, create it with "
+                                   f"`python {os.path.abspath(__file__)} init-db`")
+            return store
+        except Exception as e:
+            logger.error(f"Could not initialize 'metadata' token store, using sqlite at {path}: {e}")
+    elif backend != 'sqlite':
+        logger.error(f"Unknown token store backend '{backend}', using sqlite at {path}")
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        store = SqlTokenStore(_sqlite_engine(path))
+        store.create_table()
+        return store
+    except Exception as e:
+        logger.error(f"Could not initialize 'sqlite' token store at {path}, using memory; "
+                     f"tokens are only valid in the worker that issued them: {e}")
+    return MemoryTokenStore()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """``init-db`` creates the token table in the Airflow metadata database.
+
+    Run it once per database with the Airflow configuration of the webserver,
+    e.g. next to ``airflow db migrate``::
+
+        python /opt/airflow/plugins/package_manager/tokens.py init-db
+    """
+    parser = argparse.ArgumentParser(description="Manage the package manager token table")
+    parser.add_argument('command', choices=['init-db'])
+    parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    from airflow import settings
+    SqlTokenStore(settings.engine).create_table()
+    logger.info(f"Table {TOKEN_TABLE} is ready in the Airflow metadata database")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1200 @@
+"""The package manager view and blueprint.
+
+Imported only when the webserver reads ``PackageManagerPlugin.appbuilder_views``
+or ``flask_blueprints``; see ``package_manager/__init__.py``.
+"""
+from __future__ import annotations
+
+import os
+import json
+import logging
+import time
+import hashlib
+import secrets
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Tuple, List,  Dict, Optional
+from flask import g, current_app
+from kubernetes import client
+from packaging.utils import canonicalize_name
+from kubernetes.client.rest import ApiException
+from airflow.security import permissions
+from airflow.www.auth import has_access
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from flask_appbuilder import BaseView, expose
+from airflow.utils.session import provide_session
+from airflow.configuration import AIRFLOW_HOME, conf
+from airflow.www.app import csrf
+from package_manager import metrics
+from package_manager.configmap_cache import ConfigMapCache, get_configmap_cache
+from package_manager.drain import WorkerDrainer
+from package_manager.drift import DriftCollector
+from package_manager.environments import Environment, parse_environments
+from package_manager.history import HISTORY_SUFFIX, RequirementsHistory, diff_requirements
+from package_manager.jobs import TERMINAL_STATES, JobRegistry, PackageJob
+from package_manager.kube import DEFAULT_POOL_SIZE, get_client_pool
+from package_manager.preflight import DependencyPreflight
+from package_manager.requirements import (
+    RequirementError,
+    RequirementNotFoundError,
+    RequirementsFile,
+    parse_requirement,
+)
+from package_manager.restart import RestartCoalescer, RolloutRestarter
+from package_manager.tokens import create_token_store
+from package_manager.wheelhouse import Wheelhouse, requirements_hash
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_OPERATIONS = 100
+
+# Page size limits of the JSON package list
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Operation tokens expire after one hour
+TOKEN_TTL = 3600
+# Seconds between two tokens.size gauges; counting a SQL store is a table scan
+TOKEN_GAUGE_INTERVAL = 60
+# Request fields that choose where a change applies; a token only covers the values it was issued for
+CHANGE_SCOPE_KEYS = ('components', 'environments')
+ROLLBACK_SCOPE_KEYS = ('components',)
+
+
+class PackageOperationError(Exception):
+    """Raised when a requirements change cannot be applied"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class PreflightError(PackageOperationError):
+    """Raised when the proposed requirements do not resolve against the image"""
+
+    def __init__(self, result: Dict[str, Any]):
+        super().__init__(f"Dependency conflicts: {'; '.join(result['conflicts'])}", 409)
+        self.result = result
+
+
+class PackageManagerView(BaseView):
+    route_base = "/package-manager"
+    default_view = "list_packages"
+    
+    def __init__(self):
+        super().__init__()
+        self.namespace = os.getenv('AIRFLOW__KUBERNETES_ENVIRONMENT_VARIABLES__AIRFLOW_NAMESPACE', 'data-orchestration')
+        self.configmap_name = 'airflow-config-pypi'
+        self.component_labels = ['worker', 'triggerer', 'scheduler']
+        self.rollout_timeout = conf.getint('package_manager', 'rollout_timeout', fallback=900)
+        self.rollout_poll_interval = conf.getint('package_manager', 'rollout_poll_interval', fallback=5)
+        self.rollout_max_parallel = conf.getint('package_manager', 'rollout_max_parallel', fallback=8)
+        # Task-aware restart of worker StatefulSets, see WorkerDrainer
+        self.worker_drain = conf.getboolean('package_manager', 'worker_drain', fallback=False)
+        self.worker_drain_timeout = conf.getint('package_manager', 'worker_drain_timeout', fallback=600)
+        self.worker_min_available = conf.get('package_manager', 'worker_min_available', fallback='50%')
+        self._drainer: Optional[WorkerDrainer] = None
+        # Canonical package name -> components that need a restart when it changes;
+        # packages not listed here restart every component
+        self.package_components = {
+            canonicalize_name(name): components
+            for name, components in json.loads(
+                conf.get('package_manager', 'package_components', fallback='{}') or '{}'
+            ).items()
+        }
+        self.restart_coalesce_window = conf.getfloat('package_manager', 'restart_coalesce_window', fallback=10)
+        # The environment this webserver belongs to, plus any other environments
+        # changes can be fanned out to
+        local_environment = Environment(
+            conf.get('package_manager', 'environment_name', fallback=self.namespace),
+            self.namespace,
+            self.configmap_name
+        )
+        try:
+            environments = parse_environments(conf.get('package_manager', 'environments', fallback='{}'))
+        except ValueError as e:
+            logger.error(f"Invalid [package_manager] environments, changing only {local_environment.name}: {e}")
+            environments = {}
+        if local_environment.name in environments:
+            logger.error(f"Environment '{local_environment.name}' in [package_manager] environments is ignored, "
+                         f"the name belongs to this webserver's environment")
+            del environments[local_environment.name]
+        self.environments = {local_environment.name: local_environment, **environments}
+        self.environment = local_environment
+        self.environment_max_parallel = conf.getint('package_manager', 'environment_max_parallel', fallback=4)
+        self._fan_out_executor: Optional[ThreadPoolExecutor] = None
+        # Environment name -> RestartCoalescer, created on first use
+        self._restarts: Dict[str, RestartCoalescer] = {}
+        self._restarts_lock = threading.Lock()
+        self.kubernetes_pool_size = conf.getint('package_manager', 'kubernetes_pool_size', fallback=DEFAULT_POOL_SIZE)
+        self.configmap_update_retries = conf.getint('package_manager', 'configmap_update_retries', fallback=5)
+        self.history_keep = conf.getint('package_manager', 'history_keep', fallback=50)
+        self.preflight_enabled = conf.getboolean('package_manager', 'preflight_enabled', fallback=True)
+        self.preflight = DependencyPreflight(
+            conf.get(
+                'package_manager', 'preflight_constraint_files',
+                fallback='/home/airflow/requirements_main.txt,/home/airflow/requirements_fastbi.txt'
+            ).split(','),
+            find_links=conf.get('package_manager', 'preflight_find_links', fallback=''),
+            index_url=conf.get('package_manager', 'preflight_index_url', fallback=''),
+            timeout=conf.getint('package_manager', 'preflight_timeout', fallback=300)
+        )
+        # The dry-run endpoint resolves in the request thread, which gunicorn
+        # kills after its worker timeout
+        self.preflight_request_timeout = conf.getint(
+            'package_manager', 'preflight_request_timeout',
+            fallback=max(1, conf.getint('webserver', 'web_server_worker_timeout', fallback=120) - 30)
+        )
+        wheelhouse_dir = conf.get('package_manager', 'wheelhouse_dir', fallback='')
+        self.wheelhouse = Wheelhouse(
+            wheelhouse_dir,
+            keep=conf.getint('package_manager', 'wheelhouse_keep', fallback=5),
+            timeout=conf.getint('package_manager', 'wheelhouse_build_timeout', fallback=1800)
+        ) if wheelhouse_dir else None
+        # Builds run on their own thread so a slow one never holds up the job queue
+        self.wheelhouse_wait = conf.getint('package_manager', 'wheelhouse_wait', fallback=300)
+        self._wheelhouse_executor: Optional[ThreadPoolExecutor] = None
+        self._wheelhouse_builds: Dict[str, Future] = {}
+        self._wheelhouse_lock = threading.Lock()
+        self.job_stream_timeout = conf.getint('package_manager', 'job_stream_timeout', fallback=5)
+        self.drift = DriftCollector(
+            lambda: self._init_kubernetes()[0],
+            lambda: get_client_pool(self.kubernetes_pool_size, self.environment.context).new_api_client(),
+            self.environment.namespace,
+            self.component_labels,
+            max_parallel=conf.getint('package_manager', 'drift_max_parallel', fallback=16),
+            exec_timeout=conf.getint('package_manager', 'drift_exec_timeout', fallback=60)
+        )
+        self.jobs = JobRegistry(conf.get(
+            'package_manager', 'job_state_dir',
+            fallback=os.path.join(AIRFLOW_HOME, 'package_manager', 'jobs')
+        ))
+        # (resourceVersion, parsed requirements, pip options) behind the JSON package list
+        self._package_index: Tuple[Optional[str], List[Dict[str, Any]], List[str]] = (None, [], [])
+        self.tokens = create_token_store(
+            conf.get('package_manager', 'token_store', fallback='metadata'),
+            conf.get('package_manager', 'token_store_path',
+                     fallback=os.path.join(AIRFLOW_HOME, 'package_manager', 'tokens.db'))
+        )
+        self._next_token_gauge = 0.0
+
+    def _get_current_user_identifier(self) -> str:
+            """Get current user identifier safely"""
+            try:
+                # Try different user attributes that might be available
+                if hasattr(g, 'user'):
+                    if hasattr(g.user, 'email'):
+                        return g.user.email
+                    elif hasattr(g.user, 'username'):
+                        return g.user.username
+                    elif hasattr(g.user, 'user'):
+                        return str(g.user.user)
+                
+                # Fallback to session user if available
+                from flask_login import current_user
+                if hasattr(current_user, 'email'):
+                    return current_user.email
+                elif hasattr(current_user, 'username'):
+                    return current_user.username
+                
+                # Last resort: return user ID
+                return str(current_user.get_id())
+                
+            except Exception as e:
+                logger.warning(f"Could not get user identifier: {e}")
+                return "unknown_user"
+
+    def _generate_operation_token(self, operation: str, package: str, scope: Optional[str] = None) -> str:
+        """Generate a secure token for package operations, optionally bound to a ``_change_scope``"""
+        # Get user identifier
+        user = self._get_current_user_identifier()
+        
+        # Generate a secure random token
+        token = secrets.token_urlsafe(32)
+        
+        evictions = self.tokens.evictions
+        with metrics.timed('tokens.put'):
+            self.tokens.put(token, {
+                'operation': operation,
+                'package': package,
+                'scope': scope,
+                'user': user
+            }, TOKEN_TTL)
+        evicted = self.tokens.evictions - evictions
+        if evicted:
+            metrics.incr('tokens.evicted', evicted)
+        if evicted or time.monotonic() >= self._next_token_gauge:
+            self._next_token_gauge = time.monotonic() + TOKEN_GAUGE_INTERVAL
+            metrics.gauge('tokens.size', len(self.tokens))
+        
+        logger.info(f"Generated token for operation '{operation}' on package '{package}' for user '{user}'")
+        
+        return token
+
+    def _verify_operation_token(self, token: str, operation: str, package: str, scope: Optional[str] = None) -> bool:
+        """Verify the operation token"""
+        with metrics.timed('tokens.get'):
+            token_data = self.tokens.get(token)
+            
+        if not token_data:
+            logger.warning(f"Token not found: {token[:10]}...")
+            return False
+
+        user = self._get_current_user_identifier()
+        
+        # Log token verification details
+        logger.info(f"Token verification - Operation: {operation}, Package: {package}, User: {user}")
+        
+        is_valid = (
+            token_data['operation'] == operation and
+            token_data['package'] == package and
+            token_data.get('scope') == scope and
+            token_data['user'] == user
+        )
+
+        # Remove token after verification (one-time use); only one request can consume it
+        if is_valid:
+            with metrics.timed('tokens.consume'):
+                is_valid = self.tokens.consume(token)
+            if is_valid:
+                logger.info("Token verified successfully")
+            else:
+                logger.warning(f"Token already used: {token[:10]}...")
+
+        return is_valid
+
+    def _init_kubernetes(self, environment: Optional[Environment] = None) -> Tuple[client.CoreV1Api, client.AppsV1Api]:
+        """Get the process-wide Kubernetes clients of an environment's cluster with error handling"""
+        environment = environment or self.environment
+        try:
+            return get_client_pool(self.kubernetes_pool_size, environment.context).get()
+        except Exception as e:
+            logger.error(f"Failed to initialize Kubernetes client: {e}")
+            raise RuntimeError("Failed to connect to Kubernetes cluster")
+
+    def _validate_package_name(self, package: str) -> bool:
+        """Validate package as a single PEP 508 requirement"""
+        if not package or not isinstance(package, str):
+            return False
+        try:
+            parse_requirement(package)
+        except RequirementError:
+            return False
+        return True
+
+    def _extract_package_name(self, package: str) -> str:
+        """Extract normalized package name without version, extras or markers"""
+        try:
+            return canonicalize_name(parse_requirement(package).name)
+        except RequirementError:
+            # Fallback: return the original package if parsing fails
+            return package.strip()
+
+    def _extract_package_version(self, package: str) -> Optional[str]:
+        """Extract the version specifier if present"""
+        try:
+            specifier = str(parse_requirement(package).specifier)
+        except RequirementError:
+            return None
+        return specifier or None
+
+    def _configmap_cache(self, environment: Optional[Environment] = None) -> ConfigMapCache:
+        environment = environment or self.environment
+        return get_configmap_cache(
+            lambda: self._init_kubernetes(environment)[0],
+            environment.namespace,
+            environment.configmap,
+            max_retries=self.configmap_update_retries,
+            context=environment.context
+        )
+
+    def _get_configmap(self, environment: Optional[Environment] = None) -> Tuple[client.V1ConfigMap, RequirementsFile]:
+        """Get ConfigMap from the watch-backed cache and parse requirements"""
+        environment = environment or self.environment
+        try:
+            with metrics.timed('configmap.get'):
+                configmap = self._configmap_cache(environment).get()
+        except ApiException as e:
+            logger.error(f"Failed to read ConfigMap: {e}")
+            raise RuntimeError(f"ConfigMap {environment.namespace}/{environment.configmap} not found")
+        if configmap is None:
+            raise RuntimeError(f"ConfigMap {environment.namespace}/{environment.configmap} not found")
+        requirements = RequirementsFile.parse((configmap.data or {}).get('requirements.txt', ''))
+        return configmap, requirements
+
+    def _get_package_index(self) -> Tuple[str, List[Dict[str, Any]], List[str]]:
+        """Parsed requirements and pip options, re-parsed only when the resourceVersion changes"""
+        with metrics.timed('configmap.get'):
+            configmap = self._configmap_cache().get()
+        if configmap is None:
+            raise RuntimeError(f"ConfigMap {self.configmap_name} not found")
+        resource_version = configmap.metadata.resource_version
+        index = self._package_index
+        if index[0] != resource_version:
+            requirements = RequirementsFile.parse((configmap.data or {}).get('requirements.txt', ''))
+            index = (
+                resource_version,
+                [line.to_dict() for line in requirements],
+                [text for text in requirements.packages() if text.startswith('-')]
+            )
+            self._package_index = index
+        return index
+
+    def _operations_transform(self, operations: List[Dict[str, str]]) -> Callable[[str], str]:
+        """requirements.txt transform that applies add/remove/update operations in order"""
+        def transform(text: str) -> str:
+            requirements = RequirementsFile.parse(text)
+            for operation in operations:
+                self._apply_operation(requirements, operation)
+            return requirements.render()
+        return transform
+
+    def _update_requirements(self, transform: Callable[[str], str], environment: Optional[Environment] = None,
+                             job: Optional[PackageJob] = None, **details: Any) -> int:
+        """Apply ``transform`` to the latest requirements.txt, retrying on concurrent edits.
+
+        The result is recorded as a new history revision before the ConfigMap
+        is patched, and its number returned; ``details`` are stored with it.
+        If the revision cannot be recorded, nothing is patched. A revision
+        recorded for an attempt that is not applied (a conflict retry or a
+        failed patch) is discarded again.
+        """
+        environment = environment or self.environment
+        history = self._history(environment)
+        user = job.user if job else self._get_current_user_identifier()
+        description = job.description if job else 'Requirements change'
+        # (revision, created) of the latest attempt
+        recorded: List[Tuple[int, bool]] = []
+
+        def discard_attempt():
+            revision, created = recorded.pop()
+            if created:
+                history.discard(revision)
+
+        def mutate(data: Dict[str, str]) -> Dict[str, str]:
+            before = data.get('requirements.txt', '')
+            data['requirements.txt'] = transform(before)
+            if self.preflight_enabled:
+                # Cache hit unless the ConfigMap changed since the preflight phase
+                self._check_dependencies(data['requirements.txt'])
+            if recorded:
+                # Called again after a conflict; the previous attempt was not applied
+                discard_attempt()
+            with metrics.timed('history.record'):
+                recorded.append(history.record(before, data['requirements.txt'], user, description,
+                                               job_id=job.id if job else None, **details))
+            return data
+
+        try:
+            with metrics.timed('configmap.update'):
+                self._configmap_cache(environment).update(mutate)
+        except Exception:
+            if recorded:
+                try:
+                    discard_attempt()
+                except Exception as e:
+                    logger.warning(f"Could not discard the revision of a failed change in {environment.name}: {e}")
+            raise
+        return recorded[-1][0]
+
+    def _history(self, environment: Optional[Environment] = None) -> RequirementsHistory:
+        """Revision history of an environment's requirements, in the companion ConfigMap"""
+        environment = environment or self.environment
+        return RequirementsHistory(
+            lambda: self._init_kubernetes(environment)[0],
+            environment.namespace,
+            f"{environment.configmap}{HISTORY_SUFFIX}",
+            keep=self.history_keep,
+            max_retries=self.configmap_update_retries
+        )
+
+    def _request_environment(self, name: Any = None) -> Environment:
+        """Environment named in a request, this webserver's own if none"""
+        if name is None:
+            return self.environment
+        if name not in self.environments:
+            raise PackageOperationError(f"Unknown environment '{name}'", 404)
+        return self.environments[name]
+
+    @staticmethod
+    def _rollback_scope(environment: Environment, revision: Any) -> str:
+        """Token scope of a rollback: one revision of one environment"""
+        if not isinstance(revision, int) or isinstance(revision, bool) or revision < 1:
+            raise PackageOperationError('Revision must be a positive integer')
+        return f"{environment.name}@{revision}"
+
+    def _restart_airflow_pods(self, core_v1: client.CoreV1Api, apps_v1: client.AppsV1Api,
+                              progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+                              components: Optional[List[str]] = None,
+                              namespace: Optional[str] = None,
+                              drain: bool = True) -> List[Dict[str, Any]]:
+        """Rolling restart of Airflow components, waiting until every workload is Ready"""
+        components = components or self.component_labels
+        try:
+            restarter = RolloutRestarter(
+                apps_v1,
+                namespace or self.namespace,
+                timeout=self.rollout_timeout,
+                poll_interval=self.rollout_poll_interval,
+                max_parallel=self.rollout_max_parallel,
+                progress_callback=progress_callback,
+                drainer=self._get_drainer() if drain else None,
+                min_available=self.worker_min_available
+            )
+            workloads = restarter.restart(components)
+        except Exception as e:
+            logger.error(f"Failed to restart Airflow components: {e}")
+            raise RuntimeError("Failed to restart Airflow components")
+
+        failed = [f"{w['kind']} {w['name']}" + (f" (partition held at {w['held_partition']})"
+                                                if w.get('held_partition') is not None else '')
+                  for w in workloads if w['status'] not in ('ready',)]
+        if failed:
+            logger.error(f"Rollout did not complete for: {', '.join(failed)}")
+            raise RuntimeError(f"Failed to restart Airflow components: {', '.join(failed)}")
+
+        logger.info(f"Successfully restarted Airflow components {', '.join(components)}")
+        return workloads
+
+    def _get_drainer(self) -> Optional[WorkerDrainer]:
+        """WorkerDrainer shared by all restarts, or None when draining is disabled"""
+        if not self.worker_drain:
+            return None
+        if self._drainer is None:
+            self._drainer = WorkerDrainer(
+                timeout=self.worker_drain_timeout,
+                poll_interval=self.rollout_poll_interval
+            )
+        return self._drainer
+
+    def _apply_operation(self, requirements: RequirementsFile, operation: Dict[str, str]):
+        """Apply a single add/remove/update operation to the parsed requirements"""
+        action = operation.get('operation')
+        package = operation.get('package')
+        try:
+            if action == 'add':
+                requirements.add(package)
+            elif action == 'remove':
+                requirements.remove(package)
+            elif action == 'update':
+                requirements.update(package, operation.get('new_package'))
+            else:
+                raise PackageOperationError(f"Invalid operation '{action}'")
+        except RequirementNotFoundError as e:
+            raise PackageOperationError(str(e), 404)
+        except RequirementError as e:
+            raise PackageOperationError(str(e))
+
+    def _parse_operations(self, operations: Any) -> List[Dict[str, str]]:
+        """Validate the shape of a batch and keep only the known fields"""
+        if not isinstance(operations, list) or not operations:
+            raise PackageOperationError('Operations must be a non-empty list')
+        if len(operations) > MAX_BATCH_OPERATIONS:
+            raise PackageOperationError(f'At most {MAX_BATCH_OPERATIONS} operations are allowed per batch')
+
+        parsed = []
+        for index, operation in enumerate(operations):
+            if not isinstance(operation, dict):
+                raise PackageOperationError(f'Operation {index} must be an object')
+            action = operation.get('operation')
+            if action not in ('add', 'remove', 'update'):
+                raise PackageOperationError(f"Operation {index}: invalid operation '{action}'")
+            if not self._validate_package_name(operation.get('package')):
+                raise PackageOperationError(f'Operation {index}: invalid package name')
+            entry = {'operation': action, 'package': operation['package'].strip()}
+            if action == 'update':
+                if not self._validate_package_name(operation.get('new_package')):
+                    raise PackageOperationError(f'Operation {index}: invalid new package name')
+                entry['new_package'] = operation['new_package'].strip()
+            parsed.append(entry)
+        return parsed
+
+    @staticmethod
+    def _operations_digest(operations: List[Dict[str, str]]) -> str:
+        """Stable digest of a batch, used as the token scope"""
+        payload = json.dumps(operations, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @staticmethod
+    def _change_scope(body: Dict[str, Any], keys: Tuple[str, ...] = CHANGE_SCOPE_KEYS) -> Optional[str]:
+        """Where a change applies as requested (restart components, environments), bound into its token"""
+        scope = {key: sorted(map(str, body[key])) if isinstance(body[key], list) else body[key]
+                 for key in keys if body.get(key) is not None}
+        return json.dumps(scope, sort_keys=True, separators=(',', ':')) if scope else None
+
+    def _validate_operations(self, operations: List[Dict[str, str]], environment: Optional[Environment] = None) -> str:
+        """Check operations against the current requirements and return the proposed requirements.txt"""
+        _, requirements = self._get_configmap(environment)
+        for operation in operations:
+            self._apply_operation(requirements, operation)
+        return requirements.render()
+
+    def _check_dependencies(self, requirements_text: str) -> Dict[str, Any]:
+        """Resolve a proposed requirements.txt offline and reject conflicts"""
+        with metrics.timed('preflight.check'):
+            result = self.preflight.check(requirements_text)
+        if not result['ok']:
+            raise PreflightError(result)
+        return result
+
+    def _restart_components(self, operations: List[Dict[str, str]], requested: Any = None) -> List[str]:
+        """Components to restart: the ones in the request, else those mapped to the changed packages"""
+        if requested is not None:
+            if not isinstance(requested, list) or not requested or \
+                    any(component not in self.component_labels for component in requested):
+                raise PackageOperationError(
+                    f"Components must be a non-empty list of: {', '.join(self.component_labels)}"
+                )
+            return [component for component in self.component_labels if component in requested]
+
+        components = set()
+        for operation in operations:
+            mapped = self.package_components.get(self._extract_package_name(operation['package']))
+            if not mapped:
+                return list(self.component_labels)
+            components.update(mapped)
+        return [component for component in self.component_labels if component in components]
+
+    def _target_environments(self, operations: List[Dict[str, str]], requested: Any = None) -> List[Environment]:
+        """Environments a change applies to, after checking the operations against each of them"""
+        if requested is None:
+            environments = [self.environment]
+        elif not isinstance(requested, list) or not requested or \
+                any(name not in self.environments for name in requested):
+            raise PackageOperationError(f"Environments must be a non-empty list of: {', '.join(self.environments)}")
+        else:
+            environments = [self.environments[name] for name in self.environments if name in requested]
+
+        for environment in environments:
+            try:
+                self._validate_operations(operations, environment)
+            except PackageOperationError as e:
+                if len(environments) == 1:
+                    raise
+                raise PackageOperationError(f"{environment.name}: {e}", e.status_code)
+        return environments
+
+    def _restarts_for(self, environment: Environment) -> RestartCoalescer:
+        """Restart coalescer of an environment; changes to different environments never share a rollout"""
+        with self._restarts_lock:
+            coalescer = self._restarts.get(environment.name)
+            if coalescer is None:
+                coalescer = RestartCoalescer(
+                    lambda components, progress_callback: self._restart_airflow_pods(
+                        *self._init_kubernetes(environment), progress_callback=progress_callback,
+                        components=components, namespace=environment.namespace,
+                        # Task state of other environments lives in their own metadata database
+                        drain=environment is self.environment
+                    ),
+                    window=self.restart_coalesce_window,
+                    component_order=self.component_labels
+                )
+                self._restarts[environment.name] = coalescer
+            return coalescer
+
+    def _submit_package_change(self, operation: str, description: str, transform: Callable[[str], str],
+                               components: List[str], environments: Optional[List[Environment]] = None,
+                               **details: Any) -> PackageJob:
+        """Queue a ConfigMap patch and rolling restart in the background executor"""
+        user = self._get_current_user_identifier()
+        environments = environments or [self.environment]
+        if environments != [self.environment]:
+            description = f"{description} in {', '.join(e.name for e in environments)}"
+        return self.jobs.submit(
+            operation, description, user,
+            lambda job: self._run_package_change(job, transform, description, components, environments, **details)
+        )
+
+    def _run_package_change(self, job: PackageJob, transform: Callable[[str], str], description: str,
+                            components: List[str], environments: Optional[List[Environment]] = None,
+                            **details: Any) -> Future:
+        """Job body: re-apply the change to the latest requirements, patch and restart.
+
+        The restart is handed to the coalescer so changes made within the
+        coalescing window share one rollout; the returned Future completes the
+        job once that rollout has finished. Changes to other environments are
+        fanned out, see _fan_out.
+        """
+        environments = environments or [self.environment]
+        if environments == [self.environment]:
+            rollout = self._change_environment(job, transform, components, self.environment, **details)
+        elif len(environments) == 1:
+            rollout = self._change_environment(job, transform, components, environments[0], **details)
+        else:
+            rollout = self._fan_out(job, transform, components, environments)
+
+        outcome: Future = Future()
+
+        def done(finished: Future):
+            error = finished.exception()
+            if error is not None:
+                outcome.set_exception(error)
+            else:
+                outcome.set_result(f"{description} completed successfully")
+
+        rollout.add_done_callback(done)
+        return outcome
+
+    def _change_environment(self, job: PackageJob, transform: Callable[[str], str], components: List[str],
+                            environment: Environment, tag: Optional[str] = None, **details: Any) -> Future:
+        """Preflight, wheelhouse and patch one environment, then request its rollout.
+
+        ``tag`` labels the phases and workloads with the environment name in a
+        fan-out. The returned Future completes with the rollout.
+        """
+        _, requirements = self._get_configmap(environment)
+        proposed = transform(requirements.render())
+        if self.preflight_enabled:
+            with job.phase('preflight', tag):
+                self._check_dependencies(proposed)
+
+        if self.wheelhouse is not None:
+            phase = job.start_phase('wheelhouse', tag)
+            try:
+                try:
+                    phase.update(self._build_wheelhouse(proposed).result(timeout=self.wheelhouse_wait))
+                except FutureTimeoutError:
+                    raise RuntimeError(f"still building after {self.wheelhouse_wait}s, "
+                                       f"it is published for later restarts when done")
+            except Exception as e:
+                # Pods fall back to a regular pip install without a wheelhouse,
+                # so a failed or slow build skips the phase instead of failing the change
+                logger.warning(f"Could not build wheelhouse: {e}")
+                job.finish_phase(phase, e, skipped=True)
+            else:
+                job.finish_phase(phase)
+
+        with job.phase('patch', tag) as phase:
+            phase['revision'] = self._update_requirements(transform, environment, job, **details)
+
+        phase = job.start_phase('rollout', tag)
+        phase['components'] = components
+        rollout: Future = Future()
+
+        def rollout_done(restart: Future):
+            error = restart.exception()
+            job.finish_phase(phase, error)
+            if error is not None:
+                rollout.set_exception(error)
+            else:
+                rollout.set_result(restart.result())
+
+        def record_workload(workload: Dict[str, Any]):
+            job.record_workload(dict(workload, environment=tag) if tag else workload)
+
+        self._restarts_for(environment).request(components, record_workload).add_done_callback(rollout_done)
+        return rollout
+
+    def _build_wheelhouse(self, requirements_text: str) -> Future:
+        """Build the wheelhouse in the background; jobs with the same requirements share one build"""
+        key = requirements_hash(requirements_text)
+        with self._wheelhouse_lock:
+            if self._wheelhouse_executor is None:
+                self._wheelhouse_executor = ThreadPoolExecutor(max_workers=1,
+                                                               thread_name_prefix="package-manager-wheelhouse")
+            for done in [k for k, future in self._wheelhouse_builds.items() if future.done()]:
+                del self._wheelhouse_builds[done]
+            future = self._wheelhouse_builds.get(key)
+            if future is None:
+                future = self._wheelhouse_builds[key] = self._wheelhouse_executor.submit(
+                    self.wheelhouse.build, requirements_text
+                )
+            return future
+
+    def _fan_out(self, job: PackageJob, transform: Callable[[str], str], components: List[str],
+                 environments: List[Environment]) -> Future:
+        """Apply a change to several environments concurrently.
+
+        At most ``environment_max_parallel`` environments are changed at the
+        same time, each from preflight to the end of its rollout, so a fleet
+        change takes about as long as its slowest environment. A failing
+        environment does not stop the others; the returned Future fails once
+        all are done if any of them failed.
+        """
+        with self._restarts_lock:
+            if self._fan_out_executor is None:
+                self._fan_out_executor = ThreadPoolExecutor(max_workers=max(1, self.environment_max_parallel),
+                                                            thread_name_prefix="package-manager-fan-out")
+        for environment in environments:
+            job.record_environment(environment.name, 'queued')
+
+        def run(environment: Environment):
+            job.record_environment(environment.name, 'running')
+            try:
+                with metrics.timed('environment.change', {'environment': environment.name}):
+                    # Keep the slot until the rollout is done so the limit covers the whole change
+                    self._change_environment(job, transform, components, environment, environment.name).result()
+            except Exception as e:
+                logger.error(f"Change to environment {environment.name} failed: {e}")
+                job.record_environment(environment.name, 'failed', error=str(e))
+                raise
+            job.record_environment(environment.name, 'succeeded')
+
+        outcome: Future = Future()
+        futures = [(environment, self._fan_out_executor.submit(run, environment)) for environment in environments]
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def environment_done(_: Future):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            failed = [environment.name for environment, future in futures if future.exception()]
+            if failed:
+                outcome.set_exception(RuntimeError(f"Change failed in environments: {', '.join(failed)}"))
+            else:
+                outcome.set_result(None)
+
+        for _, future in futures:
+            future.add_done_callback(environment_done)
+        return outcome
+
+    def _job_accepted(self, job: PackageJob, message: str):
+        return jsonify({
+            'success': True,
+            'message': message,
+            'job_id': job.id,
+            'status_url': f"{self.route_base}/jobs/{job.id}",
+            'stream_url': f"{self.route_base}/jobs/{job.id}/stream"
+        }), 202
+
+    @csrf.exempt
+    @expose("/generate_token", methods=['POST'])
+    @has_access([(permissions.ACTION_CAN_EDIT, permissions.RESOURCE_ADMIN_MENU)])
+    @metrics.endpoint('generate_token')
+    def generate_token(self):
+        """Generate operation token"""
+        try:
+            operation = request.json.get('operation')
+            package = request.json.get('package')
+            scope = self._change_scope(request.json)
+
+            if operation == 'batch':
+                # Batch tokens are scoped to the exact list of operations
+                operations = self._parse_operations(request.json.get('operations'))
+                package = self._operations_digest(operations)
+            elif operation == 'rollback':
+                # Rollback tokens are scoped to one revision of one environment
+                environment = self._request_environment(request.json.get('environment'))
+                package = self._rollback_scope(environment, request.json.get('revision'))
+                # The environment is already part of the rollback scope
+                scope = self._change_scope(request.json, ROLLBACK_SCOPE_KEYS)
+            
+            if not operation or not package:
+                return jsonify({'error': 'Operation and package are required'}), 400
+
+            if operation not in ['add', 'remove', 'update', 'batch', 'rollback']:
+                return jsonify({'error': 'Invalid operation'}), 400
+
+            if operation != 'rollback' and not self._validate_package_name(package):
+                return jsonify({'error': 'Invalid package name'}), 400
+
+            token = self._generate_operation_token(operation, package, scope)
+            
+            return jsonify({
+                'token': token,
+                'expires_in': TOKEN_TTL
+            })
+
+        except PackageOperationError as e:
+            return jsonify({'error': str(e)}), e.status_code
+        except Exception as e:
+            logger.error(f"Error generating token: {e}")
+            return jsonify({'error': 'Failed to generate token'}), 500
+
+    @csrf.exempt
+    @expose("/", methods=['GET'])
+    @expose("/list_packages", methods=['GET'])
+    @has_access([(permissions.ACTION_CAN_READ, permissions.RESOURCE_ADMIN_MENU)])
+    @metrics.endpoint('list_packages')
+    def list_packages(self):
+        try:
+            # The package table is loaded from /api/packages by the page itself
+            return self.render_template(
+                "package_manager/list_packages.html",
+                environments=list(self.environments.values()),
+                local_environment=self.environment.name
+            )
+        except Exception as e:
+            logger.error(f"Error in list_packages: {e}")
+            return jsonify({'error': str(e)}), 500
+
+    @expose("/api/packages", methods=['GET'])
+    @has_access([(permissions.ACTION_CAN_READ, permissions.RESOURCE_ADMIN_MENU)])
+    @metrics.endpoint('api_packages')
+    def api_packages(self):
+        """Installed requirements as JSON, filtered by name and paginated.
+
+        The ETag combines the ConfigMap resourceVersion with the query, so
+        clients polling with If-None-Match get a 304 until requirements change.
+        """
+        try:
+            query = canonicalize_name(request.args.get('q', '').strip())
+            page = max(1, request.args.get('page', 1, type=int))
+            per_page = max(1, min(request.args.get('per_page', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+
+            resource_version, packages, options = self._get_package_index()
+            query_digest = hashlib.sha256(f"{query}:{page}:{per_page}".encode()).hexdigest()[:16]
+            etag = f"{resource_version}-{query_digest}"
+            headers = {'ETag': f'"{etag}"', 'Cache-Control': 'private, no-cache'}
+            if request.if_none_match.contains_weak(etag):
+                return Response(status=304, headers=headers)
+
+            if query:
+                packages = [package for package in packages if query in package['name']]
+            start = (page - 1) * per_page
+            response = jsonify({
+                'packages': packages[start:start + per_page],
+                'options': options,
+                'total': len(packages),
+                'page': page,
+                'per_page': per_page,
+                'pages': max(1, -(-len(packages) // per_page)),
+                'resource_version': resource_version,
+            })
+            response.headers.update(headers)
+            return response
+        except ApiException as e:
+            logger.error(f"Failed to read ConfigMap: {e}")
+            return jsonify({'error': f"ConfigMap {self.configmap_name} not found"}), 500
+        except Exception as e:
+            logger.error(f"Error in api_packages: {e}")
+            return jsonify({'error': str(e)}), 500
+
+    @csrf.exempt
+    @expose("/add", methods=['POST'])
+    @has_access([(permissions.ACTION_CAN_EDIT, permissions.RESOURCE_ADMIN_MENU)])
+    @metrics.endpoint('add')
+    def add_package(self):
+        """Queue adding a new package to requirements"""
+        try:
+            package = request.json.get('package')
+            token = request.json.get('token')
+            
+            if not package or not token:
+                return jsonify({'error': 'Package and token are required'}), 400
+
+            if not self._verify_operation_token(token, 'add', package, self._change_scope(request.json)):
+                return jsonify({'error': 'Invalid or expired token'}), 403
+
+            if not self._validate_package_name(package):
+                return jsonify({'error': 'Invalid package name'}), 400
+
+            operations = [{'operation': 'add', 'package': package}]
+            environments = self._target_environments(operations, request.json.get('environments'))
+            components = self._restart_components(operations, request.json.get('components'))
+
+            job = self._submit_package_change('add', f"Add package {package}",
+                                              self._operations_transform(operations), components, environments)
+            logger.warning(f"Package {package} add queued by user {g.user.email} from IP {request.remote_addr}")
+            return self._job_accepted(job, f'Adding package {package}')
+
+        except PackageOperationError as e:
+            return jsonify({'error': str(e)}), e.status_code
+        except Exception as e:
+            logger.error(f"Error in add_package: {e}")
+            return jsonify({'error': 'Internal server error'}), 500
+
+    @csrf.exempt
+    @expose("/remove", methods=['POST'])
+    @has_access([(permissions.ACTION_CAN_EDIT, permissions.RESOURCE_ADMIN_MENU)])
+    @metrics.endpoint('remove')
+    def remove_package(self):
+        """Queue removing a package from requirements"""
+        try:
+            package = request.json.get('package')
+            token = request.json.get('token')
+            
+            if not package or not token:
+                return jsonify({'error': 'Package and token are required'}), 400
+
+            if not self._verify_operation_token(token, 'remove', package, self._change_scope(request.json)):
+                return jsonify({'error': 'Invalid or expired token'}), 403
+
+            if not self._validate_package_name(package):
+                return jsonify({'error': 'Invalid package name'}), 400
+
+            operations = [{'operation': 'remove', 'package': package}]
+            environments = self._target_environments(operations, request.json.get('environments'))
+            components = self._restart_components(operations, request.json.get('components'))
+
+            job = self._submit_package_change('remove', f"Remove package {package}",
+                                              self._operations_transform(operations), components, environments)
+            logger.warning(f"Package {package} removal queued by user {g.user.email} from IP {request.remote_addr}")
+            return self._job_accepted(job, f'Removing package {package}')
+
+        except PackageOperationError as e:
+            return jsonify({'error': str(e)}), e.status_code
+        except Exception as e:
+            logger.error(f"Error in remove_package: {e}")
+            return jsonify({'error': 'Internal server error'}), 500
+
+    @csrf.exempt
+    @expose("/update", methods=['POST'])
+    @has_access([(permissions.ACTION_CAN_EDIT, permissions.RESOURCE_ADMIN_MENU)])
+    @metrics.endpoint('update')
+    def update_package(self):
+        """Queue updating a package version in requirements"""
+        try:
+            old_package = request.json.get('old_package')
+            new_package = request.json.get('new_package')
+            token = request.json.get('token')
+            
+            if not old_package or not new_package or not token:
+                return jsonify({'error': 'Old package, new package, and token are required'}), 400
+
+            if not self._verify_operation_token(token, 'update', old_package, self._change_scope(request.json)):
+                return jsonify({'error': 'Invalid or expired token'}), 403
+
+            if not self._validate_package_name(old_package) or not self._validate_package_name(new_package):
+                return jsonify({'error': 'Invalid package name'}), 400
+
+            operations = [{'operation': 'update', 'package': old_package, 'new_package': new_package}]
+            environments = self._target_environments(operations, request.json.get('environments'))
+            components = self._restart_components(operations, request.json.get('components'))
+
+            job = self._submit_package_change(
+                'update', f"Update package {old_package} to {new_package}",
+                self._operations_transform(operations), components, environments
+            )
+            logger.warning(f"Package {old_package} update to {new_package} queued by user {g.user.email} from IP {request.remote_addr}")
+            return self._job_accepted(job, f'Updating package {old_package} to {new_package}')
+
+        except PackageOperationError as e:
+            return jsonify({'error': str(e)}), e.status_code
+        except Exception as e:
+            logger.error(f"Error in update_package: {e}")
+            return jsonify({'error': 'Internal server error'}), 500
+
+    @csrf.exempt
+    @expose("/batch", methods=['POST'])
+    @has_access([(permissions.ACTION_CAN_EDIT, permissions.RESOURCE_ADMIN_MENU)])
+    @metrics.endpoint('batch')
+    def batch_packages(self):
+        """Queue an ordered list of add/remove/update operations as one change"""
+        try:
+            token = request.json.get('token')
+            if not token:
+                return jsonify({'error': 'Operations and token are required'}), 400
+
+            operations = self._parse_operations(request.json.get('operations'))
+
+            if not self._verify_operation_token(token, 'batch', self._operations_digest(operations),
+                                               self._change_scope(request.json)):
+                return jsonify({'error': 'Invalid or expired token'}), 403
+
+            # All operations must apply cleanly, in order, in every environment before anything is queued
+            environments = self._target_environments(operations, request.json.get('environments'))
+            components = self._restart_components(operations, request.json.get('components'))
+
+            summary = ', '.join(f"{op['operation']} {op['package']}" for op in operations)
+            job = self._submit_package_change(
+                'batch', f"Apply {len(operations)} package changes",
+                self._operations_transform(operations), components, environments
+            )
+            logger.warning(f"Package batch [{summary}] queued by user {g.user.email} from IP {request.remote_addr}")
+            return self._job_accepted(job, f'Applying {len(operations)} package changes')
+
+        except PackageOperationError as e:
+            return jsonify({'error': str(e)}), e.status_code
+        except Exception as e:
+            logger.error(f"Error in batch_packages: {e}")
+            return jsonify({'error': 'Internal server error'}), 500
+
+    @csrf.exempt
+    @expose("/preflight", methods=['POST'])
+    @has_access([(permissions.ACTION_CAN_EDIT, permissions.RESOURCE_ADMIN_MENU)])
+    @metrics.endpoint('preflight')
+    def preflight_packages(self):
+        """Dry run: resolve the requirements that a list of operations would produce"""
+        try:
+            operations = self._parse_operations(request.json.get('operations'))
+            result = self.preflight.check(self._validate_operations(operations),
+                                          timeout=self.preflight_request_timeout)
+            return jsonify(result)
+
+        except PackageOperationError as e:
+            return jsonify({'error': str(e)}), e.status_code
+        except Exception as e:
+            logger.error(f"Error in preflight_packages: {e}")
+            return jsonify({'error': 'Internal server error'}), 500
+
+    @csrf.exempt
+    @expose("/rollback", methods=['POST'])
+    @has_access([(permissions.ACTION_CAN_EDIT, permissions.RESOURCE_ADMIN_MENU)])
+    @metrics.endpoint('rollback')
+    def rollback(self):
+        """Queue restoring the requirements of an earlier revision with one patch and one restart"""
+        try:
+            token = request.json.get('token')
+            revision = request.json.get('revision')
+            if not token or revision is None:
+                return jsonify({'error': 'Revision and token are required'}), 400
+
+            environment = self._request_environment(request.json.get('environment'))
+            if not self._verify_operation_token(token, 'rollback', self._rollback_scope(environment, revision),
+                                               self._change_scope(request.json, ROLLBACK_SCOPE_KEYS)):
+                return jsonify({'error': 'Invalid or expired token'}), 403
+
+            entry = self._history(environment).get(revision)
+            if entry is None:
+                raise PackageOperationError(f"Revision {revision} not found", 404)
+            _, requirements = self._get_configmap(environment)
+            target = entry['requirements']
+            changes = diff_requirements(requirements.render(), target)
+            if not changes:
+                raise PackageOperationError(f"Requirements already match revision {revision}", 409)
+
+            # Restart only what the changed lines need, like the equivalent set of operations would
+            components = self._restart_components(
+                [{'package': line[1:].strip()} for line in changes], request.json.get('components')
+            )
+            job = self._submit_package_change(
+                'rollback', f"Roll back to revision {revision}", lambda _: target, components, [environment],
+                rollback_of=revision
+            )
+            logger.warning(f"Rollback to revision {revision} in {environment.name} queued by user {g.user.email} "
+                           f"from IP {request.remote_addr}: {', '.join(changes)}")
+            return self._job_accepted(job, f'Rolling back to revision {revision}')
+
+        except PackageOperationError as e:
+            return jsonify({'error': str(e)}), e.status_code
+        except Exception as e:
+            logger.error(f"Error in rollback: {e}")
+            return jsonify({'error': 'Internal server error'}), 500
+
+    @expose("/history", methods=['GET'])
+    @has_access([(permissions.ACTION_CAN_READ, permissions.RESOURCE_ADMIN_MENU)])
+    @metrics.endpoint('list_history')
+    def list_history(self):
+        """Recorded requirements revisions, newest first, with user, timestamp and diff"""
+        try:
+            environment = self._request_environment(request.args.get('environment'))
+            limit = request.args.get('limit', 50, type=int)
+            revisions = self._history(environment).list()
+            return jsonify({'environment': environment.name, 'revisions': revisions[:max(1, min(limit, 500))]})
+        except PackageOperationError as e:
+            return jsonify({'error': str(e)}), e.status_code
+        except Exception as e:
+            logger.error(f"Error in list_history: {e}")
+            return jsonify({'error': 'Internal server error'}), 500
+
+    @expose("/history/<int:revision>", methods=['GET'])
+    @has_access([(permissions.ACTION_CAN_READ, permissions.RESOURCE_ADMIN_MENU)])
+    @metrics.endpoint('get_revision')
+    def get_revision(self, revision: int):
+        """One revision including its full requirements.txt"""
+        try:
+            environment = self._request_environment(request.args.get('environment'))
+            entry = self._history(environment).get(revision)
+            if entry is None:
+                return jsonify({'error': f'Revision {revision} not found'}), 404
+            return jsonify(entry)
+        except PackageOperationError as e:
+            return jsonify({'error': str(e)}), e.status_code
+        except Exception as e:
+            logger.error(f"Error in get_revision: {e}")
+            return jsonify({'error': 'Internal server error'}), 500
+
+    @expose("/drift", methods=['GET'])
+    @has_access([(permissions.ACTION_CAN_READ, permissions.RESOURCE_ADMIN_MENU)])
+    @metrics.endpoint('drift')
+    def drift_report(self):
+        """Compare the packages installed in every Airflow pod with the ConfigMap requirements"""
+        try:
+            configmap, requirements = self._get_configmap()
+            report = self.drift.collect(requirements, refresh=request.args.get('refresh', 'false').lower() == 'true')
+            report['resource_version'] = configmap.metadata.resource_version
+            return jsonify(report)
+        except Exception as e:
+            logger.error(f"Error in drift_report: {e}")
+            return jsonify({'error': str(e)}), 500
+
+    @expose("/environments", methods=['GET'])
+    @has_access([(permissions.ACTION_CAN_READ, permissions.RESOURCE_ADMIN_MENU)])
+    @metrics.endpoint('list_environments')
+    def list_environments(self):
+        """Environments package changes can be applied to"""
+        return jsonify({
+            'local': self.environment.name,
+            'environments': [environment.to_dict() for environment in self.environments.values()],
+        })
+
+    @expose("/jobs", methods=['GET'])
+    @has_access([(permissions.ACTION_CAN_READ, permissions.RESOURCE_ADMIN_MENU)])
+    @metrics.endpoint('list_jobs')
+    def list_jobs(self):
+        """List recent package change jobs"""
+        try:
+            limit = request.args.get('limit', 20, type=int)
+            return jsonify({'jobs': self.jobs.list(limit=max(1, min(limit, 100)))})
+        except Exception as e:
+            logger.error(f"Error in list_jobs: {e}")
+            return jsonify({'error': 'Internal server error'}), 500
+
+    @expose("/jobs/<job_id>", methods=['GET'])
+    @has_access([(permissions.ACTION_CAN_READ, permissions.RESOURCE_ADMIN_MENU)])
+    @metrics.endpoint('job_status')
+    def job_status(self, job_id: str):
+        """Return status and per-phase timings of a package change job"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job)
+
+    @expose("/jobs/<job_id>/stream", methods=['GET'])
+    @has_access([(permissions.ACTION_CAN_READ, permissions.RESOURCE_ADMIN_MENU)])
+    def stream_job(self, job_id: str):
+        """Stream job progress as server-sent events"""
+        if self.jobs.get(job_id) is None:
+            return jsonify({'error': 'Job not found'}), 404
+
+        def events():
+            # Streams last a few seconds so a sync gunicorn worker is not held
+            # for the whole rollout; EventSource reconnects after `retry` ms.
+            yield "retry: 1000\n\n"
+            deadline = time.monotonic() + self.job_stream_timeout
+            last_version = None
+            last_sent = time.monotonic()
+            while time.monotonic() < deadline:
+                job = self.jobs.get(job_id)
+                if job is not None and job['version'] != last_version:
+                    last_version = job['version']
+                    last_sent = time.monotonic()
+                    yield f"event: job\ndata: {json.dumps(job)}\n\n"
+                    if job['status'] in TERMINAL_STATES:
+                        yield "event: end\ndata: {}\n\n"
+                        return
+                elif time.monotonic() - last_sent > 15:
+                    last_sent = time.monotonic()
+                    yield ": keepalive\n\n"
+                time.sleep(0.5)
+
+        return Response(
+            stream_with_context(events()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+
+# Create Flask Blueprint
+package_manager_bp = Blueprint(
+    "package_manager",
+    __name__,
+    template_folder='templates',
+    static_folder='static',
+    static_url_path='/static/package_manager'
+)
+
+
+def appbuilder_views() -> List[Dict[str, Any]]:
+    return [{
+        "name": "Package Manager",
+        "category": "Admin",
+        "view": PackageManagerView()
+    }]
+
+
+def flask_blueprints() -> List[Blueprint]:
+    return [package_manager_bp]
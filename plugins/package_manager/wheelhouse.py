@@ -0,0 +1,189 @@
+"""Content-addressed wheelhouse for the extra requirements in airflow-config-pypi.
+
+The package manager builds every wheel needed by a requirements set once,
+into ``<root>/<hash>/``, where the hash covers the normalized requirements,
+the Python version and the machine architecture. Pods run this file as a
+script at startup; when a complete wheelhouse exists for their requirements
+they install from it with ``--no-index`` instead of downloading and building
+packages, otherwise they fall back to a regular ``pip install``.
+
+Only the standard library is used so the script runs before anything else
+is installed::
+
+    python /opt/airflow/plugins/package_manager/wheelhouse.py install \\
+        --requirements /opt/airflow/requirements/requirements.txt \\
+        --wheelhouse /opt/airflow/wheelhouse -- --user
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+REQUIREMENTS = 'requirements.txt'
+
+
+def normalize_requirements(text: str) -> List[str]:
+    """Requirement lines without comments, blank lines and ordering differences"""
+    lines = set()
+    for line in (text or '').splitlines():
+        line = line.split(' #', 1)[0].strip()
+        if line and not line.startswith('#'):
+            lines.add(line)
+    return sorted(lines)
+
+
+def requirements_hash(text: str) -> str:
+    """Cache key of a requirements set for this interpreter and architecture"""
+    digest = hashlib.sha256()
+    digest.update(f"cp{sys.version_info[0]}{sys.version_info[1]}-{platform.machine()}\n".encode())
+    digest.update('\n'.join(normalize_requirements(text)).encode())
+    return digest.hexdigest()[:32]
+
+
+class Wheelhouse:
+    """Directory of wheelhouses, one per requirements hash"""
+
+    def __init__(self, root: str, keep: int = 5, timeout: int = 1800):
+        self.root = root
+        self.keep = keep
+        self.timeout = timeout
+        # Builds of one process share a temporary path per hash
+        self._build_lock = threading.Lock()
+
+    def path(self, requirements_text: str) -> str:
+        return os.path.join(self.root, requirements_hash(requirements_text))
+
+    def lookup(self, requirements_text: str) -> Optional[str]:
+        """Path of the complete wheelhouse for these requirements, if one exists"""
+        path = self.path(requirements_text)
+        return path if os.path.exists(os.path.join(path, MANIFEST)) else None
+
+    def build(self, requirements_text: str) -> Dict[str, object]:
+        """Build and publish the wheelhouse for a requirements set, once per hash"""
+        with self._build_lock:
+            return self._build(requirements_text)
+
+    def _build(self, requirements_text: str) -> Dict[str, object]:
+        key = requirements_hash(requirements_text)
+        final_path = os.path.join(self.root, key)
+        if self.lookup(requirements_text):
+            return {'key': key, 'path': final_path, 'built': False}
+
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, f".{key}.{os.getpid()}.tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        try:
+            requirements_path = os.path.join(tmp_path, REQUIREMENTS)
+            with open(requirements_path, 'w') as f:
+                f.write('\n'.join(normalize_requirements(requirements_text)) + '\n')
+
+            started = time.monotonic()
+            subprocess.run(
+                [sys.executable, '-m', 'pip', 'wheel', '--disable-pip-version-check', '--no-input',
+                 '--wheel-dir', tmp_path, '-r', requirements_path],
+                check=True, capture_output=True, text=True, timeout=self.timeout
+            )
+            wheels = sorted(name for name in os.listdir(tmp_path) if name.endswith('.whl'))
+            with open(os.path.join(tmp_path, MANIFEST), 'w') as f:
+                json.dump({
+                    'key': key,
+                    'python': platform.python_version(),
+                    'machine': platform.machine(),
+                    'wheels': wheels,
+                    'build_seconds': round(time.monotonic() - started, 3),
+                }, f)
+
+            # Publishing is a single rename, so pods never see a partial wheelhouse
+            try:
+                os.rename(tmp_path, final_path)
+            except OSError:
+                if not self.lookup(requirements_text):
+                    raise
+                # Another process published the same hash first
+                shutil.rmtree(tmp_path, ignore_errors=True)
+        except subprocess.CalledProcessError as e:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise RuntimeError(f"pip wheel failed: {e.stderr.strip().splitlines()[-1] if e.stderr else e}")
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+        self.prune()
+        logger.info(f"Published wheelhouse {key} with {len(wheels)} wheels")
+        return {'key': key, 'path': final_path, 'built': True, 'wheels': len(wheels)}
+
+    def prune(self):
+        """Keep only the most recently published wheelhouses"""
+        try:
+            entries = [
+                os.path.join(self.root, name) for name in os.listdir(self.root)
+                if not name.startswith('.') and os.path.exists(os.path.join(self.root, name, MANIFEST))
+            ]
+        except OSError:
+            return
+        entries.sort(key=os.path.getmtime, reverse=True)
+        for path in entries[self.keep:]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def install(self, requirements_path: str, pip_args: List[str]) -> int:
+        """Install requirements, from the matching wheelhouse when one exists"""
+        with open(requirements_path) as f:
+            requirements_text = f.read()
+        if not normalize_requirements(requirements_text):
+            logger.info("No extra requirements to install")
+            return 0
+
+        command = [sys.executable, '-m', 'pip', 'install', '--disable-pip-version-check', '--no-input']
+        path = self.lookup(requirements_text)
+        if path:
+            logger.info(f"Installing from wheelhouse {path}")
+            command += ['--no-index', '--find-links', path]
+        else:
+            logger.info(f"No wheelhouse for {requirements_hash(requirements_text)}, installing from index")
+        command += pip_args + ['-r', requirements_path]
+        return subprocess.call(command)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # Everything after `--` is passed to pip install unchanged
+    pip_args: List[str] = []
+    if '--' in argv:
+        split = argv.index('--')
+        argv, pip_args = argv[:split], argv[split + 1:]
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=['install', 'build', 'hash'])
+    parser.add_argument('--requirements', required=True, help="requirements.txt to install or build")
+    parser.add_argument('--wheelhouse', default=os.getenv('PACKAGE_MANAGER_WHEELHOUSE', '/opt/airflow/wheelhouse'))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    wheelhouse = Wheelhouse(args.wheelhouse)
+    if args.command == 'hash':
+        with open(args.requirements) as f:
+            print(requirements_hash(f.read()))
+        return 0
+    if args.command == 'build':
+        with open(args.requirements) as f:
+            print(json.dumps(wheelhouse.build(f.read())))
+        return 0
+    return wheelhouse.install(args.requirements, pip_args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
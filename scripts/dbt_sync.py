@@ -0,0 +1,638 @@
+#!/usr/bin/env python3
+"""Incremental sync of the newest git-sync worktree's dbt project into /opt/airflow/dbt.
+
+Called by lsyncd (see lsyncd.conf.lua) instead of a full ``rsync`` on every
+event. The behaviour matches the rsync flags it replaces:
+
+- ``--copy-links``: symlinks are followed and their targets copied.
+- ``--safe-links``: links that are dangling or point outside the worktree are
+  skipped.
+- ``--delete``: files and directories that are not in the source are removed
+  from the target.
+- ``--keep-dirlinks``: symlinked directories in the target are kept.
+
+There are two modes:
+
+``copy`` (default)
+    A state file records the worktree that was synced last and a manifest of
+    every target file (size, mtime, sha256). When lsyncd fires but the newest
+    worktree is the one already synced, nothing is scanned. Otherwise only
+    files whose content differs from the manifest are copied, each one
+    atomically.
+
+``link``
+    The worktree's ``dags/dbt`` is hard-linked into a versioned directory
+    next to the worktrees, on the same volume, which the DAG folder's
+    ``.airflowignore`` has to exclude. Reflinks or copies are used when hard
+    links are not possible, e.g. when ``--versions-dir`` is on another
+    volume; the fallback is logged and counted. ``target`` is then a symlink
+    that is swapped to the new version with one atomic rename, so a task
+    sees either the old project or the new one, never a mix. Versions that
+    are no longer current are deleted once no process has its working
+    directory or an open file inside them, keeping the newest ``--keep``
+    versions in any case.
+
+    A ``target`` that is still the directory of copy mode cannot be swapped
+    atomically: it has to be moved aside first, leaving a moment without a
+    project, and deleted under any task using it. Link mode therefore leaves
+    it alone until it is run once with ``--migrate`` while no tasks run. A
+    ``target`` that is a mount point, e.g. a volume shared with a sidecar,
+    cannot be replaced at all and is always refused. A refused run is
+    recorded in the status file and exits 0, so lsyncd keeps running.
+
+Only the standard library is used. Each run writes a JSON status file, and
+metrics go to StatsD over UDP when ``--statsd`` is set or Airflow's StatsD
+metrics are enabled::
+
+    python3 /etc/lsyncd/dbt_sync.py --source /opt/airflow/dags/.worktrees --target /opt/airflow/dbt
+"""
+from __future__ import annotations
+
+import argparse
+import errno
+import fcntl
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import socket
+import stat
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger('dbt_sync')
+
+DBT_SUBDIR = os.path.join('dags', 'dbt')
+STATE_VERSION = 1
+CHUNK_SIZE = 1024 * 1024
+TMP_SUFFIX = '.dbt-sync.tmp'
+# ioctl that clones a file's extents on Btrfs and XFS (linux/fs.h)
+FICLONE = 0x40049409
+
+
+def new_result(mode: str) -> Dict[str, Any]:
+    return {
+        'mode': mode, 'worktree': None, 'skipped': False, 'files_scanned': 0, 'files_copied': 0,
+        'files_linked': 0, 'bytes_copied': 0, 'bytes_hashed': 0, 'files_deleted': 0, 'dirs_created': 0,
+        'versions_deleted': 0, 'link_fallbacks': 0, 'errors': 0, 'refused': None,
+    }
+
+
+def select_worktree(source: str) -> Optional[str]:
+    """Newest ``<source>/*/dags/dbt`` directory by mtime, like ``ls -dt | head -n 1``"""
+    candidates = []
+    for path in glob.glob(os.path.join(source, '*', DBT_SUBDIR)):
+        try:
+            if os.path.isdir(path):
+                candidates.append((os.stat(path).st_mtime_ns, path))
+        except OSError:
+            continue
+    return max(candidates)[1] if candidates else None
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def walk_source(root: str, boundary: str) -> Iterator[Tuple[str, str, os.stat_result]]:
+    """Yield ``(relative path, absolute path, stat)`` of files under ``root``, following safe symlinks.
+
+    A symlink is safe when it resolves to an existing path inside ``boundary``
+    (the worktree); a directory link back to one of its own parents is skipped.
+    """
+    boundary = os.path.realpath(boundary)
+
+    def visit(directory: str, relative: str, parents: Set[str]) -> Iterator[Tuple[str, str, os.stat_result]]:
+        real = os.path.realpath(directory)
+        if real in parents:
+            logger.debug(f"Skipping symlink loop at {relative}")
+            return
+        parents = parents | {real}
+        try:
+            entries = sorted(os.scandir(directory), key=lambda e: e.name)
+        except OSError as e:
+            logger.warning(f"Cannot read {directory}: {e}")
+            return
+        for entry in entries:
+            rel_path = os.path.join(relative, entry.name) if relative else entry.name
+            if entry.is_symlink():
+                resolved = os.path.realpath(entry.path)
+                if not os.path.exists(resolved) or os.path.commonpath([resolved, boundary]) != boundary:
+                    logger.debug(f"Skipping unsafe or dangling symlink {rel_path}")
+                    continue
+            try:
+                if entry.is_dir():
+                    yield rel_path + os.sep, entry.path, entry.stat()
+                    yield from visit(entry.path, rel_path, parents)
+                elif entry.is_file():
+                    yield rel_path, entry.path, entry.stat()
+            except OSError as e:
+                logger.warning(f"Cannot read {entry.path}: {e}")
+
+    yield from visit(root, '', set())
+
+
+def walk_target(root: str) -> Dict[str, os.stat_result]:
+    """Stat of every entry in the target.
+
+    Symlinked directories count as directories (--keep-dirlinks) but are not
+    descended into, so --delete never removes anything outside the target.
+    """
+    found: Dict[str, os.stat_result] = {}
+
+    def visit(directory: str, relative: str):
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return
+        for entry in entries:
+            rel_path = os.path.join(relative, entry.name) if relative else entry.name
+            try:
+                if entry.is_dir():
+                    found[rel_path + os.sep] = entry.stat()
+                    if not entry.is_symlink():
+                        visit(entry.path, rel_path)
+                else:
+                    found[rel_path] = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+
+    visit(root, '')
+    return found
+
+
+class DbtSync:
+    """One sync of ``source``'s newest worktree into ``target``"""
+
+    def __init__(self, source: str, target: str, state_file: str, verify: bool = False):
+        self.source = source
+        self.target = target
+        self.state_file = state_file
+        self.verify = verify
+        self.umask = os.umask(0)
+        os.umask(self.umask)
+
+    def load_state(self) -> Dict[str, Any]:
+        try:
+            with open(self.state_file) as f:
+                state = json.load(f)
+            if state.get('version') == STATE_VERSION and state.get('target') == self.target:
+                return state
+        except (OSError, ValueError):
+            pass
+        return {'version': STATE_VERSION, 'target': self.target, 'worktree': None, 'manifest': {}}
+
+    def save_state(self, state: Dict[str, Any]):
+        tmp_path = f"{self.state_file}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_file)
+
+    def run(self) -> Dict[str, Any]:
+        started = time.monotonic()
+        result = new_result('copy')
+        worktree = select_worktree(self.source)
+        if worktree is None:
+            logger.warning(f"No valid worktree directory found at {self.source}")
+            result['skipped'] = True
+            result['duration'] = round(time.monotonic() - started, 3)
+            return result
+        result['worktree'] = worktree
+
+        state = self.load_state()
+        worktree_mtime = os.stat(worktree).st_mtime_ns
+        # git-sync never rewrites a published worktree, so the same path and
+        # mtime means the target already holds this content
+        if not self.verify and state['worktree'] == worktree and state.get('worktree_mtime') == worktree_mtime \
+                and os.path.isdir(self.target) and not os.path.islink(self.target):
+            result['skipped'] = True
+            result['duration'] = round(time.monotonic() - started, 3)
+            return result
+
+        if os.path.islink(self.target):
+            # Switching back from link mode: replace the symlink with a real directory
+            os.unlink(self.target)
+        os.makedirs(self.target, exist_ok=True)
+        manifest: Dict[str, List[Any]] = state.get('manifest', {})
+        existing = walk_target(self.target)
+        new_manifest: Dict[str, List[Any]] = {}
+        wanted: Set[str] = set()
+
+        for rel_path, src_path, src_stat in walk_source(worktree, os.path.dirname(os.path.dirname(worktree))):
+            wanted.add(rel_path)
+            dst_path = os.path.join(self.target, rel_path.rstrip(os.sep))
+            if rel_path.endswith(os.sep):
+                if not os.path.isdir(dst_path):
+                    if os.path.lexists(dst_path):
+                        os.unlink(dst_path)
+                    os.makedirs(dst_path)
+                    result['dirs_created'] += 1
+                continue
+
+            result['files_scanned'] += 1
+            try:
+                digest = file_digest(src_path)
+                result['bytes_hashed'] += src_stat.st_size
+                current = existing.get(rel_path)
+                if current is None or not self._same_content(rel_path, dst_path, current, digest, src_stat,
+                                                             manifest, result):
+                    if current is None and os.path.isdir(dst_path):
+                        # A directory in the target became a file in the source
+                        self._delete_tree(dst_path)
+                    self._copy(src_path, dst_path, src_stat)
+                    result['files_copied'] += 1
+                    result['bytes_copied'] += src_stat.st_size
+                dst_stat = os.stat(dst_path, follow_symlinks=False)
+                new_manifest[rel_path] = [dst_stat.st_size, dst_stat.st_mtime_ns, digest]
+            except OSError as e:
+                logger.error(f"Failed to sync {rel_path}: {e}")
+                result['errors'] += 1
+
+        # --delete: deepest paths first so directories are empty when removed
+        for rel_path in sorted(set(existing) - wanted, key=len, reverse=True):
+            result['files_deleted'] += self._delete(os.path.join(self.target, rel_path.rstrip(os.sep)))
+
+        if not result['errors']:
+            self.save_state({
+                'version': STATE_VERSION,
+                'target': self.target,
+                'worktree': worktree,
+                'worktree_mtime': worktree_mtime,
+                'manifest': new_manifest,
+            })
+        result['duration'] = round(time.monotonic() - started, 3)
+        return result
+
+    @staticmethod
+    def _same_content(rel_path: str, dst_path: str, current: os.stat_result, digest: str,
+                      src_stat: os.stat_result, manifest: Dict[str, List[Any]], result: Dict[str, Any]) -> bool:
+        if not stat.S_ISREG(current.st_mode) or current.st_size != src_stat.st_size:
+            return False
+        entry = manifest.get(rel_path)
+        if entry and entry[0] == current.st_size and entry[1] == current.st_mtime_ns:
+            return entry[2] == digest
+        # Not in the manifest (first run, lost state) or touched since: compare the bytes
+        result['bytes_hashed'] += current.st_size
+        return file_digest(dst_path) == digest
+
+    def _copy(self, src_path: str, dst_path: str, src_stat: os.stat_result):
+        """Copy through a temporary file so readers never see a partial file"""
+        tmp_path = os.path.join(os.path.dirname(dst_path), f".{os.path.basename(dst_path)}{TMP_SUFFIX}")
+        try:
+            shutil.copyfile(src_path, tmp_path)
+            # --no-perms: the source mode masked by the umask
+            os.chmod(tmp_path, stat.S_IMODE(src_stat.st_mode) & ~self.umask)
+            os.replace(tmp_path, dst_path)
+        except OSError:
+            if os.path.lexists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    @staticmethod
+    def _delete_tree(path: str):
+        if os.path.islink(path):
+            os.unlink(path)
+        else:
+            shutil.rmtree(path)
+
+    @staticmethod
+    def _delete(path: str) -> int:
+        # Already gone with a directory that was replaced by a file
+        if not os.path.lexists(path):
+            return 0
+        try:
+            if os.path.isdir(path) and not os.path.islink(path):
+                os.rmdir(path)
+            else:
+                os.unlink(path)
+            return 1
+        except OSError as e:
+            logger.warning(f"Could not delete {path}: {e}")
+            return 0
+
+
+class DbtLinkSync:
+    """Publish the newest worktree as a hard-linked version and flip the ``target`` symlink to it"""
+
+    def __init__(self, source: str, target: str, versions_dir: str, keep: int = 3, migrate: bool = False):
+        self.source = source
+        self.target = target
+        self.versions_dir = versions_dir
+        self.keep = max(1, keep)
+        self.migrate = migrate
+        self._can_link = True
+        self._can_reflink = True
+        self._copy_reason: Optional[str] = None
+
+    def run(self) -> Dict[str, Any]:
+        started = time.monotonic()
+        result = new_result('link')
+        worktree = select_worktree(self.source)
+        if worktree is None:
+            logger.warning(f"No valid worktree directory found at {self.source}")
+            result['skipped'] = True
+            result['duration'] = round(time.monotonic() - started, 3)
+            return result
+        result['worktree'] = worktree
+        refused = self._refusal()
+        if refused:
+            logger.error(refused)
+            result['refused'] = refused
+            result['errors'] += 1
+            result['duration'] = round(time.monotonic() - started, 3)
+            return result
+
+        # git-sync names worktrees after the commit, so the name identifies the content
+        version = os.path.basename(os.path.dirname(os.path.dirname(worktree)))
+        version_path = os.path.join(self.versions_dir, version)
+        current = os.readlink(self.target) if os.path.islink(self.target) else None
+        if current == version_path and os.path.isdir(version_path):
+            result['skipped'] = True
+        else:
+            if not os.path.isdir(version_path):
+                self._build(worktree, version_path, result)
+            if not result['errors']:
+                self._flip(version_path)
+                logger.info(f"{self.target} now points to {version_path}")
+        result['version'] = version
+        current = os.readlink(self.target) if os.path.islink(self.target) else version_path
+        result['versions_deleted'] = self.collect_garbage(current)
+        result['duration'] = round(time.monotonic() - started, 3)
+        return result
+
+    def _refusal(self) -> Optional[str]:
+        """Why ``target`` cannot be turned into the version symlink, if it cannot"""
+        if os.path.islink(self.target) or not os.path.isdir(self.target):
+            return None
+        if os.path.ismount(self.target):
+            # e.g. a volume shared with the lsyncd sidecar: the versions would
+            # not be visible to the other containers either
+            return (f"{self.target} is a mount point and cannot be replaced by the version symlink; "
+                    f"link mode needs the target inside a volume, use copy mode for a mounted target")
+        if not self.migrate:
+            return (f"{self.target} is a directory from copy mode; replace it with the version symlink "
+                    f"by running once with --migrate while no tasks use it")
+        return None
+
+    def _build(self, worktree: str, version_path: str, result: Dict[str, Any]):
+        """Link the worktree into a temporary directory and publish it with a rename"""
+        os.makedirs(self.versions_dir, exist_ok=True)
+        tmp_path = os.path.join(self.versions_dir, f".{os.path.basename(version_path)}{TMP_SUFFIX}")
+        if os.path.lexists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+        for rel_path, src_path, src_stat in walk_source(worktree, os.path.dirname(os.path.dirname(worktree))):
+            dst_path = os.path.join(tmp_path, rel_path.rstrip(os.sep))
+            if rel_path.endswith(os.sep):
+                os.makedirs(dst_path, exist_ok=True)
+                result['dirs_created'] += 1
+                continue
+            result['files_scanned'] += 1
+            try:
+                if self._link(os.path.realpath(src_path), dst_path):
+                    result['files_linked'] += 1
+                else:
+                    result['files_copied'] += 1
+                    result['bytes_copied'] += src_stat.st_size
+            except OSError as e:
+                logger.error(f"Failed to publish {rel_path}: {e}")
+                result['errors'] += 1
+        if self._copy_reason:
+            logger.warning(f"Could not link or clone files into {self.versions_dir} ({self._copy_reason}), "
+                           f"{result['files_copied']} files were copied; keep the versions on the "
+                           f"worktrees' volume to publish without copying")
+            result['link_fallbacks'] += 1
+        if result['errors']:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return
+        os.rename(tmp_path, version_path)
+
+    def _link(self, src_path: str, dst_path: str) -> bool:
+        """Hard link, else reflink, else copy; True when no data was copied"""
+        if self._can_link:
+            try:
+                os.link(src_path, dst_path)
+                return True
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                    raise
+                logger.debug(f"Hard links unavailable ({e.strerror}), trying reflinks")
+                self._can_link = False
+                self._copy_reason = f"hard link: {e.strerror}"
+        if self._can_reflink:
+            try:
+                with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+                    fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                shutil.copymode(src_path, dst_path)
+                self._copy_reason = None
+                return True
+            except OSError as e:
+                self._can_reflink = False
+                self._copy_reason = f"{self._copy_reason}, reflink: {e.strerror}"
+        shutil.copy2(src_path, dst_path)
+        return False
+
+    def _flip(self, version_path: str):
+        tmp_link = f"{self.target}{TMP_SUFFIX}"
+        if os.path.lexists(tmp_link):
+            os.unlink(tmp_link)
+        os.symlink(version_path, tmp_link)
+        if os.path.isdir(self.target) and not os.path.islink(self.target):
+            # One-time --migrate from copy mode: a directory cannot be replaced
+            # by a rename, so it is moved aside first and the target is briefly
+            # missing; run() only gets here when migrating
+            previous = f"{self.target}.pre-link-{int(time.time())}"
+            logger.warning(f"Replacing directory {self.target} with a symlink, moving it to {previous}")
+            os.rename(self.target, previous)
+            os.replace(tmp_link, self.target)
+            shutil.rmtree(previous, ignore_errors=True)
+            return
+        os.replace(tmp_link, self.target)
+
+    def collect_garbage(self, current: str) -> int:
+        """Delete versions that are not current, not among the newest ``keep`` and not in use"""
+        try:
+            entries = [os.path.join(self.versions_dir, name) for name in os.listdir(self.versions_dir)]
+        except OSError:
+            return 0
+        # Leftovers of interrupted builds; the lock guarantees no build is running
+        for path in entries:
+            if os.path.basename(path).endswith(TMP_SUFFIX):
+                shutil.rmtree(path, ignore_errors=True)
+        versions = sorted(
+            (path for path in entries if os.path.isdir(path) and not path.endswith(TMP_SUFFIX)),
+            key=os.path.getmtime, reverse=True
+        )
+        keep = {current, *versions[:self.keep]}
+        candidates = [path for path in versions if path not in keep]
+        if not candidates:
+            return 0
+        in_use = versions_in_use(self.versions_dir)
+        deleted = 0
+        for path in candidates:
+            if os.path.basename(path) in in_use:
+                logger.info(f"Keeping {path}, still used by a running process")
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            deleted += 1
+        return deleted
+
+
+def versions_in_use(versions_dir: str, proc: str = '/proc') -> Set[str]:
+    """Names of versions that a process has as working directory or holds a file open in.
+
+    Only processes visible in this PID namespace and readable by this user are
+    seen, which is why the newest versions are always kept as well.
+    """
+    prefix = os.path.realpath(versions_dir) + os.sep
+    in_use: Set[str] = set()
+    try:
+        pids = [pid for pid in os.listdir(proc) if pid.isdigit()]
+    except OSError:
+        return in_use
+    for pid in pids:
+        links = [os.path.join(proc, pid, 'cwd'), os.path.join(proc, pid, 'root')]
+        try:
+            links += [os.path.join(proc, pid, 'fd', fd) for fd in os.listdir(os.path.join(proc, pid, 'fd'))]
+        except OSError:
+            pass
+        for link in links:
+            try:
+                path = os.readlink(link)
+            except OSError:
+                continue
+            if path.startswith(prefix):
+                in_use.add(path[len(prefix):].split(os.sep, 1)[0])
+    return in_use
+
+
+class StatsdClient:
+    """Fire-and-forget StatsD over UDP"""
+
+    def __init__(self, host: str, port: int, prefix: str):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, metrics: List[str]):
+        try:
+            self.sock.sendto('\n'.join(f"{self.prefix}.{metric}" for metric in metrics).encode(), self.address)
+        except OSError as e:
+            logger.debug(f"Could not send metrics to StatsD: {e}")
+
+    @classmethod
+    def from_args(cls, address: Optional[str]) -> Optional['StatsdClient']:
+        """``host:port`` from --statsd, or Airflow's [metrics] StatsD settings when they are enabled"""
+        prefix = os.getenv('AIRFLOW__METRICS__STATSD_PREFIX', 'airflow') + '.dbt_sync'
+        if address:
+            host, _, port = address.rpartition(':')
+            return cls(host or 'localhost', int(port), prefix)
+        if os.getenv('AIRFLOW__METRICS__STATSD_ON', '').lower() in ('true', '1', 't'):
+            return cls(os.getenv('AIRFLOW__METRICS__STATSD_HOST', 'localhost'),
+                       int(os.getenv('AIRFLOW__METRICS__STATSD_PORT', '8125')), prefix)
+        return None
+
+
+def write_status(path: str, result: Dict[str, Any]):
+    """Last run plus running totals, for probes and debugging"""
+    try:
+        with open(path) as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+    totals = previous.get('totals', {})
+    totals['runs'] = totals.get('runs', 0) + 1
+    totals['skipped'] = totals.get('skipped', 0) + int(result['skipped'])
+    for key in ('files_copied', 'files_linked', 'bytes_copied', 'files_deleted', 'versions_deleted',
+                'link_fallbacks', 'errors'):
+        totals[key] = totals.get(key, 0) + result[key]
+    status = {'last_run': dict(result, finished_at=time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())),
+              'totals': totals}
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(status, f, indent=2)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write status file {path}: {e}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--source', required=True, help="git-sync worktrees directory")
+    parser.add_argument('--target', required=True, help="directory the dbt project is synced into")
+    parser.add_argument('--state-file', default=os.getenv('DBT_SYNC_STATE_FILE', '/tmp/dbt-sync.state.json'))
+    parser.add_argument('--status-file', default=os.getenv('DBT_SYNC_STATUS_FILE', '/tmp/dbt-sync.status.json'))
+    parser.add_argument('--statsd', default=os.getenv('DBT_SYNC_STATSD'), help="host:port of a StatsD server")
+    parser.add_argument('--mode', choices=['copy', 'link'], default=os.getenv('DBT_SYNC_MODE', 'copy'))
+    parser.add_argument('--versions-dir', default=os.getenv('DBT_SYNC_VERSIONS_DIR'),
+                        help="link mode: where versions are published, default .dbt-versions next to --source")
+    parser.add_argument('--keep', type=int, default=int(os.getenv('DBT_SYNC_KEEP_VERSIONS', '3')),
+                        help="link mode: newest versions always kept")
+    parser.add_argument('--migrate', action='store_true',
+                        help="link mode: replace a target directory left by copy mode, run once without tasks")
+    parser.add_argument('--verify', action='store_true',
+                        help="copy mode: compare every file even if the worktree has not changed")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=os.getenv('DBT_SYNC_LOG_LEVEL', 'INFO'),
+                        format="%(asctime)s %(levelname)s dbt_sync: %(message)s")
+
+    source = os.path.abspath(args.source)
+    target = os.path.abspath(args.target.rstrip(os.sep))
+    with open(f"{args.state_file}.lock", 'w') as lock:
+        # lsyncd runs one action at a time, but init and a manual run may overlap
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if args.mode == 'link':
+            # Hard links need the versions on the same volume as the worktrees;
+            # the DAG folder's .airflowignore keeps the DAG processor out of them
+            versions_dir = os.path.abspath(args.versions_dir or os.path.join(os.path.dirname(source), '.dbt-versions'))
+            result = DbtLinkSync(source, target, versions_dir, args.keep, args.migrate).run()
+        else:
+            result = DbtSync(source, target, args.state_file, args.verify).run()
+
+    write_status(args.status_file, result)
+    statsd = StatsdClient.from_args(args.statsd)
+    if statsd is not None:
+        statsd.send([
+            f"duration:{result['duration'] * 1000:.1f}|ms",
+            f"runs:1|c",
+            f"skipped:{int(result['skipped'])}|c",
+            f"files_copied:{result['files_copied']}|c",
+            f"files_linked:{result['files_linked']}|c",
+            f"bytes_copied:{result['bytes_copied']}|c",
+            f"files_deleted:{result['files_deleted']}|c",
+            f"versions_deleted:{result['versions_deleted']}|c",
+            f"link_fallbacks:{result['link_fallbacks']}|c",
+            f"errors:{result['errors']}|c",
+        ])
+
+    if result['skipped']:
+        logger.debug(f"Worktree {result['worktree']} already synced")
+    elif args.mode == 'link':
+        if result['refused']:
+            # Logged and recorded in the status file; a non-zero exit would
+            # stop lsyncd, which treats a failed init as fatal
+            return 0
+        logger.info(
+            f"Published {result['worktree']} in {result['duration']}s: {result['files_linked']} files linked, "
+            f"{result['files_copied']} copied ({result['bytes_copied']} bytes), "
+            f"{result['versions_deleted']} old versions deleted, {result['errors']} errors"
+        )
+    else:
+        logger.info(
+            f"Synced {result['worktree']} in {result['duration']}s: {result['files_copied']} of "
+            f"{result['files_scanned']} files copied ({result['bytes_copied']} bytes), "
+            f"{result['files_deleted']} deleted, {result['errors']} errors"
+        )
+    return 1 if result['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+#!/usr/bin/env bash
+# Installs the package manager's extra requirements before Airflow starts,
+# from the shared wheelhouse when one matches them (see
+# plugins/package_manager/wheelhouse.py), then hands over to the Airflow
+# image entrypoint. Set PACKAGE_MANAGER_REQUIREMENTS to the mounted
+# requirements.txt of the airflow-config-pypi ConfigMap to enable it.
+#
+# The install has to run as the final user, after /entrypoint has set up an
+# arbitrary UID and its HOME. /entrypoint is therefore run twice: first with
+# its connection checks and one-shot actions disabled, only to set up the
+# user and call this script back through its `bash` command, then with the
+# original environment to start the requested command. A failed install is
+# logged and Airflow starts without the extra requirements.
+set -uo pipefail
+
+# Variables of /entrypoint that do more than set up the user
+readonly ENTRYPOINT_ACTIONS=(
+    CONNECTION_CHECK_MAX_COUNT
+    _AIRFLOW_DB_MIGRATE
+    _AIRFLOW_DB_UPGRADE
+    _AIRFLOW_WWW_USER_CREATE
+    _PIP_ADDITIONAL_REQUIREMENTS
+)
+readonly SAVED_PREFIX=PACKAGE_MANAGER_SAVED_
+
+if [[ "${1:-}" == "--after-user-setup" ]]; then
+    shift
+    if [[ -f "${PACKAGE_MANAGER_REQUIREMENTS}" ]]; then
+        if ! python /opt/airflow/plugins/package_manager/wheelhouse.py install \
+                --requirements "${PACKAGE_MANAGER_REQUIREMENTS}" \
+                --wheelhouse "${PACKAGE_MANAGER_WHEELHOUSE:-/opt/airflow/wheelhouse}" -- --user; then
+            echo "Installing ${PACKAGE_MANAGER_REQUIREMENTS} failed, starting without the extra requirements" >&2
+        fi
+    else
+        echo "PACKAGE_MANAGER_REQUIREMENTS=${PACKAGE_MANAGER_REQUIREMENTS} does not exist, skipping extra requirements" >&2
+    fi
+    for name in "${ENTRYPOINT_ACTIONS[@]}"; do
+        saved="${SAVED_PREFIX}${name}"
+        if [[ -n "${!saved+x}" ]]; then
+            export "${name}=${!saved}"
+            unset "${saved}"
+        else
+            unset "${name}"
+        fi
+    done
+    exec /entrypoint "$@"
+fi
+
+if [[ -z "${PACKAGE_MANAGER_REQUIREMENTS:-}" ]]; then
+    exec /entrypoint "$@"
+fi
+
+for name in "${ENTRYPOINT_ACTIONS[@]}"; do
+    if [[ -n "${!name+x}" ]]; then
+        export "${SAVED_PREFIX}${name}=${!name}"
+    fi
+    unset "${name}"
+done
+export CONNECTION_CHECK_MAX_COUNT=0
+exec /entrypoint bash "$0" --after-user-setup "$@"
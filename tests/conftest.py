@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The plugin is loaded from Airflow's plugins folder, the fake API server from the benchmarks
+sys.path[:0] = [os.path.join(ROOT, 'plugins'), os.path.join(ROOT, 'benchmarks')]
+
+
+@pytest.fixture
+def cluster():
+    """Fake Airflow namespace with 4 worker replicas whose pods become Ready almost at once"""
+    from fake_kube import FakeCluster
+
+    return FakeCluster.airflow(workers=4, packages=['pandas==2.2.2'], readiness_delay=0.02)
+
+
+@pytest.fixture
+def kube_api(cluster):
+    """(CoreV1Api, AppsV1Api) talking to ``cluster`` through a fake API server"""
+    from kubernetes import client
+
+    from fake_kube import FakeKubernetesServer
+
+    with FakeKubernetesServer(cluster) as server:
+        api_client = client.ApiClient(client.Configuration(host=server.url))
+        yield client.CoreV1Api(api_client), client.AppsV1Api(api_client)
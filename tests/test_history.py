@@ -0,0 +1,69 @@
+import pytest
+
+from package_manager import history
+from package_manager.history import RequirementsHistory
+
+
+@pytest.fixture
+def requirements_history(cluster, kube_api):
+    core_v1 = kube_api[0]
+    return RequirementsHistory(lambda: core_v1, cluster.namespace, 'airflow-config-pypi-history', keep=3)
+
+
+def record(requirements_history, before, after):
+    return requirements_history.record(before, after, 'jane@example.com', f"Change to {after.strip()}")
+
+
+def test_first_record_keeps_the_previous_requirements(requirements_history):
+    assert record(requirements_history, 'pandas==2.2.2\n', 'pandas==2.1.0\n') == (2, True)
+
+    first, second = requirements_history.get(1), requirements_history.get(2)
+    assert first['requirements'] == 'pandas==2.2.2\n'
+    assert second['requirements'] == 'pandas==2.1.0\n'
+    assert second['diff'] == ['-pandas==2.2.2', '+pandas==2.1.0']
+
+
+def test_unchanged_requirements_are_not_recorded(requirements_history):
+    record(requirements_history, 'pandas==2.2.2\n', 'pandas==2.1.0\n')
+
+    assert record(requirements_history, 'pandas==2.1.0\n', 'pandas==2.1.0\n') == (2, False)
+    assert [entry['revision'] for entry in requirements_history.list()] == [2, 1]
+
+
+def test_oldest_revisions_are_pruned_beyond_keep(requirements_history):
+    before = ''
+    for version in range(5):
+        after = f"pandas==2.{version}.0\n"
+        record(requirements_history, before, after)
+        before = after
+
+    assert [entry['revision'] for entry in requirements_history.list()] == [6, 5, 4]
+    assert requirements_history.get(1) is None
+    assert 'requirements' not in requirements_history.list()[0]
+
+
+def test_oldest_revisions_are_pruned_to_the_size_limit(requirements_history, monkeypatch):
+    requirements_history.keep = 50
+    before = ''
+    for version in range(4):
+        after = f"pandas==2.{version}.0\n"
+        record(requirements_history, before, after)
+        before = after
+    entry_size = max(len(value) for value in requirements_history._read().data.values())
+    monkeypatch.setattr(history, 'MAX_HISTORY_BYTES', entry_size * 2)
+
+    record(requirements_history, before, 'pandas==3.0.0\n')
+
+    configmap = requirements_history._read()
+    assert sum(len(value) for value in configmap.data.values()) <= entry_size * 2
+    assert [entry['revision'] for entry in requirements_history.list()] == [6, 5]
+
+
+def test_discard_removes_an_unapplied_revision(requirements_history):
+    record(requirements_history, 'pandas==2.2.2\n', 'pandas==2.1.0\n')
+
+    requirements_history.discard(2)
+    requirements_history.discard(2)
+
+    assert requirements_history.get(2) is None
+    assert [entry['revision'] for entry in requirements_history.list()] == [1]
@@ -0,0 +1,94 @@
+import pytest
+
+from package_manager.requirements import (
+    DuplicateRequirementError,
+    RequirementNotFoundError,
+    RequirementsFile,
+)
+
+DUPLICATED = (
+    'numpy<2; python_version < "3.10"\n'
+    'pandas==2.2.2\n'
+    'numpy>=2; python_version >= "3.10"\n'
+)
+
+
+def test_duplicate_lines_are_all_indexed():
+    requirements = RequirementsFile.parse(DUPLICATED)
+
+    assert 'numpy' in requirements
+    assert requirements.get('NumPy').text == 'numpy<2; python_version < "3.10"'
+    assert len(requirements) == 2
+
+
+def test_remove_drops_every_line_of_a_duplicated_project():
+    requirements = RequirementsFile.parse(DUPLICATED)
+
+    removed = requirements.remove('numpy')
+
+    assert removed.text == 'numpy<2; python_version < "3.10"'
+    assert 'numpy' not in requirements
+    assert requirements.get('numpy') is None
+    assert requirements.render() == 'pandas==2.2.2\n'
+    with pytest.raises(RequirementNotFoundError):
+        requirements.remove('numpy')
+
+
+def test_update_refuses_a_duplicated_project():
+    requirements = RequirementsFile.parse(DUPLICATED)
+
+    with pytest.raises(DuplicateRequirementError):
+        requirements.update('numpy', 'numpy==2.0.0')
+    assert requirements.render() == DUPLICATED
+
+
+def test_add_rejects_a_project_listed_twice():
+    requirements = RequirementsFile.parse(DUPLICATED)
+
+    with pytest.raises(DuplicateRequirementError):
+        requirements.add('numpy==1.26.4')
+
+
+ROUND_TRIP = (
+    '# Extra packages\n'
+    '--extra-index-url https://pypi.example.com/simple\n'
+    '\n'
+    'pandas==2.2.2  # pinned for dbt\n'
+    'requests[socks]>=2.31; python_version >= "3.9"\n'
+    'not a requirement !\n'
+)
+
+
+def test_parse_and_render_round_trip_unchanged():
+    requirements = RequirementsFile.parse(ROUND_TRIP)
+
+    assert requirements.render() == ROUND_TRIP
+    assert [line.name for line in requirements] == ['pandas', 'requests']
+    assert requirements.packages() == [
+        '--extra-index-url https://pypi.example.com/simple',
+        'pandas==2.2.2',
+        'requests[socks]>=2.31; python_version >= "3.9"',
+        'not a requirement !',
+    ]
+
+
+def test_round_trip_without_trailing_newline():
+    assert RequirementsFile.parse('pandas==2.2.2').render() == 'pandas==2.2.2'
+    assert RequirementsFile.parse('').render() == ''
+
+
+def test_edits_keep_order_and_comments():
+    requirements = RequirementsFile.parse(ROUND_TRIP)
+
+    requirements.update('Pandas', 'pandas==2.1.0')
+    requirements.remove('requests')
+    requirements.add('six==1.16.0')
+
+    assert requirements.render() == (
+        '# Extra packages\n'
+        '--extra-index-url https://pypi.example.com/simple\n'
+        '\n'
+        'pandas==2.1.0 # pinned for dbt\n'
+        'not a requirement !\n'
+        'six==1.16.0\n'
+    )
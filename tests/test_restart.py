@@ -0,0 +1,125 @@
+import threading
+
+from package_manager.drain import WorkerDrainer
+from package_manager.restart import ORIGINAL_PARTITION_ANNOTATION, RestartCoalescer, RolloutRestarter
+
+
+class TestRestartCoalescer:
+
+    def test_requests_within_the_window_share_one_rollout(self):
+        calls = []
+
+        def restart(components, progress_callback):
+            calls.append(components)
+            progress_callback({'name': 'airflow-worker', 'status': 'ready'})
+            return [{'name': 'airflow-worker', 'status': 'ready'}]
+
+        coalescer = RestartCoalescer(restart, window=0.1, component_order=['worker', 'triggerer', 'scheduler'])
+        progress_a, progress_b = [], []
+        first = coalescer.request(['scheduler'], progress_a.append)
+        second = coalescer.request(['worker', 'scheduler'], progress_b.append)
+
+        assert first is second
+        assert first.result(timeout=5) == [{'name': 'airflow-worker', 'status': 'ready'}]
+        assert calls == [['worker', 'scheduler']]
+        assert progress_a == progress_b == [{'name': 'airflow-worker', 'status': 'ready'}]
+
+    def test_batches_never_overlap(self):
+        running = threading.Lock()
+        overlaps = []
+        started, release = threading.Event(), threading.Event()
+
+        def restart(components, progress_callback):
+            if not running.acquire(blocking=False):
+                overlaps.append(components)
+                return []
+            try:
+                started.set()
+                release.wait(5)
+                return components
+            finally:
+                running.release()
+
+        coalescer = RestartCoalescer(restart, window=0.01)
+        first = coalescer.request(['worker'])
+        threading.Timer(0.2, release.set).start()
+        assert started.wait(5)
+        second = coalescer.request(['scheduler'])
+
+        assert first is not second
+        assert first.result(timeout=5) == ['worker']
+        assert second.result(timeout=5) == ['scheduler']
+        assert overlaps == []
+
+    def test_failed_rollout_fails_every_coalesced_change(self):
+        def restart(components, progress_callback):
+            raise RuntimeError('API server unavailable')
+
+        future = RestartCoalescer(restart, window=0.01).request(['worker'])
+
+        assert isinstance(future.exception(timeout=5), RuntimeError)
+
+
+def drainer():
+    return WorkerDrainer(timeout=1, poll_interval=0.01, app=None, running_tasks=lambda pods: {pod: 0 for pod in pods})
+
+
+class TestDrainedRestart:
+
+    def test_success_restores_the_original_partition(self, cluster, kube_api):
+        worker = cluster.workloads[('StatefulSet', 'airflow-worker')]
+        restarter = RolloutRestarter(kube_api[1], cluster.namespace, timeout=5, poll_interval=0.01,
+                                     drainer=drainer(), min_available='50%')
+
+        workloads = restarter.restart(['worker'])
+
+        assert [w['status'] for w in workloads] == ['ready']
+        assert workloads[0]['message'].startswith('successfully rolled out in 2 drained batch(es)')
+        assert worker.partition == 0
+        assert ORIGINAL_PARTITION_ANNOTATION not in worker.metadata_annotations
+
+    def test_failed_batch_holds_the_partition(self, cluster, kube_api):
+        worker = cluster.workloads[('StatefulSet', 'airflow-worker')]
+        cluster.readiness_delay = 5
+        restarter = RolloutRestarter(kube_api[1], cluster.namespace, timeout=0.2, poll_interval=0.01,
+                                     drainer=drainer(), min_available='50%')
+
+        workloads = restarter.restart(['worker'])
+
+        # Only the first batch (ordinals 3 and 2) was released; 0 and 1 are not restarted undrained
+        assert workloads[0]['status'] == 'timeout'
+        assert workloads[0]['held_partition'] == 2
+        assert 'partition held at 2' in workloads[0]['message']
+        assert worker.partition == 2
+        assert worker.metadata_annotations[ORIGINAL_PARTITION_ANNOTATION] == '0'
+
+    def test_next_drained_restart_starts_from_the_original_partition(self, cluster, kube_api):
+        worker = cluster.workloads[('StatefulSet', 'airflow-worker')]
+        worker.partition = 2
+        worker.metadata_annotations[ORIGINAL_PARTITION_ANNOTATION] = '1'
+        restarter = RolloutRestarter(kube_api[1], cluster.namespace, timeout=5, poll_interval=0.01,
+                                     drainer=drainer(), min_available='3')
+        partitions = []
+        set_partition = restarter._set_partition
+        restarter._set_partition = lambda workload, partition, **kwargs: partitions.append(partition) or \
+            set_partition(workload, partition, **kwargs)
+
+        workloads = restarter.restart(['worker'])
+
+        assert workloads[0]['status'] == 'ready'
+        # Never released below the held partition before each batch was drained
+        assert partitions == [3, 2, 1, 1]
+        assert worker.partition == 1
+        assert ORIGINAL_PARTITION_ANNOTATION not in worker.metadata_annotations
+
+    def test_plain_restart_restores_a_held_partition(self, cluster, kube_api):
+        worker = cluster.workloads[('StatefulSet', 'airflow-worker')]
+        worker.partition = 4
+        worker.metadata_annotations[ORIGINAL_PARTITION_ANNOTATION] = '0'
+        restarter = RolloutRestarter(kube_api[1], cluster.namespace, timeout=5, poll_interval=0.01)
+
+        workloads = restarter.restart(['worker'])
+
+        assert workloads[0]['status'] == 'ready'
+        assert worker.partition == 0
+        assert ORIGINAL_PARTITION_ANNOTATION not in worker.metadata_annotations
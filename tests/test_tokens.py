@@ -0,0 +1,112 @@
+import pytest
+
+from package_manager import tokens
+from package_manager.tokens import MemoryTokenStore, SqlTokenStore, _sqlite_engine, create_token_store
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(tokens.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryTokenStore()
+    store = SqlTokenStore(_sqlite_engine(str(tmp_path / 'tokens.db')), eviction_interval=0)
+    store.create_table()
+    return store
+
+
+def test_token_is_returned_until_it_expires(store, clock):
+    store.put('token', {'operation': 'add', 'scope': '{"components":["worker"]}'}, ttl=60)
+
+    clock.now += 59
+    assert store.get('token') == {'operation': 'add', 'scope': '{"components":["worker"]}'}
+    clock.now += 1
+    assert store.get('token') is None
+    assert not store.consume('token')
+
+
+def test_token_is_consumed_once(store, clock):
+    store.put('token', {'operation': 'add'}, ttl=60)
+
+    assert store.consume('token')
+    assert not store.consume('token')
+    assert store.get('token') is None
+
+
+def test_expired_tokens_are_evicted(store, clock):
+    store.put('old', {}, ttl=10)
+    store.put('new', {}, ttl=100)
+    clock.now += 50
+
+    store.put('newest', {}, ttl=100)
+
+    assert store.evictions == 1
+    assert len(store) == 2
+
+
+def test_missing_metadata_table_falls_back_to_sqlite(tmp_path, monkeypatch, caplog):
+    settings = pytest.importorskip('airflow.settings')
+    # A metadata database on which init-db was never run
+    monkeypatch.setattr(settings, 'engine', _sqlite_engine(str(tmp_path / 'airflow.db')), raising=False)
+    path = str(tmp_path / 'state' / 'tokens.db')
+
+    store = create_token_store('metadata', path)
+
+    assert isinstance(store, SqlTokenStore)
+    assert store.engine.url.database == path
+    assert "using sqlite" in caplog.text
+
+
+def test_memory_store_only_when_configured(tmp_path):
+    assert isinstance(create_token_store('memory', str(tmp_path / 'tokens.db')), MemoryTokenStore)
+    assert isinstance(create_token_store('sqlite', str(tmp_path / 'tokens.db')), SqlTokenStore)
+
+
+class TestOperationTokenScope:
+    """Tokens only cover the components and environments they were issued for"""
+
+    @pytest.fixture
+    def view(self):
+        views = pytest.importorskip('package_manager.views')
+        view = views.PackageManagerView.__new__(views.PackageManagerView)
+        view.tokens = MemoryTokenStore()
+        view._next_token_gauge = 0.0
+        view._get_current_user_identifier = lambda: 'jane@example.com'
+        return view
+
+    def test_matching_scope_is_accepted(self, view):
+        scope = view._change_scope({'components': ['worker', 'scheduler']})
+        token = view._generate_operation_token('add', 'six==1.16.0', scope)
+
+        assert view._verify_operation_token(
+            token, 'add', 'six==1.16.0', view._change_scope({'components': ['scheduler', 'worker']})
+        )
+
+    @pytest.mark.parametrize('body', [
+        {},
+        {'components': ['worker', 'triggerer']},
+        {'components': ['worker'], 'environments': ['staging']},
+    ])
+    def test_other_scope_is_rejected(self, view, body):
+        token = view._generate_operation_token('add', 'six==1.16.0', view._change_scope({'components': ['worker']}))
+
+        assert not view._verify_operation_token(token, 'add', 'six==1.16.0', view._change_scope(body))
+
+    def test_rollback_scope_only_covers_components(self, view):
+        views = pytest.importorskip('package_manager.views')
+        body = {'revision': 2, 'environment': 'staging', 'components': ['worker']}
+
+        assert view._change_scope(body, views.ROLLBACK_SCOPE_KEYS) == '{"components":["worker"]}'